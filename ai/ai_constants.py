@@ -1,5 +1,5 @@
 # This file defines constant strings used as system messages for configuring the behavior of the AI assistant.
-# Used in `handle_response.py` and `dm_sent.py`
+# Used in `handle_response.py`, `dm_sent.py` and `ai/summarize.py`
 
 DEFAULT_SYSTEM_CONTENT = """
 You are a versatile AI assistant.
@@ -16,3 +16,19 @@ DM_SYSTEM_CONTENT = """
 This is a private DM between you and user.
 You are the user's helpful AI assistant.
 """
+SUMMARIZE_CHUNK_PROMPT = """
+The context is one consecutive part of a longer Slack conversation.
+Summarize this part, keeping every decision, conclusion, open question and action item.
+Don't use user IDs in your response.
+"""
+MERGE_SUMMARIES_PROMPT = """
+The context contains summaries of consecutive parts of one Slack conversation, in order.
+Merge them into a single summary of the same kind, keeping every decision, conclusion, open question and action item.
+Don't use user IDs in your response.
+"""
+MEMORY_SUMMARY_PROMPT = """
+The context is a Slack thread: possibly a summary of its earlier messages, followed by the messages after it, in order.
+Write an updated summary of the whole thread so far, to be used as context for answering later messages in it.
+Keep every fact, decision, conclusion, open question and action item, and who said what when it matters.
+Be concise. Don't use user IDs in your response.
+"""
@@ -0,0 +1,64 @@
+from typing import List, Optional
+import logging
+import os
+
+from .conversation import context_message
+from .tokenizer import count_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Fits conversation context into the selected model's context window.
+The input budget is the model's `context_window` minus its `max_tokens` output limit, the system content,
+the prompt and a safety margin (`CONTEXT_SAFETY_MARGIN` tokens, default 256) for message framing and
+tokenizer approximation. The oldest turns are dropped until the rest fits, so the most recent messages,
+which carry the most relevance for a reply, are always kept. Long-range history is preserved separately
+by summarization rather than by sending every turn.
+"""
+
+# Tokens a provider spends on the role and delimiters of each message in `ai/conversation.py`
+MESSAGE_FRAMING_TOKENS = 4
+
+
+def _message_tokens(message: dict, model: Optional[str]) -> int:
+    # Counted as sent: bot turns are assistant turns without the author prefix
+    return count_tokens(context_message(message)["content"], model) + MESSAGE_FRAMING_TOKENS
+
+
+def context_budget(model_info: dict, model: Optional[str], prompt: str, system_content: str) -> int:
+    """Return how many tokens of context fit next to `prompt` and `system_content` for this model."""
+    window = model_info.get("context_window")
+    if not window:
+        return -1
+    reserved = (
+        model_info.get("max_tokens", 0)
+        + count_tokens(system_content, model)
+        + count_tokens(prompt, model)
+        + MESSAGE_FRAMING_TOKENS
+        + int(os.environ.get("CONTEXT_SAFETY_MARGIN", 256))
+    )
+    return max(0, window - reserved)
+
+
+def fit_context(
+    context: Optional[List[dict]], model_info: dict, model: Optional[str], prompt: str, system_content: str
+) -> List[dict]:
+    """Return the most recent turns of `context` that fit the model's context window, oldest first."""
+    context = context or []
+    budget = context_budget(model_info, model, prompt, system_content)
+    if budget < 0 or not context:
+        return context
+
+    kept = 0
+    used = 0
+    for message in reversed(context):
+        tokens = _message_tokens(message, model)
+        if used + tokens > budget:
+            break
+        used += tokens
+        kept += 1
+
+    if kept < len(context):
+        logger.info(f"Trimmed {len(context) - kept} oldest context messages to fit {model} ({budget} token budget)")
+    return context[len(context) - kept :]
@@ -0,0 +1,49 @@
+from typing import List, Literal, Optional, Tuple, TypedDict
+
+"""
+Role-tagged conversation turns sent to the AI providers.
+`build_messages()` turns the parsed Slack context and the new prompt into `{"role", "content"}` messages, oldest
+first: the rolling summary and other long-lived context come first, then the thread's turns, then the new prompt as
+the last user turn. The system content is passed to providers separately and always comes before all of them.
+Keeping this order, and never rewriting earlier turns, makes consecutive requests in a conversation share the
+longest possible prefix, which is what Anthropic prompt caching and OpenAI automatic prefix caching match on.
+The app's own messages (turns marked `"bot"`) become `assistant` turns; everyone else's messages, other bots'
+included, are `user` turns prefixed with the author's name, since a Slack conversation can have many participants.
+The first message is always a `user` turn.
+Providers map the messages to their native format; `group_turns()` merges consecutive turns of one role for
+providers that need roles to alternate.
+"""
+
+Role = Literal["user", "assistant"]
+
+
+class Message(TypedDict):
+    role: Role
+    content: str
+
+
+def context_message(turn: dict) -> Message:
+    if turn.get("bot"):
+        return Message(role="assistant", content=turn["text"])
+    return Message(role="user", content=f"{turn['user']}: {turn['text']}")
+
+
+def build_messages(prompt: str, context: Optional[List[dict]] = None) -> List[Message]:
+    """The conversation for a request: every context turn, then `prompt` as the new user turn."""
+    messages = [context_message(turn) for turn in context or []]
+    if messages and messages[0]["role"] == "assistant":
+        # Anthropic and Gemini require a conversation to start with a user turn
+        messages.insert(0, Message(role="user", content="(earlier messages are not included)"))
+    messages.append(Message(role="user", content=prompt))
+    return messages
+
+
+def group_turns(messages: List[Message]) -> List[Tuple[Role, List[str]]]:
+    """Consecutive messages of one role merged into `(role, contents)`, so roles alternate."""
+    grouped: List[Tuple[Role, List[str]]] = []
+    for message in messages:
+        if grouped and grouped[-1][0] == message["role"]:
+            grouped[-1][1].append(message["content"])
+        else:
+            grouped.append((message["role"], [message["content"]]))
+    return grouped
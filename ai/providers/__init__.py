@@ -1,26 +1,53 @@
-from typing import List, Optional
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
+import importlib
 import sys
 import os
 import logging
+import time
+
+from metrics import TOKEN_BUCKETS, histogram
 
 from state_store.get_redis_user_state import get_redis_user_state
+from state_store.get_redis_user_state_async import get_redis_user_state_async
 
 from ..ai_constants import DEFAULT_SYSTEM_CONTENT
-from .anthropic import AnthropicAPI
-from .openai import OpenAI_API
-from .vertexai import VertexAPI
-from .genai import GenAI_API
+from ..context_budget import MESSAGE_FRAMING_TOKENS, fit_context
+from ..conversation import Message, build_messages
+from ..response_cache import get_response_cache
+from ..single_flight import get_single_flight, request_fingerprint
+from ..tokenizer import count_tokens
+from .router import get_provider_router, provider_key
 
 """
-New AI providers must be added below.
+New AI providers must be added to `PROVIDERS` below.
+Provider modules, and the SDKs they wrap, are only imported when a provider is first used, and only
+providers whose credentials are set are ever considered, so startup does not pay for unused SDKs
+(`python benchmarks/import_time.py` measures it).
 `get_available_providers()`
-This function retrieves available API models from different AI providers.
+This function retrieves available API models from the configured AI providers.
 It combines the available models into a single dictionary.
 `_get_provider()`
 This function returns an instance of the appropriate API provider based on the given provider name.
+Provider objects are cheap, per-request holders of the selected model; the SDK clients they use
+are long-lived and shared through `client_registry.py`.
 `get_provider_response`()
 This function retrieves the user's selected API provider and model,
 sets the model, and generates a response.
+`get_provider_response_stream()`
+This function does the same but yields the response in chunks as they are generated,
+so listeners can show the first tokens before the whole completion is done.
+`get_provider_response_async()` and `get_provider_response_stream_async()`
+are the asyncio variants used by `app_async.py`; they use the providers' async clients.
+Before every call the oldest context messages are trimmed to fit the selected model's
+`context_window` (see `ai/context_budget.py`); tokens are counted with `ai/tokenizer.py`.
+Providers receive the context and the prompt as role-tagged messages built by `ai/conversation.py`
+(system content, then long-lived context, then the new turn), which each maps to its native multi-turn format.
+Latency, time to first token and prompt/response token counts are recorded per provider and model in `metrics.py`.
+Repeated requests are answered from `ai/response_cache.py` without calling the provider, and identical requests
+that arrive while one is in flight share its provider call through `ai/single_flight.py`.
+Calls go through `ai/providers/router.py`, which retries transient errors, skips providers whose circuit
+breaker is open and falls back along `LLM_FALLBACK_CHAIN` (comma-separated `provider:model` entries,
+unconfigured ones are skipped); the context is fitted again for whichever model ends up answering.
 Note that context is an optional parameter because some functionalities,
 such as commands, do not allow access to conversation history if the bot
 isn't in the channel where the command is run.
@@ -29,72 +56,291 @@ isn't in the channel where the command is run.
 # Set up logging
 logger = logging.getLogger(__name__)
 
+_llm_latency = histogram("llm_request_seconds", "Time until the whole completion was received", ("provider", "model"))
+_llm_first_token = histogram(
+    "llm_time_to_first_token_seconds", "Time until the first streamed chunk was received", ("provider", "model")
+)
+_prompt_tokens = histogram(
+    "llm_prompt_tokens", "Prompt tokens sent, system content included", ("provider", "model"), TOKEN_BUCKETS
+)
+_response_tokens = histogram("llm_response_tokens", "Completion tokens received", ("provider", "model"), TOKEN_BUCKETS)
+
+
+# Provider name: (module, class, environment variable that must be set for the provider to be available)
+PROVIDERS = {
+    "anthropic": (".anthropic", "AnthropicAPI", "ANTHROPIC_API_KEY"),
+    "openai": (".openai", "OpenAI_API", "OPENAI_API_KEY"),
+    "vertexai": (".vertexai", "VertexAPI", "VERTEX_AI_PROJECT_ID"),
+    "genai": (".genai", "GenAI_API", "GENAI_API_KEY"),
+}
+
+
+def _is_configured(provider_name: str) -> bool:
+    entry = PROVIDERS.get(provider_name.lower())
+    return entry is not None and bool(os.environ.get(entry[2]))
+
 
 def get_available_providers():
-    return {
-        **AnthropicAPI().get_models(),
-        **OpenAI_API().get_models(),
-        **VertexAPI().get_models(),
-        **GenAI_API().get_models(),
-    }
+    models = {}
+    for provider_name in PROVIDERS:
+        if _is_configured(provider_name):
+            models.update(_get_provider(provider_name).get_models())
+    return models
 
 
 def _get_provider(provider_name: str):
-    if provider_name.lower() == "anthropic":
-        return AnthropicAPI()
-    elif provider_name.lower() == "openai":
-        return OpenAI_API()
-    elif provider_name.lower() == "vertexai":
-        return VertexAPI()
-    elif provider_name.lower() == "genai":
-        return GenAI_API()
-    else:
+    entry = PROVIDERS.get(provider_name.lower())
+    if entry is None:
         raise ValueError(f"Unknown provider: {provider_name}")
+    module_name, class_name, _ = entry
+    return getattr(importlib.import_module(module_name, __name__), class_name)()
+
+
+def _get_user_provider(user_id: str):
+    """Return the user's selected provider with its model set, falling back to GenAI."""
+    provider_name = None
+    model_name = None
+
+    # Check if Redis is available
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        try:
+            # Try to get user's model selection from Redis
+            provider_name, model_name = get_redis_user_state(user_id, False, redis_url)
+        except Exception as e:
+            print(f"⚠️ Failed to get user state from Redis: {e}")
+            # Fall through to GenAI fallback
+
+    return _select_provider(user_id, provider_name, model_name)
+
+
+async def _get_user_provider_async(user_id: str):
+    provider_name = None
+    model_name = None
+
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        try:
+            provider_name, model_name = await get_redis_user_state_async(user_id, False, redis_url)
+        except Exception as e:
+            print(f"⚠️ Failed to get user state from Redis: {e}")
+
+    return _select_provider(user_id, provider_name, model_name)
+
+
+def _select_provider(user_id: str, provider_name: Optional[str], model_name: Optional[str]):
+    # Fall back to GenAI if no provider/model or Redis is not available
+    if not provider_name or not model_name:
+        print(f"ℹ️ No provider/model selection found for user: {user_id}, falling back to GenAI")
+        provider_name = "genai"
+        model_name = "genai-agent"
 
+    print(f"🔧 Using provider: {provider_name}, model: {model_name}")
+    provider = _get_provider(provider_name)
+    provider.set_model(model_name)
+    return provider
 
-def _estimate_token_count(text: str) -> int:
-    """Roughly estimate token count based on words (very approximate)"""
-    # A very rough approximation: 1 token ≈ 0.75 words
-    return int(len(text.split()) / 0.75)
+
+DEFAULT_FALLBACK_CHAIN = "genai:genai-agent,openai:gpt-4o-mini,anthropic:claude-3-haiku-20240307"
+
+
+def _fallback_chain() -> List[Tuple[str, str]]:
+    chain = []
+    for entry in os.environ.get("LLM_FALLBACK_CHAIN", DEFAULT_FALLBACK_CHAIN).split(","):
+        provider_name, _, model_name = entry.strip().partition(":")
+        if provider_name and model_name:
+            chain.append((provider_name, model_name))
+    return chain
+
+
+def _candidates(provider) -> List:
+    """The user's provider followed by every configured fallback that is not the same model."""
+    candidates = [provider]
+    seen = {(type(provider), provider.current_model)}
+    for provider_name, model_name in _fallback_chain():
+        if provider_name.lower() not in PROVIDERS:
+            logger.error(f"Ignoring fallback {provider_name}:{model_name}: unknown provider")
+            continue
+        if not _is_configured(provider_name):
+            continue
+        fallback = _get_provider(provider_name)
+        if model_name not in fallback.get_models() or (type(fallback), model_name) in seen:
+            continue
+        fallback.set_model(model_name)
+        seen.add((type(fallback), model_name))
+        candidates.append(fallback)
+    return candidates
+
+
+def _prepare_prompt(provider, prompt: str, context: Optional[List], system_content: str) -> Tuple[tuple, List[Message]]:
+    """Trim the oldest context turns to the provider's context window and build the messages.
+    Returns the response cache key arguments for what is actually sent, and the messages."""
+    model = provider.current_model
+    context = fit_context(context, provider.MODELS[model], model, prompt, system_content)
+    messages = build_messages(prompt, context)
+    prompt_token_count = count_tokens(system_content, model) + sum(
+        count_tokens(message["content"], model) + MESSAGE_FRAMING_TOKENS for message in messages
+    )
+    _prompt_tokens.observe(prompt_token_count, provider_key(provider), model)
+    return (type(provider).__name__, model, system_content, prompt, context), messages
+
+
+def _prepare_candidate(prepared: dict, provider, prompt: str, context: Optional[List], system_content: str) -> List[Message]:
+    """Prepare the messages once per candidate; the answering candidate's cache key is used to store the response."""
+    if id(provider) not in prepared:
+        prepared[id(provider)] = _prepare_prompt(provider, prompt, context, system_content)
+    return prepared[id(provider)][1]
+
+
+def _record_completion(provider, started_at: float, response: str):
+    labels = (provider_key(provider), provider.current_model)
+    _llm_latency.observe(time.monotonic() - started_at, *labels)
+    _response_tokens.observe(count_tokens(response, provider.current_model), *labels)
 
 
 def get_provider_response(user_id: str, prompt: str, context: Optional[List] = [], system_content=DEFAULT_SYSTEM_CONTENT):
-    formatted_context = "\n".join([f"{msg['user']}: {msg['text']}" for msg in context])
-    full_prompt = f"Prompt: {prompt}\nContext: {formatted_context}"
-    context_token_count = _estimate_token_count(full_prompt)
     print(f"🤖 Getting AI response for user: {user_id}")
-    
+
     try:
-        provider_name = None
-        model_name = None
-        
-        # Check if Redis is available
-        redis_url = os.environ.get("REDIS_URL")
-        if redis_url:
-            try:
-                # Try to get user's model selection from Redis
-                provider_name, model_name = get_redis_user_state(user_id, False, redis_url)
-            except Exception as e:
-                print(f"⚠️ Failed to get user state from Redis: {e}")
-                # Fall through to GenAI fallback
-        
-        # Fall back to GenAI if no provider/model or Redis is not available
-        if not provider_name or not model_name:
-            print(f"ℹ️ No provider/model selection found for user: {user_id}, falling back to GenAI")
-            provider_name = "genai"
-            model_name = "genai-agent"
-        
-        print(f"🔧 Using provider: {provider_name}, model: {model_name}")
-        provider = _get_provider(provider_name)
-        provider.set_model(model_name)
-        
-        print(f"📝 Generating response with {len(context)} context messages (approx. {context_token_count} tokens)")
-        response = provider.generate_response(full_prompt, system_content)
-        
-        response_token_count = _estimate_token_count(response)
-        print(f"✅ Successfully generated response for user: {user_id} (approx. {response_token_count} tokens)")
+        provider = _get_user_provider(user_id)
+        cache_key, messages = _prepare_prompt(provider, prompt, context, system_content)
+        cached = get_response_cache().lookup(*cache_key)
+        if cached is not None:
+            print(f"⚡ Answered from response cache for user: {user_id}")
+            return cached
+        prepared = {id(provider): (cache_key, messages)}
+
+        def generate(candidate) -> Iterator[str]:
+            candidate_messages = _prepare_candidate(prepared, candidate, prompt, context, system_content)
+            yield candidate.generate_response(candidate_messages, system_content)
+
+        def produce() -> Iterator[str]:
+            started_at = time.monotonic()
+            answering, chunks = get_provider_router().open(_candidates(provider), generate, kind="generate")
+            response = "".join(chunks)
+            get_response_cache().store(*prepared[id(answering)][0], response)
+            _record_completion(answering, started_at, response)
+            yield response
+
+        response = "".join(get_single_flight().run(request_fingerprint(*cache_key), produce))
+        print(f"✅ Successfully generated response for user: {user_id}")
         return response
     except Exception as e:
         error_msg = f"❌ Error generating AI response: {e}"
         print(error_msg, file=sys.stderr)
         raise e
+
+
+def get_provider_response_stream(
+    user_id: str, prompt: str, context: Optional[List] = [], system_content=DEFAULT_SYSTEM_CONTENT
+) -> Iterator[str]:
+    """Same as `get_provider_response`, but yields the completion in chunks as the provider produces them."""
+    print(f"🤖 Streaming AI response for user: {user_id}")
+
+    try:
+        provider = _get_user_provider(user_id)
+        cache_key, messages = _prepare_prompt(provider, prompt, context, system_content)
+        cached = get_response_cache().lookup(*cache_key)
+        if cached is not None:
+            print(f"⚡ Answered from response cache for user: {user_id}")
+            yield cached
+            return
+        prepared = {id(provider): (cache_key, messages)}
+
+        def stream(candidate) -> Iterator[str]:
+            candidate_messages = _prepare_candidate(prepared, candidate, prompt, context, system_content)
+            return candidate.stream_response(candidate_messages, system_content)
+
+        def produce() -> Iterator[str]:
+            started_at = time.monotonic()
+            answering, stream_chunks = get_provider_router().open(_candidates(provider), stream)
+            # The router returns once the first chunk has arrived
+            _llm_first_token.observe(time.monotonic() - started_at, provider_key(answering), answering.current_model)
+            chunks = []
+            for chunk in stream_chunks:
+                chunks.append(chunk)
+                yield chunk
+            get_response_cache().store(*prepared[id(answering)][0], "".join(chunks))
+            _record_completion(answering, started_at, "".join(chunks))
+
+        # Identical requests in flight follow this one's chunks as they arrive
+        yield from get_single_flight().run(request_fingerprint(*cache_key), produce)
+        print(f"✅ Successfully streamed response for user: {user_id}")
+    except Exception as e:
+        error_msg = f"❌ Error streaming AI response: {e}"
+        print(error_msg, file=sys.stderr)
+        raise e
+
+
+async def get_provider_response_async(
+    user_id: str, prompt: str, context: Optional[List] = [], system_content=DEFAULT_SYSTEM_CONTENT
+) -> str:
+    print(f"🤖 Getting AI response for user: {user_id}")
+
+    try:
+        provider = await _get_user_provider_async(user_id)
+        cache_key, messages = _prepare_prompt(provider, prompt, context, system_content)
+        cached = await get_response_cache().lookup_async(*cache_key)
+        if cached is not None:
+            print(f"⚡ Answered from response cache for user: {user_id}")
+            return cached
+        prepared = {id(provider): (cache_key, messages)}
+
+        async def generate(candidate) -> AsyncIterator[str]:
+            candidate_messages = _prepare_candidate(prepared, candidate, prompt, context, system_content)
+            yield await candidate.generate_response_async(candidate_messages, system_content)
+
+        async def produce() -> AsyncIterator[str]:
+            started_at = time.monotonic()
+            answering, chunks = await get_provider_router().open_async(_candidates(provider), generate, kind="generate")
+            response = "".join([chunk async for chunk in chunks])
+            await get_response_cache().store_async(*prepared[id(answering)][0], response)
+            _record_completion(answering, started_at, response)
+            yield response
+
+        response = "".join(
+            [chunk async for chunk in get_single_flight().run_async(request_fingerprint(*cache_key), produce)]
+        )
+        print(f"✅ Successfully generated response for user: {user_id}")
+        return response
+    except Exception as e:
+        print(f"❌ Error generating AI response: {e}", file=sys.stderr)
+        raise e
+
+
+async def get_provider_response_stream_async(
+    user_id: str, prompt: str, context: Optional[List] = [], system_content=DEFAULT_SYSTEM_CONTENT
+) -> AsyncIterator[str]:
+    print(f"🤖 Streaming AI response for user: {user_id}")
+
+    try:
+        provider = await _get_user_provider_async(user_id)
+        cache_key, messages = _prepare_prompt(provider, prompt, context, system_content)
+        cached = await get_response_cache().lookup_async(*cache_key)
+        if cached is not None:
+            print(f"⚡ Answered from response cache for user: {user_id}")
+            yield cached
+            return
+        prepared = {id(provider): (cache_key, messages)}
+
+        def stream(candidate) -> AsyncIterator[str]:
+            candidate_messages = _prepare_candidate(prepared, candidate, prompt, context, system_content)
+            return candidate.stream_response_async(candidate_messages, system_content)
+
+        async def produce() -> AsyncIterator[str]:
+            started_at = time.monotonic()
+            answering, stream_chunks = await get_provider_router().open_async(_candidates(provider), stream)
+            _llm_first_token.observe(time.monotonic() - started_at, provider_key(answering), answering.current_model)
+            chunks = []
+            async for chunk in stream_chunks:
+                chunks.append(chunk)
+                yield chunk
+            await get_response_cache().store_async(*prepared[id(answering)][0], "".join(chunks))
+            _record_completion(answering, started_at, "".join(chunks))
+
+        async for chunk in get_single_flight().run_async(request_fingerprint(*cache_key), produce):
+            yield chunk
+        print(f"✅ Successfully streamed response for user: {user_id}")
+    except Exception as e:
+        print(f"❌ Error streaming AI response: {e}", file=sys.stderr)
+        raise e
@@ -1,4 +1,9 @@
+from typing import AsyncIterator, Iterator, List
+from metrics import counter
+from ..conversation import Message, group_turns
+from ..tokenizer import count_tokens
 from .base_provider import BaseAPIProvider
+from .client_registry import credentials_fingerprint, get_client, http_limits, max_retries, request_timeout
 import anthropic
 import os
 import logging
@@ -6,6 +11,44 @@ import logging
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+"""
+Anthropic Messages API provider.
+Prompt caching: `cache_control` breakpoints are placed on the system block, at the end of the first message (the
+long-lived context, such as a thread's rolling summary, which `ai/conversation.py` always puts first) and at the
+end of the history before the new turn. A breakpoint is only placed once the prompt up to it reaches the model's
+`cache_min_tokens` (Anthropic does not cache shorter prefixes), so short prompts are sent exactly as before.
+Cache reads, cache writes and uncached input tokens from each response's `usage` are counted per model in the
+`chatbot_llm_cache_read_tokens`, `chatbot_llm_cache_write_tokens` and `chatbot_llm_uncached_prompt_tokens` counters.
+Set `ANTHROPIC_PROMPT_CACHE=off` to send no breakpoints.
+"""
+
+CACHE_CONTROL = {"type": "ephemeral"}
+
+_cache_read_tokens = counter(
+    "llm_cache_read_tokens", "Prompt tokens read from the provider's prompt cache", ("provider", "model")
+)
+_cache_write_tokens = counter(
+    "llm_cache_write_tokens", "Prompt tokens written to the provider's prompt cache", ("provider", "model")
+)
+_uncached_tokens = counter(
+    "llm_uncached_prompt_tokens", "Prompt tokens neither read from nor written to the cache", ("provider", "model")
+)
+
+
+def _prompt_cache_enabled() -> bool:
+    return os.environ.get("ANTHROPIC_PROMPT_CACHE", "on").lower() != "off"
+
+
+def _log_api_error(e: anthropic.APIError):
+    if isinstance(e, anthropic.APIConnectionError):
+        logger.error(f"Server could not be reached: {e.__cause__}")
+    elif isinstance(e, anthropic.RateLimitError):
+        logger.error(f"A 429 status code was received. {e}")
+    elif isinstance(e, anthropic.AuthenticationError):
+        logger.error(f"There's an issue with your API key. {e}")
+    elif isinstance(e, anthropic.APIStatusError):
+        logger.error(f"Another non-200-range status code was received: {e.status_code}")
+
 
 class AnthropicAPI(BaseAPIProvider):
     MODELS = {
@@ -13,10 +56,31 @@ class AnthropicAPI(BaseAPIProvider):
             "name": "Claude 3.5 Sonnet",
             "provider": "Anthropic",
             "max_tokens": 4096,  # or 8192 with the header anthropic-beta: max-tokens-3-5-sonnet-2024-07-15
+            "context_window": 200000,
+            # Shortest prefix, in tokens, that Anthropic caches for the model
+            "cache_min_tokens": 1024,
+        },
+        "claude-3-sonnet-20240229": {
+            "name": "Claude 3 Sonnet",
+            "provider": "Anthropic",
+            "max_tokens": 4096,
+            "context_window": 200000,
+            "cache_min_tokens": 1024,
+        },
+        "claude-3-haiku-20240307": {
+            "name": "Claude 3 Haiku",
+            "provider": "Anthropic",
+            "max_tokens": 4096,
+            "context_window": 200000,
+            "cache_min_tokens": 2048,
+        },
+        "claude-3-opus-20240229": {
+            "name": "Claude 3 Opus",
+            "provider": "Anthropic",
+            "max_tokens": 4096,
+            "context_window": 200000,
+            "cache_min_tokens": 1024,
         },
-        "claude-3-sonnet-20240229": {"name": "Claude 3 Sonnet", "provider": "Anthropic", "max_tokens": 4096},
-        "claude-3-haiku-20240307": {"name": "Claude 3 Haiku", "provider": "Anthropic", "max_tokens": 4096},
-        "claude-3-opus-20240229": {"name": "Claude 3 Opus", "provider": "Anthropic", "max_tokens": 4096},
     }
 
     def __init__(self):
@@ -33,25 +97,100 @@ class AnthropicAPI(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    def _get_client(self) -> anthropic.Anthropic:
+        return get_client(
+            ("anthropic", credentials_fingerprint(self.api_key), None),
+            lambda: anthropic.Anthropic(
+                api_key=self.api_key,
+                max_retries=max_retries(),
+                http_client=anthropic.DefaultHttpxClient(limits=http_limits(), timeout=request_timeout()),
+            ),
+        )
+
+    def _get_async_client(self) -> anthropic.AsyncAnthropic:
+        return get_client(
+            ("anthropic-async", credentials_fingerprint(self.api_key), None),
+            lambda: anthropic.AsyncAnthropic(
+                api_key=self.api_key,
+                max_retries=max_retries(),
+                http_client=anthropic.DefaultAsyncHttpxClient(limits=http_limits(), timeout=request_timeout()),
+            ),
+        )
+
+    def _place_cache_breakpoints(self, system: List[dict], messages: List[dict]):
+        """Mark the system block, the first message and the history before the new turn as cacheable,
+        each only when the prompt up to it is long enough to be cached."""
+        # Every block in prompt order; the last one is the new turn, which is never reused
+        blocks = system + [block for message in messages for block in message["content"]]
+        breakpoints = {0, len(system) + len(messages[0]["content"]) - 1, len(blocks) - 2}
+        minimum = self.MODELS[self.current_model].get("cache_min_tokens", 1024)
+        prefix_tokens = 0
+        for index, block in enumerate(blocks[:-1]):
+            prefix_tokens += count_tokens(block["text"], self.current_model)
+            if index in breakpoints and prefix_tokens >= minimum:
+                block["cache_control"] = CACHE_CONTROL
+
+    def _message_args(self, messages: List[Message], system_content: str) -> dict:
+        system = [{"type": "text", "text": system_content}]
+        # Roles must alternate; consecutive turns of one role become text blocks of one message, in order
+        grouped = [
+            {"role": role, "content": [{"type": "text", "text": content} for content in contents]}
+            for role, contents in group_turns(messages)
+        ]
+        if _prompt_cache_enabled():
+            self._place_cache_breakpoints(system, grouped)
+        return dict(
+            model=self.current_model,
+            system=system,
+            messages=grouped,
+            max_tokens=self.MODELS[self.current_model]["max_tokens"],
+            timeout=request_timeout(),
+        )
+
+    def _record_usage(self, usage):
+        labels = (self.MODELS[self.current_model]["provider"], self.current_model)
+        _cache_read_tokens.inc(*labels, amount=getattr(usage, "cache_read_input_tokens", None) or 0)
+        _cache_write_tokens.inc(*labels, amount=getattr(usage, "cache_creation_input_tokens", None) or 0)
+        _uncached_tokens.inc(*labels, amount=usage.input_tokens or 0)
+
+    def generate_response(self, messages: List[Message], system_content: str) -> str:
         try:
-            self.client = anthropic.Anthropic(api_key=self.api_key)
-            response = self.client.messages.create(
-                model=self.current_model,
-                system=system_content,
-                messages=[{"role": "user", "content": [{"type": "text", "text": prompt}]}],
-                max_tokens=self.MODELS[self.current_model]["max_tokens"],
-            )
+            self.client = self._get_client()
+            response = self.client.messages.create(**self._message_args(messages, system_content))
+            self._record_usage(response.usage)
             return response.content[0].text
-        except anthropic.APIConnectionError as e:
-            logger.error(f"Server could not be reached: {e.__cause__}")
+        except anthropic.APIError as e:
+            _log_api_error(e)
             raise e
-        except anthropic.RateLimitError as e:
-            logger.error(f"A 429 status code was received. {e}")
+
+    def stream_response(self, messages: List[Message], system_content: str) -> Iterator[str]:
+        try:
+            self.client = self._get_client()
+            with self.client.messages.stream(**self._message_args(messages, system_content)) as stream:
+                for text in stream.text_stream:
+                    yield text
+                self._record_usage(stream.get_final_message().usage)
+        except anthropic.APIError as e:
+            _log_api_error(e)
             raise e
-        except anthropic.AuthenticationError as e:
-            logger.error(f"There's an issue with your API key. {e}")
+
+    async def generate_response_async(self, messages: List[Message], system_content: str) -> str:
+        try:
+            client = self._get_async_client()
+            response = await client.messages.create(**self._message_args(messages, system_content))
+            self._record_usage(response.usage)
+            return response.content[0].text
+        except anthropic.APIError as e:
+            _log_api_error(e)
             raise e
-        except anthropic.APIStatusError as e:
-            logger.error(f"Another non-200-range status code was received: {e.status_code}")
+
+    async def stream_response_async(self, messages: List[Message], system_content: str) -> AsyncIterator[str]:
+        try:
+            client = self._get_async_client()
+            async with client.messages.stream(**self._message_args(messages, system_content)) as stream:
+                async for text in stream.text_stream:
+                    yield text
+                self._record_usage((await stream.get_final_message()).usage)
+        except anthropic.APIError as e:
+            _log_api_error(e)
             raise e
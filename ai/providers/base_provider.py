@@ -1,4 +1,9 @@
 # A base class for API providers, defining the interface and common properties for subclasses.
+# `messages` are the role-tagged turns built by `ai/conversation.py`, oldest first and ending with the new prompt.
+from typing import AsyncIterator, Iterator, List
+import asyncio
+
+from ..conversation import Message
 
 
 class BaseAPIProvider(object):
@@ -8,5 +13,16 @@ class BaseAPIProvider(object):
     def get_models(self) -> dict:
         raise NotImplementedError("Subclass must implement get_models")
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
+    def generate_response(self, messages: List[Message], system_content: str) -> str:
         raise NotImplementedError("Subclass must implement generate_response")
+
+    def stream_response(self, messages: List[Message], system_content: str) -> Iterator[str]:
+        # Providers without native streaming yield the whole completion as a single chunk
+        yield self.generate_response(messages, system_content)
+
+    async def generate_response_async(self, messages: List[Message], system_content: str) -> str:
+        # Providers without an async client run the blocking call on a worker thread
+        return await asyncio.to_thread(self.generate_response, messages, system_content)
+
+    async def stream_response_async(self, messages: List[Message], system_content: str) -> AsyncIterator[str]:
+        yield await self.generate_response_async(messages, system_content)
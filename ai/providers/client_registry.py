@@ -0,0 +1,144 @@
+from collections import OrderedDict
+from typing import Callable, Hashable, List, Optional, Tuple, TypeVar
+import hashlib
+import inspect
+import logging
+import os
+import threading
+
+import httpx
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Process-wide registry of long-lived SDK clients.
+SDK clients own an HTTP connection pool, so building one per message throws away
+every pooled connection and TLS session. Providers ask the registry for a client keyed by
+(provider, credentials, base_url) and the same thread-safe client is handed back on every call.
+Kinds of client that are built per request setting (such as a Vertex AI model per system instruction) pass
+`max_per_kind`, and only that many of the most recently used clients of the kind are kept.
+Use `aclose_clients()` on shutdown of the asyncio app, whose clients must be closed by awaiting them.
+Pool size, keep-alive and timeouts are configured through the environment:
+`LLM_HTTP_MAX_CONNECTIONS`, `LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS`, `LLM_HTTP_KEEPALIVE_EXPIRY`,
+`LLM_REQUEST_TIMEOUT`, `LLM_CONNECT_TIMEOUT` and `LLM_MAX_RETRIES`.
+"""
+
+T = TypeVar("T")
+
+# Least recently used first among the clients of a bounded kind
+_clients: "OrderedDict[Tuple[Hashable, ...], object]" = OrderedDict()
+_lock = threading.Lock()
+
+
+def _env_number(name: str, default: float, cast=float):
+    value = os.environ.get(name)
+    if not value:
+        return default
+    try:
+        return cast(value)
+    except ValueError:
+        logger.error(f"Invalid value for {name}: {value!r}, using {default}")
+        return default
+
+
+def http_limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=_env_number("LLM_HTTP_MAX_CONNECTIONS", 20, int),
+        max_keepalive_connections=_env_number("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", 10, int),
+        keepalive_expiry=_env_number("LLM_HTTP_KEEPALIVE_EXPIRY", 60.0),
+    )
+
+
+def request_timeout() -> httpx.Timeout:
+    """Timeout applied to every individual LLM call."""
+    return httpx.Timeout(
+        _env_number("LLM_REQUEST_TIMEOUT", 60.0),
+        connect=_env_number("LLM_CONNECT_TIMEOUT", 5.0),
+    )
+
+
+def max_retries() -> int:
+    # Retries and backoff are handled by the provider router, SDK-level retries would multiply them
+    return _env_number("LLM_MAX_RETRIES", 0, int)
+
+
+def credentials_fingerprint(*secrets: str) -> str:
+    """Hash credentials so raw API keys are never used as registry keys."""
+    digest = hashlib.sha256()
+    for secret in secrets:
+        digest.update((secret or "").encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:16]
+
+
+def get_client(key: Tuple[Hashable, ...], factory: Callable[[], T], max_per_kind: Optional[int] = None) -> T:
+    """Return the client registered under `key`, building it with `factory` on first use.
+    With `max_per_kind`, at most that many clients whose key starts with `key[0]` are kept."""
+    client = _clients.get(key)
+    if client is not None:
+        if max_per_kind:
+            with _lock:
+                if key in _clients:
+                    _clients.move_to_end(key)
+        return client
+    evicted = []
+    with _lock:
+        client = _clients.get(key)
+        if client is None:
+            logger.info(f"Creating pooled client for {key[0]}")
+            client = factory()
+            _clients[key] = client
+            if max_per_kind:
+                evicted = _evict(key[0], max_per_kind)
+    for old_client in evicted:
+        _close(old_client)
+    return client
+
+
+def _evict(kind: Hashable, max_per_kind: int) -> List[object]:
+    """Drop the least recently used clients of `kind` beyond `max_per_kind`. Called with the lock held."""
+    keys = [key for key in _clients if key[0] == kind]
+    return [_clients.pop(key) for key in keys[: max(len(keys) - max_per_kind, 0)]]
+
+
+def _close(client: object):
+    close = getattr(client, "close", None)
+    if not callable(close):
+        return
+    try:
+        result = close()
+        if inspect.isawaitable(result):
+            # Async clients have to be closed on their event loop, with `aclose_clients()`
+            logger.warning(f"Not closing {type(client).__name__} outside its event loop")
+            if inspect.iscoroutine(result):
+                result.close()
+    except Exception as e:
+        logger.error(f"Error closing client: {e}")
+
+
+def _take_clients() -> List[object]:
+    with _lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    return clients
+
+
+def close_clients():
+    """Close and forget every registered client, e.g. on shutdown or credential rotation."""
+    for client in _take_clients():
+        _close(client)
+
+
+async def aclose_clients():
+    """asyncio version of `close_clients`: the `close()` of async clients (AsyncOpenAI, AsyncAnthropic) is awaited."""
+    for client in _take_clients():
+        close = getattr(client, "close", None)
+        if not callable(close):
+            continue
+        try:
+            result = close()
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            logger.error(f"Error closing client: {e}")
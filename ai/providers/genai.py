@@ -1,5 +1,8 @@
+from typing import AsyncIterator, Iterator, List
 import openai
+from ..conversation import Message
 from .base_provider import BaseAPIProvider
+from .client_registry import credentials_fingerprint, get_client, http_limits, max_retries, request_timeout
 import os
 import logging
 
@@ -7,9 +10,21 @@ logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+def _log_api_error(e: openai.APIError):
+    if isinstance(e, openai.APIConnectionError):
+        logger.error(f"Server could not be reached: {e.__cause__}")
+    elif isinstance(e, openai.RateLimitError):
+        logger.error(f"A 429 status code was received. {e}")
+    elif isinstance(e, openai.AuthenticationError):
+        logger.error(f"There's an issue with your API key. {e}")
+    elif isinstance(e, openai.APIStatusError):
+        logger.error(f"Another non-200-range status code was received: {e.status_code}")
+
+
 class GenAI_API(BaseAPIProvider):
     MODELS = {
-        "genai-agent": {"name": "GenAI Agent", "provider": "GenAI", "max_tokens": 2048},
+        # The agent's underlying model is configured in DigitalOcean; assume a conservative window
+        "genai-agent": {"name": "GenAI Agent", "provider": "GenAI", "max_tokens": 2048, "context_window": 8192},
     }
 
     def __init__(self):
@@ -27,28 +42,74 @@ class GenAI_API(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
-        try:
-            self.client = openai.OpenAI(
+    def _get_client(self) -> openai.OpenAI:
+        return get_client(
+            ("genai", credentials_fingerprint(self.api_key), self.base_url),
+            lambda: openai.OpenAI(
+                api_key=self.api_key,
+                base_url=self.base_url,
+                max_retries=max_retries(),
+                http_client=openai.DefaultHttpxClient(limits=http_limits(), timeout=request_timeout()),
+            ),
+        )
+
+    def _get_async_client(self) -> openai.AsyncOpenAI:
+        return get_client(
+            ("genai-async", credentials_fingerprint(self.api_key), self.base_url),
+            lambda: openai.AsyncOpenAI(
                 api_key=self.api_key,
-                base_url=self.base_url
-            )
-            response = self.client.chat.completions.create(
-                model=self.current_model,
-                n=1,
-                messages=[{"role": "system", "content": system_content}, {"role": "user", "content": prompt}],
-                max_tokens=self.MODELS[self.current_model]["max_tokens"],
-            )
+                base_url=self.base_url,
+                max_retries=max_retries(),
+                http_client=openai.DefaultAsyncHttpxClient(limits=http_limits(), timeout=request_timeout()),
+            ),
+        )
+
+    def _completion_args(self, messages: List[Message], system_content: str) -> dict:
+        return dict(
+            model=self.current_model,
+            n=1,
+            # The system message first and earlier turns unchanged, so follow-ups share a cacheable prefix
+            messages=[{"role": "system", "content": system_content}, *messages],
+            max_tokens=self.MODELS[self.current_model]["max_tokens"],
+            timeout=request_timeout(),
+        )
+
+    def generate_response(self, messages: List[Message], system_content: str) -> str:
+        try:
+            self.client = self._get_client()
+            response = self.client.chat.completions.create(**self._completion_args(messages, system_content))
             return response.choices[0].message.content
-        except openai.APIConnectionError as e:
-            logger.error(f"Server could not be reached: {e.__cause__}")
+        except openai.APIError as e:
+            _log_api_error(e)
             raise e
-        except openai.RateLimitError as e:
-            logger.error(f"A 429 status code was received. {e}")
+
+    def stream_response(self, messages: List[Message], system_content: str) -> Iterator[str]:
+        try:
+            self.client = self._get_client()
+            stream = self.client.chat.completions.create(**self._completion_args(messages, system_content), stream=True)
+            for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.APIError as e:
+            _log_api_error(e)
+            raise e
+
+    async def generate_response_async(self, messages: List[Message], system_content: str) -> str:
+        try:
+            client = self._get_async_client()
+            response = await client.chat.completions.create(**self._completion_args(messages, system_content))
+            return response.choices[0].message.content
+        except openai.APIError as e:
+            _log_api_error(e)
             raise e
-        except openai.AuthenticationError as e:
-            logger.error(f"There's an issue with your API key. {e}")
+
+    async def stream_response_async(self, messages: List[Message], system_content: str) -> AsyncIterator[str]:
+        try:
+            client = self._get_async_client()
+            stream = await client.chat.completions.create(**self._completion_args(messages, system_content), stream=True)
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        except openai.APIError as e:
+            _log_api_error(e)
             raise e
-        except openai.APIStatusError as e:
-            logger.error(f"Another non-200-range status code was received: {e.status_code}")
-            raise e 
\ No newline at end of file
@@ -0,0 +1,447 @@
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+from metrics import register_stats
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Routes an LLM call over an ordered list of candidate providers: the user's selection first, then the
+`LLM_FALLBACK_CHAIN` entries that are configured.
+Each candidate is retried on rate limits, timeouts and 5xx answers with exponential backoff and full jitter
+(`LLM_RETRIES`, default 2; `LLM_BACKOFF_BASE`, default 0.5 seconds). A `retry-after` header is honored when it
+is at most `LLM_BACKOFF_MAX` seconds (default 10); longer waits move on to the next candidate instead.
+Every provider has a circuit breaker: after `LLM_BREAKER_FAILURES` consecutive failures (default 5) it is
+skipped for `LLM_BREAKER_RESET_SECONDS` (default 30), then a single probe call decides whether it closes again.
+With `LLM_HEDGING=on`, when the current candidate has not produced its first chunk after its recent p95
+time-to-first-chunk (or `LLM_HEDGE_DEFAULT_DELAY_MS`, default 5000, until enough samples exist), the next
+candidate is started as well and whichever answers first is used.
+Failover and hedging happen before the first chunk; an error in the middle of a stream is raised to the caller.
+"""
+
+_RETRYABLE_STATUS = {408, 409, 429}
+# Errors that mean this provider cannot serve the request, but another one might
+_FAILOVER_STATUS = {401, 403, 404}
+_RETRYABLE_ERRORS = {"APIConnectionError", "APITimeoutError", "DeadlineExceeded", "ServiceUnavailable", "RetryError"}
+_LATENCY_SAMPLES = 200
+_MIN_LATENCY_SAMPLES = 20
+_EMPTY = object()
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, default))
+    except ValueError:
+        logger.error(f"Invalid value for {name}, using {default}")
+        return default
+
+
+def _status(e: Exception) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(e, attr, None)
+        if isinstance(value, int):
+            return int(value)
+    return None
+
+
+def is_retryable(e: Exception) -> bool:
+    status = _status(e)
+    if status is not None and (status in _RETRYABLE_STATUS or status >= 500):
+        return True
+    return isinstance(e, (ConnectionError, TimeoutError)) or type(e).__name__ in _RETRYABLE_ERRORS
+
+
+def should_fail_over(e: Exception) -> bool:
+    return is_retryable(e) or _status(e) in _FAILOVER_STATUS
+
+
+def retry_after(e: Exception) -> Optional[float]:
+    """Seconds the provider asked us to wait, from `retry-after-ms` or `retry-after` response headers."""
+    headers = getattr(getattr(e, "response", None), "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        value = headers.get("retry-after")
+        if not value:
+            return None
+        try:
+            return float(value)
+        except ValueError:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class ProviderUnavailableError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = "half_open"
+                self._probing = False
+            if self.state == "half_open" and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != "closed":
+                logger.info(f"Circuit for {self.name} closed")
+            self.state = "closed"
+            self.failures = 0
+            self._probing = False
+
+    def release(self):
+        """End a call that says nothing about the provider's health, such as a rejected request."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._probing = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                logger.error(f"Circuit for {self.name} opened after {self.failures} failures")
+                self.state = "open"
+                self.opened_at = time.monotonic()
+
+
+def provider_key(provider) -> str:
+    return provider.MODELS[provider.current_model]["provider"]
+
+
+class ProviderRouter:
+    def __init__(self):
+        self.retries = int(_env_float("LLM_RETRIES", 2))
+        self.backoff_base = _env_float("LLM_BACKOFF_BASE", 0.5)
+        self.backoff_max = _env_float("LLM_BACKOFF_MAX", 10)
+        self.failure_threshold = int(_env_float("LLM_BREAKER_FAILURES", 5))
+        self.reset_timeout = _env_float("LLM_BREAKER_RESET_SECONDS", 30)
+        self.hedging = os.environ.get("LLM_HEDGING", "off").lower() == "on"
+        self.hedge_default_delay = _env_float("LLM_HEDGE_DEFAULT_DELAY_MS", 5000) / 1000
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[Tuple[str, str], deque] = {}
+        self._lock = threading.Lock()
+        self._hedge_pool: Optional[ThreadPoolExecutor] = None
+        self._counters = {"calls": 0, "retries": 0, "failovers": 0, "hedged": 0, "hedge_wins": 0}
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def breaker(self, provider) -> CircuitBreaker:
+        key = provider_key(provider)
+        with self._lock:
+            if key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(key, self.failure_threshold, self.reset_timeout)
+            return self._breakers[key]
+
+    def _record_latency(self, provider, kind: str, seconds: float):
+        with self._lock:
+            samples = self._latencies.setdefault((provider_key(provider), kind), deque(maxlen=_LATENCY_SAMPLES))
+            samples.append(seconds)
+
+    def hedge_delay(self, provider, kind: str) -> float:
+        """Recent p95 time to first chunk for this provider and call kind."""
+        with self._lock:
+            samples = sorted(self._latencies.get((provider_key(provider), kind), ()))
+        if len(samples) < _MIN_LATENCY_SAMPLES:
+            return self.hedge_default_delay
+        return samples[int(len(samples) * 0.95) - 1]
+
+    def _backoff(self, attempt: int, e: Exception) -> Optional[float]:
+        """Seconds to wait before retrying, or None to move on to the next candidate."""
+        if attempt >= self.retries or not is_retryable(e):
+            return None
+        wait_for = retry_after(e)
+        if wait_for is None:
+            return random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        return wait_for if wait_for <= self.backoff_max else None
+
+    def _attempt(self, provider, open_stream: Callable, kind: str):
+        """Open the provider's stream and read its first chunk, retrying transient errors."""
+        breaker = self.breaker(provider)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise ProviderUnavailableError(f"Circuit for {breaker.name} is open")
+            started_at = time.monotonic()
+            try:
+                iterator = open_stream(provider)
+                first = next(iterator, _EMPTY)
+            except Exception as e:
+                if should_fail_over(e):
+                    breaker.record_failure()
+                else:
+                    # A rejected request (e.g. a 400) neither proves nor disproves that the provider is healthy
+                    breaker.release()
+                wait_for = self._backoff(attempt, e)
+                if wait_for is None:
+                    raise e
+                logger.warning(f"{breaker.name} call failed ({e}), retrying in {wait_for:.1f}s")
+                self._count("retries")
+                attempt += 1
+                time.sleep(wait_for)
+                continue
+            breaker.record_success()
+            self._record_latency(provider, kind, time.monotonic() - started_at)
+            return iterator, first
+
+    def _continue(self, provider, iterator: Iterator[str], first) -> Iterator[str]:
+        try:
+            if first is not _EMPTY:
+                yield first
+            yield from iterator
+        except Exception as e:
+            if should_fail_over(e):
+                self.breaker(provider).record_failure()
+            raise e
+
+    def _get_hedge_pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(
+                    max_workers=int(_env_float("LLM_HEDGE_POOL_SIZE", 16)), thread_name_prefix="llm-hedge"
+                )
+            return self._hedge_pool
+
+    def open(self, candidates: List, open_stream: Callable, kind: str = "stream") -> Tuple[object, Iterator[str]]:
+        """Return the provider that answered and an iterator over its chunks.
+        `open_stream(provider)` must return an iterator that only calls the provider when first advanced."""
+        self._count("calls")
+        if self.hedging and len(candidates) > 1:
+            return self._open_hedged(candidates, open_stream, kind)
+        last_error: Optional[Exception] = None
+        for index, provider in enumerate(candidates):
+            try:
+                iterator, first = self._attempt(provider, open_stream, kind)
+                return provider, self._continue(provider, iterator, first)
+            except Exception as e:
+                if not (isinstance(e, ProviderUnavailableError) or should_fail_over(e)):
+                    raise e
+                last_error = e
+                if index + 1 < len(candidates):
+                    self._count("failovers")
+                    print(
+                        f"🔀 {provider_key(provider)} unavailable ({e}), "
+                        f"falling back to {provider_key(candidates[index + 1])}"
+                    )
+        raise last_error or ProviderUnavailableError("No provider available")
+
+    def _open_hedged(self, candidates: List, open_stream: Callable, kind: str):
+        pool = self._get_hedge_pool()
+        pending: Dict = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+        while True:
+            if not pending:
+                if next_index >= len(candidates):
+                    raise last_error or ProviderUnavailableError("No provider available")
+                if next_index > 0:
+                    self._count("failovers")
+                pending[pool.submit(self._attempt, candidates[next_index], open_stream, kind)] = candidates[next_index]
+                next_index += 1
+            timeout = None
+            if next_index < len(candidates):
+                timeout = self.hedge_delay(candidates[next_index - 1], kind)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            if not done:
+                self._count("hedged")
+                print(
+                    f"🔀 Hedging slow {provider_key(candidates[next_index - 1])} call "
+                    f"with {provider_key(candidates[next_index])}"
+                )
+                pending[pool.submit(self._attempt, candidates[next_index], open_stream, kind)] = candidates[next_index]
+                next_index += 1
+                continue
+            for future in done:
+                provider = pending.pop(future)
+                try:
+                    iterator, first = future.result()
+                except Exception as e:
+                    if not (isinstance(e, ProviderUnavailableError) or should_fail_over(e)):
+                        _close_streams(pending)
+                        raise e
+                    last_error = e
+                    continue
+                if provider is not candidates[0]:
+                    self._count("hedge_wins")
+                _close_streams(pending)
+                return provider, self._continue(provider, iterator, first)
+
+    async def _attempt_async(self, provider, open_stream: Callable, kind: str):
+        breaker = self.breaker(provider)
+        attempt = 0
+        while True:
+            if not breaker.allow():
+                raise ProviderUnavailableError(f"Circuit for {breaker.name} is open")
+            started_at = time.monotonic()
+            try:
+                iterator = open_stream(provider)
+                first = await iterator.__anext__()
+            except StopAsyncIteration:
+                first = _EMPTY
+            except Exception as e:
+                if should_fail_over(e):
+                    breaker.record_failure()
+                else:
+                    breaker.release()
+                wait_for = self._backoff(attempt, e)
+                if wait_for is None:
+                    raise e
+                logger.warning(f"{breaker.name} call failed ({e}), retrying in {wait_for:.1f}s")
+                self._count("retries")
+                attempt += 1
+                await asyncio.sleep(wait_for)
+                continue
+            breaker.record_success()
+            self._record_latency(provider, kind, time.monotonic() - started_at)
+            return iterator, first
+
+    async def _continue_async(self, provider, iterator: AsyncIterator[str], first) -> AsyncIterator[str]:
+        try:
+            if first is not _EMPTY:
+                yield first
+            async for chunk in iterator:
+                yield chunk
+        except Exception as e:
+            if should_fail_over(e):
+                self.breaker(provider).record_failure()
+            raise e
+
+    async def open_async(self, candidates: List, open_stream: Callable, kind: str = "stream"):
+        """Async variant of `open`; `open_stream(provider)` returns an async iterator."""
+        self._count("calls")
+        pending: Dict[asyncio.Task, object] = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+        hedging = self.hedging and len(candidates) > 1
+        try:
+            while True:
+                if not pending:
+                    if next_index >= len(candidates):
+                        raise last_error or ProviderUnavailableError("No provider available")
+                    if next_index > 0:
+                        self._count("failovers")
+                        print(f"🔀 Falling back to {provider_key(candidates[next_index])}")
+                    task = asyncio.ensure_future(self._attempt_async(candidates[next_index], open_stream, kind))
+                    pending[task] = candidates[next_index]
+                    next_index += 1
+                timeout = None
+                if hedging and next_index < len(candidates):
+                    timeout = self.hedge_delay(candidates[next_index - 1], kind)
+                done, _ = await asyncio.wait(pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self._count("hedged")
+                    print(
+                        f"🔀 Hedging slow {provider_key(candidates[next_index - 1])} call "
+                        f"with {provider_key(candidates[next_index])}"
+                    )
+                    task = asyncio.ensure_future(self._attempt_async(candidates[next_index], open_stream, kind))
+                    pending[task] = candidates[next_index]
+                    next_index += 1
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    try:
+                        iterator, first = task.result()
+                    except Exception as e:
+                        if not (isinstance(e, ProviderUnavailableError) or should_fail_over(e)):
+                            raise e
+                        last_error = e
+                        continue
+                    if hedging and provider is not candidates[0]:
+                        self._count("hedge_wins")
+                    return provider, self._continue_async(provider, iterator, first)
+        finally:
+            # Attempts that finished in the same round as the one returned, or that are still running
+            for task in pending:
+                if not task.done():
+                    task.add_done_callback(_close_stream_async)
+                    task.cancel()
+                elif not task.cancelled() and task.exception() is None:
+                    iterator, _ = task.result()
+                    try:
+                        await iterator.aclose()
+                    except Exception as e:
+                        logger.error(f"Failed to close a hedged stream: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            breakers = {
+                name: {"state": b.state, "open": int(b.state != "closed"), "failures": b.failures}
+                for name, b in self._breakers.items()
+            }
+            latencies = {
+                f"{name}:{kind}": {"samples": len(samples), "p95_seconds": sorted(samples)[int(len(samples) * 0.95) - 1]}
+                for (name, kind), samples in self._latencies.items()
+                if len(samples) >= _MIN_LATENCY_SAMPLES
+            }
+            return {**self._counters, "breakers": breakers, "latency": latencies}
+
+
+def _close_stream(future):
+    """Close the stream of a hedged attempt that lost the race once it has opened."""
+    if future.cancelled() or future.exception() is not None:
+        return
+    iterator, _ = future.result()
+    close = getattr(iterator, "close", None)
+    if callable(close):
+        close()
+
+
+def _close_streams(futures):
+    """Close the streams of every other attempt, those already finished included, as each one opens."""
+    for future in futures:
+        future.add_done_callback(_close_stream)
+
+
+def _close_stream_async(task: asyncio.Task):
+    # A cancelled attempt may still have opened its stream before the cancellation reached it
+    if task.cancelled() or task.exception() is not None:
+        return
+    iterator, _ = task.result()
+    aclose = getattr(iterator, "aclose", None)
+    if callable(aclose):
+        asyncio.ensure_future(aclose())
+
+
+_provider_router: Optional[ProviderRouter] = None
+_router_lock = threading.Lock()
+
+
+def get_provider_router() -> ProviderRouter:
+    global _provider_router
+    if _provider_router is None:
+        with _router_lock:
+            if _provider_router is None:
+                _provider_router = ProviderRouter()
+                register_stats("llm_router", _provider_router.stats)
+    return _provider_router
@@ -1,15 +1,36 @@
+import hashlib
 import logging
 import os
+from typing import AsyncIterator, Iterator, List, Optional, Tuple
 
 import google.api_core.exceptions
 import vertexai.generative_models
 
+from ..conversation import Message, group_turns
 from .base_provider import BaseAPIProvider
+from .client_registry import get_client
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 
+def _log_api_error(e: google.api_core.exceptions.GoogleAPIError):
+    if isinstance(e, google.api_core.exceptions.Unauthorized):
+        logger.error(f"Client is not Authorized. {e.reason}, {e.message}")
+    elif isinstance(e, google.api_core.exceptions.Forbidden):
+        logger.error(f"Client Forbidden. {e.reason}, {e.message}")
+    elif isinstance(e, google.api_core.exceptions.TooManyRequests):
+        logger.error(f"Too many requests. {e.reason}, {e.message}")
+    elif isinstance(e, google.api_core.exceptions.ClientError):
+        logger.error(f"Client error: {e.reason}, {e.message}")
+    elif isinstance(e, google.api_core.exceptions.ServerError):
+        logger.error(f"Server error: {e.reason}, {e.message}")
+    elif isinstance(e, google.api_core.exceptions.GoogleAPICallError):
+        logger.error(f"Error: {e.reason}, {e.message}")
+    else:
+        logger.error(f"Unknown error. {e}")
+
+
 class VertexAPI(BaseAPIProvider):
     VERTEX_AI_PROVIDER = "VertexAI"
     MODELS = {
@@ -17,65 +38,93 @@ class VertexAPI(BaseAPIProvider):
             "name": "Gemini 1.5 Flash 001",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 1048576,
             "system_instruction_supported": True,
         },
         "gemini-1.5-flash-002": {
             "name": "Gemini 1.5 Flash 002",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 1048576,
             "system_instruction_supported": True,
         },
         "gemini-1.5-pro-002": {
             "name": "Gemini 1.5 Pro 002",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 2097152,
             "system_instruction_supported": True,
         },
         "gemini-1.5-pro-001": {
             "name": "Gemini 1.5 Pro 001",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 2097152,
             "system_instruction_supported": True,
         },
         "gemini-1.0-pro-002": {
             "name": "Gemini 1.0 Pro 002",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 32760,
             "system_instruction_supported": True,
         },
         "gemini-1.0-pro-001": {
             "name": "Gemini 1.0 Pro 001",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 32760,
             "system_instruction_supported": False,
         },
         "gemini-flash-experimental": {
             "name": "Gemini Flash Experimental",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 1048576,
             "system_instruction_supported": True,
         },
         "gemini-pro-experimental": {
             "name": "Gemini Pro Experimental",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 2097152,
             "system_instruction_supported": True,
         },
         "gemini-experimental": {
             "name": "Gemini Experimental",
             "provider": VERTEX_AI_PROVIDER,
             "max_tokens": 8192,
+            "context_window": 2097152,
             "system_instruction_supported": True,
         },
     }
 
     def __init__(self):
-        self.enabled = bool(os.environ.get("VERTEX_AI_PROJECT_ID", ""))
-        if self.enabled:
-            vertexai.init(
-                project=os.environ.get("VERTEX_AI_PROJECT_ID"),
-                location=os.environ.get("VERTEX_AI_LOCATION"),
-            )
+        self.project = os.environ.get("VERTEX_AI_PROJECT_ID", "")
+        self.location = os.environ.get("VERTEX_AI_LOCATION")
+        self.enabled = bool(self.project)
+
+    def _init_vertexai(self) -> bool:
+        vertexai.init(project=self.project, location=self.location)
+        return True
+
+    def _get_client(self, system_instruction) -> vertexai.generative_models.GenerativeModel:
+        # vertexai.init only needs to run once per (project, location) for the whole process, before the first call
+        get_client(("vertexai", self.project, self.location), self._init_vertexai)
+        # The SDK fixes the system instruction when the model is built, so there is one model per instruction;
+        # keyed on its hash and bounded, so varying system content cannot grow the registry without limit
+        instruction_hash = hashlib.sha256(system_instruction.encode("utf-8")).hexdigest() if system_instruction else None
+        return get_client(
+            ("vertexai-model", self.project, self.location, self.current_model, instruction_hash),
+            lambda: vertexai.generative_models.GenerativeModel(
+                model_name=self.current_model,
+                generation_config={
+                    "max_output_tokens": self.MODELS[self.current_model]["max_tokens"],
+                },
+                system_instruction=system_instruction,
+            ),
+            max_per_kind=int(os.environ.get("VERTEX_AI_MAX_MODELS", 32)),
+        )
 
     def set_model(self, model_name: str):
         if model_name not in self.MODELS.keys():
@@ -88,44 +137,71 @@ class VertexAPI(BaseAPIProvider):
         else:
             return {}
 
-    def generate_response(self, prompt: str, system_content: str) -> str:
-        system_instruction = None
-        if self.MODELS[self.current_model]["system_instruction_supported"]:
-            system_instruction = system_content
-        else:
-            prompt = system_content + "\n" + prompt
-
-        try:
-            self.client = vertexai.generative_models.GenerativeModel(
-                model_name=self.current_model,
-                generation_config={
-                    "max_output_tokens": self.MODELS[self.current_model]["max_tokens"],
-                },
-                system_instruction=system_instruction,
-            )
-            response = self.client.generate_content(
-                contents=prompt,
+    def _prepare(
+        self, messages: List[Message], system_content: str
+    ) -> Tuple[List[vertexai.generative_models.Content], Optional[str]]:
+        """Return the contents and system instruction, inlining the system content for models without support."""
+        system_instruction = system_content
+        grouped = group_turns(messages)
+        if not self.MODELS[self.current_model]["system_instruction_supported"]:
+            # Conversations always start with a user turn; the system content leads it
+            grouped[0][1].insert(0, system_content)
+            system_instruction = None
+        contents = [
+            vertexai.generative_models.Content(
+                role="model" if role == "assistant" else "user",
+                parts=[vertexai.generative_models.Part.from_text(text) for text in texts],
             )
-            return "".join(part.text for part in response.candidates[0].content.parts)
+            for role, texts in grouped
+        ]
+        return contents, system_instruction
 
-        except google.api_core.exceptions.Unauthorized as e:
-            logger.error(f"Client is not Authorized. {e.reason}, {e.message}")
-            raise e
-        except google.api_core.exceptions.Forbidden as e:
-            logger.error(f"Client Forbidden. {e.reason}, {e.message}")
-            raise e
-        except google.api_core.exceptions.TooManyRequests as e:
-            logger.error(f"Too many requests. {e.reason}, {e.message}")
-            raise e
-        except google.api_core.exceptions.ClientError as e:
-            logger.error(f"Client error: {e.reason}, {e.message}")
+    @staticmethod
+    def _response_text(response) -> str:
+        if not response.candidates or not response.candidates[0].content.parts:
+            return ""
+        return "".join(part.text for part in response.candidates[0].content.parts)
+
+    def generate_response(self, messages: List[Message], system_content: str) -> str:
+        contents, system_instruction = self._prepare(messages, system_content)
+        try:
+            self.client = self._get_client(system_instruction)
+            response = self.client.generate_content(contents=contents)
+            return self._response_text(response)
+        except google.api_core.exceptions.GoogleAPIError as e:
+            _log_api_error(e)
             raise e
-        except google.api_core.exceptions.ServerError as e:
-            logger.error(f"Server error: {e.reason}, {e.message}")
+
+    def stream_response(self, messages: List[Message], system_content: str) -> Iterator[str]:
+        contents, system_instruction = self._prepare(messages, system_content)
+        try:
+            self.client = self._get_client(system_instruction)
+            for response in self.client.generate_content(contents=contents, stream=True):
+                text = self._response_text(response)
+                if text:
+                    yield text
+        except google.api_core.exceptions.GoogleAPIError as e:
+            _log_api_error(e)
             raise e
-        except google.api_core.exceptions.GoogleAPICallError as e:
-            logger.error(f"Error: {e.reason}, {e.message}")
+
+    async def generate_response_async(self, messages: List[Message], system_content: str) -> str:
+        contents, system_instruction = self._prepare(messages, system_content)
+        try:
+            client = self._get_client(system_instruction)
+            response = await client.generate_content_async(contents=contents)
+            return self._response_text(response)
+        except google.api_core.exceptions.GoogleAPIError as e:
+            _log_api_error(e)
             raise e
+
+    async def stream_response_async(self, messages: List[Message], system_content: str) -> AsyncIterator[str]:
+        contents, system_instruction = self._prepare(messages, system_content)
+        try:
+            client = self._get_client(system_instruction)
+            async for response in await client.generate_content_async(contents=contents, stream=True):
+                text = self._response_text(response)
+                if text:
+                    yield text
         except google.api_core.exceptions.GoogleAPIError as e:
-            logger.error(f"Unknown error. {e}")
+            _log_api_error(e)
             raise e
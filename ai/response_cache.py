@@ -0,0 +1,257 @@
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+
+from metrics import register_stats
+from state_store.redis_pool import get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Response cache in front of the AI providers.
+Entries are keyed by (provider, model, system content, normalized prompt, hash of the context actually sent),
+so the same question in a different conversation or with a different model is never answered from cache.
+With `REDIS_URL` set entries live in Redis, shared by every replica, with a TTL and an LRU bound kept in a
+sorted set of last-access times; otherwise an in-process LRU is used.
+`RESPONSE_CACHE` selects the mode: `off` (default), `exact` or `semantic`. Entries are shared across users and
+are not cleared when the knowledge base is re-indexed, so caching is opt-in. In semantic mode a prompt that
+misses exactly is compared against a local vector index of prompts cached under the same model, system content
+and context, and a neighbour above `RESPONSE_CACHE_SIMILARITY` (default 0.92) is returned. Embeddings come from
+`set_embedding_function()`; the default is a dependency-free hashed bag of words.
+Configured with `RESPONSE_CACHE_TTL` seconds (default 3600) and `RESPONSE_CACHE_MAX_ENTRIES` (default 10000).
+Hit rates are reported by `stats()`.
+"""
+
+KEY_PREFIX = "chatbot:response:"
+INDEX_KEY = "chatbot:response:lru"
+EMBEDDING_DIMENSIONS = 256
+
+EmbeddingFunction = Callable[[str], List[float]]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return re.sub(r"\s+", " ", prompt).strip().rstrip("?!.").lower()
+
+
+def hash_context(context: Optional[List[dict]]) -> str:
+    return hashlib.sha256(json.dumps(context or [], sort_keys=True).encode()).hexdigest()
+
+
+def hashed_bag_of_words(text: str) -> List[float]:
+    """Default embedding: word and word-bigram counts hashed into a fixed number of dimensions."""
+    vector = [0.0] * EMBEDDING_DIMENSIONS
+    words = re.findall(r"\w+", text.lower())
+    for feature in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        vector[int(hashlib.md5(feature.encode()).hexdigest(), 16) % EMBEDDING_DIMENSIONS] += 1.0
+    return vector
+
+
+def _cosine(a: List[float], b: List[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b))
+    return dot / norm if norm else 0.0
+
+
+class _LocalBackend:
+    def __init__(self, max_entries: int, ttl: float):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            if entry[1] < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return entry[0]
+
+    def set(self, key: str, value: str) -> List[str]:
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            evicted = []
+            while len(self._entries) > self.max_entries:
+                evicted.append(self._entries.popitem(last=False)[0])
+            return evicted
+
+
+class _RedisBackend:
+    def __init__(self, redis_url: str, max_entries: int, ttl: float):
+        self.redis_client = get_redis_client(redis_url)
+        self.max_entries = max_entries
+        self.ttl = int(ttl)
+
+    def get(self, key: str) -> Optional[str]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.get(KEY_PREFIX + key)
+        pipe.zadd(INDEX_KEY, {key: time.time()}, xx=True)
+        value, _ = pipe.execute()
+        return value
+
+    def set(self, key: str, value: str) -> List[str]:
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.set(KEY_PREFIX + key, value, ex=self.ttl)
+        pipe.zadd(INDEX_KEY, {key: time.time()})
+        # Entries that expired through their TTL are dropped from the index as well
+        pipe.zremrangebyscore(INDEX_KEY, "-inf", time.time() - self.ttl)
+        pipe.zcard(INDEX_KEY)
+        size = pipe.execute()[-1]
+        if size <= self.max_entries:
+            return []
+        evicted = [member for member, _ in self.redis_client.zpopmin(INDEX_KEY, size - self.max_entries)]
+        if evicted:
+            self.redis_client.delete(*[KEY_PREFIX + key for key in evicted])
+        return evicted
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        *,
+        mode: Optional[str] = None,
+        redis_url: Optional[str] = None,
+        max_entries: Optional[int] = None,
+        ttl: Optional[float] = None,
+        similarity: Optional[float] = None,
+    ):
+        self.mode = (mode or os.environ.get("RESPONSE_CACHE", "off")).lower()
+        self.max_entries = max_entries or int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 10000))
+        ttl = ttl or float(os.environ.get("RESPONSE_CACHE_TTL", 3600))
+        self.similarity = similarity or float(os.environ.get("RESPONSE_CACHE_SIMILARITY", 0.92))
+        redis_url = redis_url or os.environ.get("REDIS_URL")
+        self.backend = _RedisBackend(redis_url, self.max_entries, ttl) if redis_url else _LocalBackend(self.max_entries, ttl)
+        self.embed: EmbeddingFunction = hashed_bag_of_words
+        # scope -> {key: embedding}; scopes group entries that may answer for each other
+        self._index: Dict[str, Dict[str, List[float]]] = {}
+        self._index_size = 0
+        self._lock = threading.Lock()
+        self._counters = {"exact_hits": 0, "semantic_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("exact", "semantic")
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    @staticmethod
+    def _keys(provider: str, model: str, system_content: str, prompt: str, context: Optional[List[dict]]) -> Tuple[str, str]:
+        scope = hashlib.sha256(json.dumps([provider, model, system_content, hash_context(context)]).encode()).hexdigest()
+        key = hashlib.sha256(f"{scope}:{normalize_prompt(prompt)}".encode()).hexdigest()
+        return scope, key
+
+    def lookup(
+        self, provider: str, model: str, system_content: str, prompt: str, context: Optional[List[dict]]
+    ) -> Optional[str]:
+        """Return a cached response for this request, or None."""
+        if not self.enabled:
+            return None
+        scope, key = self._keys(provider, model, system_content, prompt, context)
+        try:
+            response = self.backend.get(key)
+            if response is not None:
+                self._count("exact_hits")
+                return response
+            if self.mode == "semantic":
+                neighbour = self._nearest(scope, self.embed(normalize_prompt(prompt)))
+                response = self.backend.get(neighbour) if neighbour else None
+                if response is not None:
+                    self._count("semantic_hits")
+                    return response
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Response cache lookup failed: {e}")
+        self._count("misses")
+        return None
+
+    def store(
+        self, provider: str, model: str, system_content: str, prompt: str, context: Optional[List[dict]], response: str
+    ):
+        if not self.enabled or not response:
+            return
+        scope, key = self._keys(provider, model, system_content, prompt, context)
+        try:
+            evicted = self.backend.set(key, response)
+            self._count("stores")
+            if evicted:
+                self._count("evictions", len(evicted))
+            if self.mode == "semantic":
+                self._add_to_index(scope, key, self.embed(normalize_prompt(prompt)))
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Response cache store failed: {e}")
+
+    async def lookup_async(self, *args) -> Optional[str]:
+        return await asyncio.to_thread(self.lookup, *args)
+
+    async def store_async(self, *args):
+        await asyncio.to_thread(self.store, *args)
+
+    def _nearest(self, scope: str, embedding: List[float]) -> Optional[str]:
+        with self._lock:
+            candidates = list(self._index.get(scope, {}).items())
+        best_key, best_score = None, self.similarity
+        for key, vector in candidates:
+            score = _cosine(embedding, vector)
+            if score >= best_score:
+                best_key, best_score = key, score
+        return best_key
+
+    def _add_to_index(self, scope: str, key: str, embedding: List[float]):
+        with self._lock:
+            entries = self._index.setdefault(scope, {})
+            if key not in entries:
+                self._index_size += 1
+            entries[key] = embedding
+            # The index only needs to be roughly as large as the cache; drop whole scopes, oldest first
+            while self._index_size > self.max_entries and len(self._index) > 1:
+                oldest = next(iter(self._index))
+                self._index_size -= len(self._index.pop(oldest))
+
+    def set_embedding_function(self, embed: EmbeddingFunction):
+        with self._lock:
+            self.embed = embed
+            # Vectors from different embedding functions are not comparable
+            self._index.clear()
+            self._index_size = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self._counters)
+        lookups = counters["exact_hits"] + counters["semantic_hits"] + counters["misses"]
+        hits = counters["exact_hits"] + counters["semantic_hits"]
+        return {"mode": self.mode, **counters, "hit_rate": hits / lookups if lookups else 0.0}
+
+
+_response_cache: Optional[ResponseCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_response_cache() -> ResponseCache:
+    global _response_cache
+    if _response_cache is None:
+        with _cache_lock:
+            if _response_cache is None:
+                _response_cache = ResponseCache()
+                register_stats("response_cache", _response_cache.stats)
+    return _response_cache
+
+
+def set_embedding_function(embed: EmbeddingFunction):
+    """Use `embed(text) -> vector` for semantic lookups, e.g. a sentence-transformer or an embeddings API."""
+    get_response_cache().set_embedding_function(embed)
@@ -0,0 +1,312 @@
+from typing import AsyncIterator, Callable, Dict, Iterator, List, Optional
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+
+from metrics import register_stats
+from state_store.redis_pool import get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Single-flight coalescing of identical concurrent LLM requests.
+Requests are keyed by their full fingerprint (provider, model, system content, exact prompt and the context actually
+sent). While one request is in flight, identical requests in the same process do not call the provider: they follow
+the leader and receive the same chunks as the leader streams them, or its error.
+`SINGLE_FLIGHT` selects the mode: `local` (default), `redis` or `off`. In `redis` mode, which needs `REDIS_URL`,
+the leader also takes a lock in Redis, and a leader in another replica that finds the lock taken waits for the
+result key instead of calling the provider; it computes the answer itself when the lock disappears without a result
+or after `SINGLE_FLIGHT_LOCK_SECONDS` (default 120). Results are kept for `SINGLE_FLIGHT_RESULT_SECONDS` (default 30),
+only to hand them over; repeated requests are served by `ai/response_cache.py`.
+Coalescing counts are reported by `stats()`.
+"""
+
+LOCK_PREFIX = "chatbot:inflight:lock:"
+RESULT_PREFIX = "chatbot:inflight:result:"
+REMOTE_POLL_SECONDS = 0.1
+
+
+def request_fingerprint(provider: str, model: str, system_content: str, prompt: str, context: Optional[List[dict]]) -> str:
+    return hashlib.sha256(
+        json.dumps([provider, model, system_content, prompt, context or []], sort_keys=True).encode()
+    ).hexdigest()
+
+
+class AbandonedRequestError(Exception):
+    """The leader's caller stopped reading before the response was complete."""
+
+
+class _Flight:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._cond = threading.Condition()
+
+    def publish(self, chunk: str):
+        with self._cond:
+            self.chunks.append(chunk)
+            self._cond.notify_all()
+
+    def finish(self, error: Optional[BaseException] = None):
+        with self._cond:
+            self.done = True
+            self.error = error
+            self._cond.notify_all()
+
+    def follow(self) -> Iterator[str]:
+        index = 0
+        while True:
+            with self._cond:
+                while index >= len(self.chunks) and not self.done:
+                    self._cond.wait()
+                chunks, done, error = self.chunks[index:], self.done, self.error
+            yield from chunks
+            index += len(chunks)
+            if done:
+                if error is not None:
+                    raise error
+                return
+
+
+class _AsyncFlight:
+    def __init__(self):
+        self.chunks: List[str] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def publish(self, chunk: str):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: Optional[BaseException] = None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self) -> AsyncIterator[str]:
+        index = 0
+        while True:
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await self._changed.wait()
+
+
+def _leader_error(e: BaseException) -> BaseException:
+    if isinstance(e, (GeneratorExit, asyncio.CancelledError)):
+        return AbandonedRequestError("The identical request this one was waiting for was abandoned")
+    return e
+
+
+class SingleFlight:
+    def __init__(
+        self,
+        *,
+        mode: Optional[str] = None,
+        redis_url: Optional[str] = None,
+        lock_ttl: Optional[float] = None,
+        result_ttl: Optional[float] = None,
+    ):
+        self.mode = (mode or os.environ.get("SINGLE_FLIGHT", "local")).lower()
+        self.lock_ttl = lock_ttl or float(os.environ.get("SINGLE_FLIGHT_LOCK_SECONDS", 120))
+        self.result_ttl = result_ttl or float(os.environ.get("SINGLE_FLIGHT_RESULT_SECONDS", 30))
+        redis_url = redis_url or os.environ.get("REDIS_URL")
+        if self.mode == "redis" and not redis_url:
+            logger.error("SINGLE_FLIGHT=redis needs REDIS_URL, coalescing in process only")
+            self.mode = "local"
+        self.redis_client = get_redis_client(redis_url) if self.mode == "redis" else None
+        self._flights: Dict[str, _Flight] = {}
+        self._async_flights: Dict[str, _AsyncFlight] = {}
+        self._lock = threading.Lock()
+        self._counters = {"leaders": 0, "coalesced": 0, "remote_coalesced": 0, "remote_timeouts": 0, "errors": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ("local", "redis")
+
+    def _count(self, counter: str):
+        with self._lock:
+            self._counters[counter] += 1
+
+    def run(self, key: str, produce: Callable[[], Iterator[str]]) -> Iterator[str]:
+        """Yield the chunks of `produce()`, or of the identical request already in flight."""
+        if not self.enabled:
+            yield from produce()
+            return
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                self._counters["leaders"] += 1
+            else:
+                self._counters["coalesced"] += 1
+        if not leader:
+            yield from flight.follow()
+            return
+
+        token = None
+        try:
+            if self.redis_client is not None:
+                token, result = self._claim_remote(key)
+                if result is not None:
+                    flight.publish(result)
+                    flight.finish()
+                    yield result
+                    return
+            for chunk in produce():
+                flight.publish(chunk)
+                yield chunk
+            if token is not None:
+                self._publish_remote(key, token, "".join(flight.chunks))
+            flight.finish()
+        except BaseException as e:
+            flight.finish(_leader_error(e))
+            if token is not None:
+                self._release_remote(key, token)
+            raise
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+
+    async def run_async(self, key: str, produce: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        if not self.enabled:
+            async for chunk in produce():
+                yield chunk
+            return
+        flight = self._async_flights.get(key)
+        if flight is not None:
+            self._count("coalesced")
+            async for chunk in flight.follow():
+                yield chunk
+            return
+        flight = self._async_flights[key] = _AsyncFlight()
+        self._count("leaders")
+
+        token = None
+        try:
+            if self.redis_client is not None:
+                token, result = await self._claim_remote_async(key)
+                if result is not None:
+                    flight.publish(result)
+                    flight.finish()
+                    yield result
+                    return
+            async for chunk in produce():
+                flight.publish(chunk)
+                yield chunk
+            if token is not None:
+                await asyncio.to_thread(self._publish_remote, key, token, "".join(flight.chunks))
+            flight.finish()
+        except BaseException as e:
+            flight.finish(_leader_error(e))
+            if token is not None:
+                await asyncio.to_thread(self._release_remote, key, token)
+            raise
+        finally:
+            self._async_flights.pop(key, None)
+
+    def _poll_remote(self, key: str, token: str, leader: Optional[str]):
+        """One attempt to take the request's lock, or to read the result of the `leader` holding it.
+        Returns (claimed, leader, result)."""
+        try:
+            if leader is None:
+                if self.redis_client.set(LOCK_PREFIX + key, token, nx=True, px=int(self.lock_ttl * 1000)):
+                    return True, None, None
+                leader = self.redis_client.get(LOCK_PREFIX + key)
+                if leader is None:
+                    return False, None, None
+            # The leader stores its result before releasing the lock, so the lock is read first
+            pipe = self.redis_client.pipeline(transaction=False)
+            pipe.get(LOCK_PREFIX + key)
+            pipe.get(RESULT_PREFIX + key + ":" + leader)
+            current, result = pipe.execute()
+            if result is None and current != leader:
+                # The leader failed or its lock expired; the next attempt tries to take over
+                leader = None
+            return False, leader, result
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Single-flight lock unavailable, calling the provider: {e}")
+            return True, None, None
+
+    def _claim_remote(self, key: str):
+        """Take the request's lock in Redis and return (token, None), or wait for another replica's result."""
+        token, leader = uuid.uuid4().hex, None
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            claimed, leader, result = self._poll_remote(key, token, leader)
+            if claimed:
+                return token, None
+            if result is not None:
+                self._count("remote_coalesced")
+                return None, result
+            time.sleep(REMOTE_POLL_SECONDS)
+        self._count("remote_timeouts")
+        return None, None
+
+    async def _claim_remote_async(self, key: str):
+        token, leader = uuid.uuid4().hex, None
+        deadline = time.monotonic() + self.lock_ttl
+        while time.monotonic() < deadline:
+            claimed, leader, result = await asyncio.to_thread(self._poll_remote, key, token, leader)
+            if claimed:
+                return token, None
+            if result is not None:
+                self._count("remote_coalesced")
+                return None, result
+            await asyncio.sleep(REMOTE_POLL_SECONDS)
+        self._count("remote_timeouts")
+        return None, None
+
+    def _publish_remote(self, key: str, token: str, result: str):
+        try:
+            # Keyed by the leader's token, so a later request never reads an earlier request's result
+            self.redis_client.set(RESULT_PREFIX + key + ":" + token, result, ex=max(1, int(self.result_ttl)))
+            self._release_remote(key, token)
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Failed to share single-flight result: {e}")
+
+    def _release_remote(self, key: str, token: str):
+        try:
+            # Only the lock's owner releases it; a lock that expired may already belong to another leader
+            if self.redis_client.get(LOCK_PREFIX + key) == token:
+                self.redis_client.delete(LOCK_PREFIX + key)
+        except Exception as e:
+            self._count("errors")
+            logger.error(f"Failed to release single-flight lock: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"mode": self.mode, "in_flight": len(self._flights) + len(self._async_flights), **self._counters}
+
+
+_single_flight: Optional[SingleFlight] = None
+_single_flight_lock = threading.Lock()
+
+
+def get_single_flight() -> SingleFlight:
+    global _single_flight
+    if _single_flight is None:
+        with _single_flight_lock:
+            if _single_flight is None:
+                _single_flight = SingleFlight()
+                register_stats("single_flight", _single_flight.stats)
+    return _single_flight
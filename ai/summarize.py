@@ -0,0 +1,147 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+
+from .ai_constants import MERGE_SUMMARIES_PROMPT, SUMMARIZE_CHUNK_PROMPT
+from .providers import get_provider_response, get_provider_response_async
+from .tokenizer import count_tokens
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Map-reduce summarization for conversations that do not fit in one prompt.
+The conversation is split into consecutive chunks of at most `SUMMARY_CHUNK_TOKENS` tokens (default 3000).
+Every chunk is summarized in parallel (map), then the partial summaries are merged
+`SUMMARY_REDUCE_FANOUT` at a time (default 8) until one final call with the caller's prompt remains (reduce).
+Wall time therefore grows with the depth of the reduce tree rather than with the length of the thread.
+Calls run on a dedicated pool of `SUMMARY_POOL_SIZE` threads (default 8), separate from the job executor
+that runs the listener, so a summary waiting for its chunks can never starve them of workers.
+At most `SUMMARY_MAX_LLM_CALLS` (default 40) provider calls are made per summary; beyond that the
+oldest chunks are dropped and the final summary is told how many messages were left out.
+A conversation that fits in one chunk is summarized with a single call, exactly as before.
+"""
+
+_pool: Optional[ThreadPoolExecutor] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_pool_lock = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return max(1, int(os.environ.get(name, default)))
+    except ValueError:
+        logger.error(f"Invalid value for {name}, using {default}")
+        return default
+
+
+def _get_pool() -> ThreadPoolExecutor:
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ThreadPoolExecutor(max_workers=_env_int("SUMMARY_POOL_SIZE", 8), thread_name_prefix="summary")
+    return _pool
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(_env_int("SUMMARY_POOL_SIZE", 8))
+    return _semaphore
+
+
+def chunk_conversation(conversation: List[dict], max_tokens: int) -> List[List[dict]]:
+    """Split messages into consecutive chunks of at most `max_tokens` (a single larger message gets its own chunk)."""
+    chunks = []
+    current = []
+    current_tokens = 0
+    for message in conversation:
+        tokens = count_tokens(f"{message['user']}: {message['text']}")
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append(current)
+            current = []
+            current_tokens = 0
+        current.append(message)
+        current_tokens += tokens
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _reduce_calls(partials: int, fanout: int) -> int:
+    calls = 1
+    while partials > fanout:
+        partials = -(-partials // fanout)
+        calls += partials
+    return calls
+
+
+def _fit_call_budget(chunks: List[List[dict]], max_calls: int, fanout: int) -> Tuple[List[List[dict]], int]:
+    """Keep the most recent chunks whose map and reduce calls fit in `max_calls`.
+    Returns them and the number of messages omitted."""
+    keep = len(chunks)
+    while keep > 1 and keep + _reduce_calls(keep, fanout) > max_calls:
+        keep -= 1
+    omitted = sum(len(chunk) for chunk in chunks[: len(chunks) - keep])
+    if omitted:
+        logger.warning(f"Summary needs more than {max_calls} LLM calls, omitting the {omitted} oldest messages")
+    return chunks[len(chunks) - keep :], omitted
+
+
+def _plan(conversation: List[dict]) -> Tuple[List[List[dict]], int, int]:
+    fanout = max(2, _env_int("SUMMARY_REDUCE_FANOUT", 8))
+    chunks = chunk_conversation(conversation, _env_int("SUMMARY_CHUNK_TOKENS", 3000))
+    if len(chunks) <= 1:
+        return chunks, 0, fanout
+    chunks, omitted = _fit_call_budget(chunks, _env_int("SUMMARY_MAX_LLM_CALLS", 40), fanout)
+    print(f"🧩 Summarizing {sum(len(chunk) for chunk in chunks)} messages in {len(chunks)} chunks")
+    return chunks, omitted, fanout
+
+
+def _summaries_context(summaries: List[str], omitted: int = 0) -> List[dict]:
+    context = [{"user": f"Part {i + 1}", "text": summary} for i, summary in enumerate(summaries)]
+    if omitted:
+        context.insert(
+            0, {"user": "Note", "text": f"{omitted} earlier messages were too many to include and are not covered."}
+        )
+    return context
+
+
+def summarize_conversation(user_id: str, prompt: str, conversation: Optional[List[dict]]) -> str:
+    """Summarize `conversation` with `prompt`, using map-reduce when it does not fit in one chunk."""
+    conversation = conversation or []
+    chunks, omitted, fanout = _plan(conversation)
+    if len(chunks) <= 1:
+        return get_provider_response(user_id, prompt, conversation)
+
+    pool = _get_pool()
+    summaries = list(pool.map(lambda chunk: get_provider_response(user_id, SUMMARIZE_CHUNK_PROMPT, chunk), chunks))
+    while len(summaries) > fanout:
+        groups = [summaries[i : i + fanout] for i in range(0, len(summaries), fanout)]
+        summaries = list(
+            pool.map(lambda group: get_provider_response(user_id, MERGE_SUMMARIES_PROMPT, _summaries_context(group)), groups)
+        )
+    return get_provider_response(user_id, prompt, _summaries_context(summaries, omitted))
+
+
+async def summarize_conversation_async(user_id: str, prompt: str, conversation: Optional[List[dict]]) -> str:
+    conversation = conversation or []
+    chunks, omitted, fanout = _plan(conversation)
+    if len(chunks) <= 1:
+        return await get_provider_response_async(user_id, prompt, conversation)
+
+    semaphore = _get_semaphore()
+
+    async def bounded(call_prompt: str, context: List[dict]) -> str:
+        async with semaphore:
+            return await get_provider_response_async(user_id, call_prompt, context)
+
+    summaries = await asyncio.gather(*(bounded(SUMMARIZE_CHUNK_PROMPT, chunk) for chunk in chunks))
+    while len(summaries) > fanout:
+        groups = [summaries[i : i + fanout] for i in range(0, len(summaries), fanout)]
+        summaries = await asyncio.gather(*(bounded(MERGE_SUMMARIES_PROMPT, _summaries_context(group)) for group in groups))
+    return await get_provider_response_async(user_id, prompt, _summaries_context(list(summaries), omitted))
@@ -0,0 +1,73 @@
+from functools import lru_cache
+from typing import Optional
+import logging
+
+try:
+    import tiktoken
+except ImportError:  # installed from requirements.txt; counts fall back to a character heuristic without it
+    tiktoken = None
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Token counting for prompts and context.
+OpenAI models are counted with their own tiktoken BPE encoding; GenAI agents (usually open models
+behind an OpenAI-compatible API) use `cl100k_base`. Anthropic and Gemini do not publish local tokenizers,
+so Claude and Gemini counts are approximated from `cl100k_base` with a per-family correction factor.
+tiktoken is pinned in requirements.txt; without it, every model falls back to a characters-per-token heuristic.
+Counts are cached per (text, model family) because the same conversation messages are counted on every reply.
+"""
+
+DEFAULT_ENCODING = "cl100k_base"
+
+# (correction factor over cl100k_base, characters per token without tiktoken)
+_APPROXIMATIONS = {
+    "claude": (1.15, 3.5),
+    "gemini": (1.0, 4.0),
+    "default": (1.0, 4.0),
+}
+
+
+def _family(model: Optional[str]) -> str:
+    model = (model or "").lower()
+    if model.startswith(("gpt-", "o1", "o3", "o4")):
+        return model
+    if model.startswith("claude"):
+        return "claude"
+    if model.startswith("gemini"):
+        return "gemini"
+    return "default"
+
+
+@lru_cache(maxsize=32)
+def _get_encoding(family: str):
+    if tiktoken is None:
+        return None
+    try:
+        if family not in _APPROXIMATIONS:
+            try:
+                return tiktoken.encoding_for_model(family)
+            except KeyError:
+                pass
+        return tiktoken.get_encoding(DEFAULT_ENCODING)
+    except Exception as e:
+        # tiktoken downloads its BPE files on first use; stay usable when that is not possible
+        logger.error(f"Failed to load tiktoken encoding for {family}, using the character heuristic: {e}")
+        return None
+
+
+@lru_cache(maxsize=8192)
+def _count(text: str, family: str) -> int:
+    factor, chars_per_token = _APPROXIMATIONS.get(family, _APPROXIMATIONS["default"])
+    encoding = _get_encoding(family)
+    if encoding is None:
+        return int(len(text) / chars_per_token) + 1
+    return int(len(encoding.encode(text, disallowed_special=())) * factor)
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """Return the number of tokens `text` uses for `model` (exact for OpenAI models when tiktoken is installed)."""
+    if not text:
+        return 0
+    return _count(text, _family(model))
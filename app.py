@@ -1,42 +1,34 @@
 import os
 import logging
 import threading
-from http.server import BaseHTTPRequestHandler, HTTPServer
 
 from slack_bolt import App
 from slack_bolt.adapter.socket_mode import SocketModeHandler
 
+from health_server import job_executor_check, register_readiness_check, run_health_server, socket_mode_check
+from knowledge_base import start_index_job_poller
 from listeners import register_listeners
+from listeners.listener_utils.conversation_cache import record_conversation_events
+from workers import get_job_executor
 
 # Initialization
-app = App(token=os.environ.get("SLACK_BOT_TOKEN"))
+# Message events are recorded into the conversation cache before Bolt drops the app's own messages
+app = App(token=os.environ.get("SLACK_BOT_TOKEN"), before_authorize=record_conversation_events)
 logging.basicConfig(level=logging.DEBUG)
 
-# Native Python HTTP health check server
-class HealthCheckHandler(BaseHTTPRequestHandler):
-    def do_GET(self):
-        if self.path == "/healthz":
-            self.send_response(200)
-            self.send_header("Content-type", "application/json")
-            self.end_headers()
-            self.wfile.write(b'{"status": "ok"}')
-        else:
-            self.send_response(404)
-            self.end_headers()
-
 # Register Listeners
 register_listeners(app)
 
 # Start Bolt app
-
-
-def run_health_server():
-    port = int(os.environ.get("HEALTH_PORT", 8080))
-    server = HTTPServer(("0.0.0.0", port), HealthCheckHandler)
-    server.serve_forever()
-
 if __name__ == "__main__":
+    handler = SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    # Ready while the socket is connected and the job queue has room
+    register_readiness_check("socket_mode", socket_mode_check(handler.client))
+    register_readiness_check("job_executor", job_executor_check(get_job_executor()))
     # Start native health check server in a separate thread
     threading.Thread(target=run_health_server, daemon=True).start()
+    # Track indexing jobs started with /update-debbie and announce when they finish
+    if os.environ.get("DO_API_TOKEN"):
+        start_index_job_poller(app.client)
     # Start Slack Bolt app
-    SocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN")).start()
+    handler.start()
@@ -0,0 +1,42 @@
+import asyncio
+import logging
+import os
+import threading
+
+from slack_bolt.async_app import AsyncApp
+from slack_bolt.adapter.socket_mode.async_handler import AsyncSocketModeHandler
+
+from async_listeners import register_listeners
+from listeners.listener_utils.conversation_cache import record_conversation_events_async
+from health_server import job_executor_check, register_readiness_check, run_health_server, socket_mode_check
+from ai.providers.client_registry import aclose_clients
+from knowledge_base import start_async_index_job_poller
+from workers import get_async_job_executor
+
+# asyncio build of app.py: one event loop holds every in-flight LLM, Slack, Redis and DigitalOcean call
+
+# Initialization
+app = AsyncApp(token=os.environ.get("SLACK_BOT_TOKEN"), before_authorize=record_conversation_events_async)
+logging.basicConfig(level=logging.DEBUG)
+
+# Register Listeners
+register_listeners(app)
+
+
+async def main():
+    handler = AsyncSocketModeHandler(app, os.environ.get("SLACK_APP_TOKEN"))
+    register_readiness_check("socket_mode", socket_mode_check(handler.client, asyncio.get_running_loop()))
+    register_readiness_check("job_executor", job_executor_check(get_async_job_executor()))
+    if os.environ.get("DO_API_TOKEN"):
+        start_async_index_job_poller(app.client)
+    try:
+        await handler.start_async()
+    finally:
+        await aclose_clients()
+
+
+# Start Bolt app
+if __name__ == "__main__":
+    # Start native health check server in a separate thread
+    threading.Thread(target=run_health_server, daemon=True).start()
+    asyncio.run(main())
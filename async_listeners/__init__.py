@@ -0,0 +1,22 @@
+from async_listeners import actions
+from async_listeners import commands
+from async_listeners import events
+from async_listeners import functions
+from listeners.listener_utils.event_dedup import deduplicate_events_async
+from listeners.listener_utils.directory_cache import warm_directory_cache_async
+from listeners.listener_utils.web_api_scheduler import schedule_web_api_calls_async
+from metrics import count_listener_errors
+
+
+def register_listeners(app):
+    count_listener_errors()
+    # Redelivered events are dropped before any other middleware or listener runs
+    app.use(deduplicate_events_async)
+    # Every listener's client (and say/complete/fail) goes through the Web API rate scheduler
+    app.use(schedule_web_api_calls_async)
+    # User and channel names for prompts are loaded in the background, once per workspace and TTL
+    app.use(warm_directory_cache_async)
+    actions.register(app)
+    commands.register(app)
+    events.register(app)
+    functions.register(app)
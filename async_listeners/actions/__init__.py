@@ -0,0 +1,6 @@
+from slack_bolt.async_app import AsyncApp
+from .set_user_selection import set_user_selection
+
+
+def register(app: AsyncApp):
+    app.action("pick_a_provider")(set_user_selection)
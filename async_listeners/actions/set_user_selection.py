@@ -0,0 +1,19 @@
+from logging import Logger
+from slack_bolt.async_app import AsyncAck
+from state_store.set_redis_user_state_async import set_redis_user_state_async
+
+
+async def set_user_selection(logger: Logger, ack: AsyncAck, body: dict):
+    try:
+        await ack()
+        user_id = body["user"]["id"]
+        value = body["actions"][0]["selected_option"]["value"]
+        if value != "null":
+            # parsing the selected option value from the options array in app_home_opened.py
+            selected_provider, selected_model = value.split(" ")[-1], value.split(" ")[0]
+            await set_redis_user_state_async(user_id, selected_provider, selected_model)
+            logger.info(f"Set Redis state for user {user_id}: provider={selected_provider}, model={selected_model}")
+        else:
+            raise ValueError("Please make a selection")
+    except Exception as e:
+        logger.error(f"Error in set_user_selection: {e}")
@@ -0,0 +1,43 @@
+from slack_bolt.async_app import AsyncAck, AsyncBoltContext
+from logging import Logger
+from ai.providers import get_provider_response_async
+from slack_sdk.web.async_client import AsyncWebClient
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT
+from listeners.listener_utils.response_blocks import ask_response_blocks
+
+"""
+asyncio version of the 'ask-sailor' command callback in `listeners/commands/ask_command.py`.
+"""
+
+
+async def ask_callback(client: AsyncWebClient, ack: AsyncAck, command, logger: Logger, context: AsyncBoltContext):
+    await ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    await get_async_job_executor().submit(
+        user_id,
+        _ask,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+async def _ask(client: AsyncWebClient, command, logger: Logger, user_id: str, channel_id: str):
+    try:
+        prompt = command["text"]
+
+        if prompt == "":
+            await client.chat_postEphemeral(
+                channel=channel_id, user=user_id, text="Looks like you didn't provide a prompt. Try again."
+            )
+        else:
+            response = await get_provider_response_async(user_id, prompt)
+            await client.chat_postEphemeral(channel=channel_id, user=user_id, blocks=ask_response_blocks(prompt, response))
+    except Exception as e:
+        logger.error(e)
+        await client.chat_postEphemeral(channel=channel_id, user=user_id, text=f"Received an error from Bolty:\n{e}")
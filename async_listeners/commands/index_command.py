@@ -0,0 +1,111 @@
+from slack_bolt.async_app import AsyncAck, AsyncBoltContext
+from logging import Logger
+from slack_sdk.web.async_client import AsyncWebClient
+from knowledge_base import (
+    describe_index_batch,
+    get_async_do_client,
+    index_data_sources_async,
+    list_data_sources_async,
+    needs_listing,
+    new_index_batch,
+    parse_selectors,
+    select_data_sources,
+)
+from state_store import IndexBatch, get_index_job_store
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT
+import asyncio
+import os
+
+"""
+asyncio version of the '/update-debbie' command callback in `listeners/commands/index_command.py`.
+The DigitalOcean API is called through a shared `httpx.AsyncClient`.
+"""
+
+
+async def do_index_callback(client: AsyncWebClient, ack: AsyncAck, command, logger: Logger, context: AsyncBoltContext):
+    await ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    await get_async_job_executor().submit(
+        user_id,
+        _start_index_job,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+async def _report_progress(client: AsyncWebClient, logger: Logger, batch: IndexBatch, text: str, first: bool = False):
+    if batch["message_ts"]:
+        await client.chat_update(channel=batch["message_channel"], ts=batch["message_ts"], text=text)
+        return
+    if not first:
+        return
+    for channel in (batch["channel_id"], batch["user_id"]):
+        try:
+            response = await client.chat_postMessage(channel=channel, text=text)
+            batch["message_channel"], batch["message_ts"] = response["channel"], response["ts"]
+            return
+        except Exception as e:
+            logger.warning(f"Could not post indexing progress to {channel}: {e}")
+
+
+async def _start_index_job(client: AsyncWebClient, command, logger: Logger, user_id: str, channel_id: str):
+    try:
+        selectors = parse_selectors(command.get("text", "")) or parse_selectors(os.environ.get("DO_DATA_SOURCE_ID", ""))
+        knowledge_base_id = os.environ.get("DO_KB_ID")
+        if not knowledge_base_id:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="Knowledge base ID is not set. Please set DO_KB_ID in the environment.",
+            )
+            return
+
+        if not selectors:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="Please provide data source IDs, patterns or `all` as arguments, "
+                "or set DO_DATA_SOURCE_ID in the environment.",
+            )
+            return
+
+        do_client = get_async_do_client()
+        if not do_client:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="DigitalOcean API token is not set. Please set DO_API_TOKEN in the environment.",
+            )
+            return
+
+        data_source_ids = selectors
+        if needs_listing(selectors):
+            data_source_ids = select_data_sources(await list_data_sources_async(knowledge_base_id, do_client), selectors)
+        if not data_source_ids:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text=f"No data sources in knowledge base `{knowledge_base_id}` match `{' '.join(selectors)}`.",
+            )
+            return
+
+        async def on_progress(batch: IndexBatch, done: int, total: int):
+            await _report_progress(client, logger, batch, describe_index_batch(batch, [], (done, total)), first=done == 0)
+
+        batch = new_index_batch(knowledge_base_id, data_source_ids, user_id, channel_id)
+        await index_data_sources_async(batch, on_progress, do_client)
+        logger.info(f"Started index jobs {batch['job_ids']} for channel {channel_id}")
+        text = describe_index_batch(batch, await asyncio.to_thread(get_index_job_store().batch_jobs, batch))
+        if batch["message_ts"]:
+            await _report_progress(client, logger, batch, text)
+        else:
+            await client.chat_postEphemeral(channel=channel_id, user=user_id, text=text)
+    except Exception as e:
+        logger.error(f"Error in /update-debbie: {e}")
+        await client.chat_postEphemeral(channel=channel_id, user=user_id, text=f"An error occurred: {e}")
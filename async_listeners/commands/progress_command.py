@@ -0,0 +1,50 @@
+from slack_bolt.async_app import AsyncAck, AsyncBoltContext
+from logging import Logger
+from slack_sdk.web.async_client import AsyncWebClient
+from knowledge_base import describe_last_index_operation
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT
+import asyncio
+
+"""
+asyncio version of the '/debbie-progress' command callback in `listeners/commands/progress_command.py`.
+"""
+
+
+async def debbie_progress_callback(
+    client: AsyncWebClient, ack: AsyncAck, command, logger: Logger, context: AsyncBoltContext
+):
+    await ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    await get_async_job_executor().submit(
+        user_id,
+        _report_progress,
+        client,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+async def _report_progress(client: AsyncWebClient, logger: Logger, user_id: str, channel_id: str):
+    try:
+        progress = None
+        try:
+            progress = await asyncio.to_thread(describe_last_index_operation, channel_id)
+        except Exception as store_err:
+            logger.error(f"Failed to read index job for channel {channel_id}: {store_err}")
+
+        if not progress:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="No recent index job found for this channel. Please run /update-debbie first.",
+            )
+            return
+
+        await client.chat_postEphemeral(channel=channel_id, user=user_id, text=progress)
+    except Exception as e:
+        logger.error(f"Error in /debbie-progress: {e}")
+        await client.chat_postEphemeral(channel=channel_id, user=user_id, text=f"An error occurred: {e}")
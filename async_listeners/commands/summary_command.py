@@ -0,0 +1,77 @@
+from slack_bolt.async_app import AsyncAck, AsyncBoltContext
+from logging import Logger
+from ai.summarize import summarize_conversation_async
+from slack_sdk.web.async_client import AsyncWebClient
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT, SUMMARIZE_THREAD_PROMPT
+from listeners.listener_utils.fetch_conversation import fetch_thread_messages_async
+from listeners.listener_utils.parse_conversation import parse_conversation
+from listeners.listener_utils.response_blocks import thread_summary_blocks
+from listeners.listener_utils.thread_link import parse_thread_link
+
+"""
+asyncio version of the 'sailor-summary' command callback in `listeners/commands/summary_command.py`.
+"""
+
+
+async def summary_callback(client: AsyncWebClient, ack: AsyncAck, command, logger: Logger, context: AsyncBoltContext):
+    await ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    await get_async_job_executor().submit(
+        user_id,
+        _summarize_thread,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+async def _summarize_thread(client: AsyncWebClient, command, logger: Logger, user_id: str, channel_id: str):
+    try:
+        thread_link = command.get("text", "").strip()
+
+        # If no thread link provided, inform the user
+        if not thread_link:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="Please provide a link to a Slack thread. "
+                "Example: `/sailor-summary https://workspace.slack.com/archives/C12345678/p1234567890123456`",
+            )
+            return
+
+        parsed_link = parse_thread_link(thread_link)
+        if not parsed_link:
+            await client.chat_postEphemeral(
+                channel=channel_id,
+                user=user_id,
+                text="Invalid thread link format. Please provide a valid Slack thread link.",
+            )
+            return
+
+        thread_channel_id, thread_ts = parsed_link
+        loading_message = await client.chat_postMessage(channel=channel_id, text=DEFAULT_LOADING_TEXT)
+
+        try:
+            thread_messages = await fetch_thread_messages_async(client, thread_channel_id, thread_ts)
+        except Exception as e:
+            await client.chat_update(
+                channel=channel_id,
+                ts=loading_message["ts"],
+                text=f"Error retrieving thread messages. Make sure Sailor has access to the channel and thread: {str(e)}",
+            )
+            return
+
+        conversation = parse_conversation(thread_messages)
+        summary = await summarize_conversation_async(user_id, SUMMARIZE_THREAD_PROMPT, conversation)
+
+        await client.chat_update(
+            channel=channel_id, ts=loading_message["ts"], text="Thread Summary", blocks=thread_summary_blocks(summary)
+        )
+    except Exception as e:
+        logger.error(e)
+        await client.chat_postEphemeral(channel=channel_id, user=user_id, text=f"Received an error from Bolty:\n{e}")
@@ -0,0 +1,13 @@
+from slack_bolt.async_app import AsyncApp
+from .app_home_opened import app_home_opened_callback
+from .app_mentioned import app_mentioned_callback
+from .app_messaged import app_messaged_callback
+from .user_changed import user_changed_callback
+
+
+def register(app: AsyncApp):
+    app.event("app_home_opened")(app_home_opened_callback)
+    app.event("app_mention")(app_mentioned_callback)
+    app.event("message")(app_messaged_callback)
+    app.event("user_change")(user_changed_callback)
+    app.event("team_join")(user_changed_callback)
@@ -0,0 +1,42 @@
+from logging import Logger
+from slack_sdk.web.async_client import AsyncWebClient
+from state_store.get_redis_user_state_async import get_redis_user_state_async
+from state_store.set_redis_user_state_async import set_redis_user_state_async
+from listeners.listener_utils.home_view import get_model_catalog, published_view_hash
+import os
+
+"""
+asyncio version of the 'app_home_opened' callback in `listeners/events/app_home_opened.py`.
+"""
+
+
+async def app_home_opened_callback(event: dict, logger: Logger, client: AsyncWebClient):
+    if event["tab"] != "home":
+        return
+
+    user_id = event["user"]
+    catalog = get_model_catalog()
+
+    provider, model = None, None
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        try:
+            provider, model = await get_redis_user_state_async(user_id, True, redis_url)
+        except Exception as e:
+            logger.warning(f"Failed to get user state from Redis: {e}")
+
+    if not (provider and model):
+        model = None
+        if catalog.genai_default_available():
+            model = "genai-agent"
+            if redis_url:
+                await set_redis_user_state_async(user_id, "genai", "genai-agent", redis_url)
+
+    view, view_hash = catalog.render(model)
+    if published_view_hash(event) == view_hash:
+        return
+
+    try:
+        await client.views_publish(user_id=user_id, view=view)
+    except Exception as e:
+        logger.error(e)
@@ -0,0 +1,64 @@
+from ai.providers import get_provider_response_stream_async
+from logging import Logger
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_bolt.async_app import AsyncSay
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT, MENTION_WITHOUT_TEXT
+from listeners.listener_utils.fetch_conversation import (
+    RECENT_CONTEXT_MESSAGES,
+    context_before,
+    fetch_channel_messages_async,
+    fetch_recent_thread_messages_async,
+)
+from listeners.listener_utils.parse_conversation import parse_conversation
+from listeners.listener_utils.stream_renderer import AsyncStreamingMessageRenderer
+from listeners.listener_utils.thread_memory import summarize_thread_later_async, thread_context_async
+
+"""
+asyncio version of the 'app_mention' callback in `listeners/events/app_mentioned.py`.
+"""
+
+
+async def app_mentioned_callback(client: AsyncWebClient, event: dict, logger: Logger, say: AsyncSay):
+    await get_async_job_executor().submit(
+        event.get("user"),
+        _reply_to_mention,
+        client,
+        event,
+        logger,
+        say,
+        on_busy=lambda: say(text=BUSY_TEXT, thread_ts=event.get("thread_ts") or event["ts"]),
+    )
+
+
+async def _reply_to_mention(client: AsyncWebClient, event: dict, logger: Logger, say: AsyncSay):
+    channel_id = event.get("channel")
+    thread_ts = event.get("thread_ts")
+    user_id = event.get("user")
+    text = event.get("text")
+    waiting_message = None
+
+    try:
+        in_thread = bool(thread_ts)
+        if in_thread:
+            conversation = await fetch_recent_thread_messages_async(client, channel_id, thread_ts)
+            conversation_context = await thread_context_async(channel_id, thread_ts, conversation, event["ts"])
+        else:
+            conversation = await fetch_channel_messages_async(client, channel_id, RECENT_CONTEXT_MESSAGES + 1)
+            conversation_context = parse_conversation(context_before(conversation, event["ts"]))
+            thread_ts = event["ts"]
+
+        if text:
+            waiting_message = await say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
+            renderer = AsyncStreamingMessageRenderer(client, channel_id, waiting_message["ts"])
+            await renderer.render(get_provider_response_stream_async(user_id, text, conversation_context))
+            if in_thread:
+                await summarize_thread_later_async(user_id, channel_id, thread_ts)
+        else:
+            await say(text=MENTION_WITHOUT_TEXT, thread_ts=thread_ts)
+    except Exception as e:
+        logger.error(e)
+        if waiting_message:
+            await client.chat_update(
+                channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}"
+            )
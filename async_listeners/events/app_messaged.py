@@ -0,0 +1,54 @@
+from ai.ai_constants import DM_SYSTEM_CONTENT
+from ai.providers import get_provider_response_stream_async
+from logging import Logger
+from slack_bolt.async_app import AsyncSay
+from slack_sdk.web.async_client import AsyncWebClient
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT
+from listeners.listener_utils.fetch_conversation import fetch_recent_thread_messages_async
+from listeners.listener_utils.stream_renderer import AsyncStreamingMessageRenderer
+from listeners.listener_utils.thread_memory import summarize_thread_later_async, thread_context_async
+
+"""
+asyncio version of the 'message' callback in `listeners/events/app_messaged.py`.
+"""
+
+
+async def app_messaged_callback(client: AsyncWebClient, event: dict, logger: Logger, say: AsyncSay):
+    if event.get("channel_type") == "im":
+        await get_async_job_executor().submit(
+            event.get("user"),
+            _reply_to_dm,
+            client,
+            event,
+            logger,
+            say,
+            on_busy=lambda: say(text=BUSY_TEXT, thread_ts=event.get("thread_ts")),
+        )
+
+
+async def _reply_to_dm(client: AsyncWebClient, event: dict, logger: Logger, say: AsyncSay):
+    channel_id = event.get("channel")
+    thread_ts = event.get("thread_ts")
+    user_id = event.get("user")
+    text = event.get("text")
+    waiting_message = None
+
+    try:
+        conversation_context = ""
+
+        if thread_ts:  # Retrieves context to continue the conversation in a thread.
+            conversation = await fetch_recent_thread_messages_async(client, channel_id, thread_ts)
+            conversation_context = await thread_context_async(channel_id, thread_ts, conversation, event["ts"])
+
+        waiting_message = await say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
+        renderer = AsyncStreamingMessageRenderer(client, channel_id, waiting_message["ts"])
+        await renderer.render(get_provider_response_stream_async(user_id, text, conversation_context, DM_SYSTEM_CONTENT))
+        if thread_ts:
+            await summarize_thread_later_async(user_id, channel_id, thread_ts)
+    except Exception as e:
+        logger.error(e)
+        if waiting_message:
+            await client.chat_update(
+                channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}"
+            )
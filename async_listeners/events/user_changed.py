@@ -0,0 +1,9 @@
+from listeners.listener_utils.directory_cache import get_directory_cache
+
+"""
+asyncio version of the 'user_change' and 'team_join' callback in `listeners/events/user_changed.py`.
+"""
+
+
+async def user_changed_callback(event: dict):
+    get_directory_cache().update_user(event.get("user") or {})
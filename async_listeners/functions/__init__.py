@@ -0,0 +1,6 @@
+from slack_bolt.async_app import AsyncApp
+from .summary_function import handle_summary_function_callback
+
+
+def register(app: AsyncApp):
+    app.function("summary_function")(handle_summary_function_callback)
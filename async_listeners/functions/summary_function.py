@@ -0,0 +1,45 @@
+from ai.summarize import summarize_conversation_async
+from logging import Logger
+from slack_bolt.async_app import AsyncAck
+from slack_bolt.context.complete.async_complete import AsyncComplete
+from slack_bolt.context.fail.async_fail import AsyncFail
+from slack_sdk.web.async_client import AsyncWebClient
+from workers import get_async_job_executor
+from listeners.listener_utils.listener_constants import BUSY_TEXT, SUMMARIZE_CHANNEL_WORKFLOW
+from listeners.listener_utils.fetch_conversation import fetch_channel_messages_async, workflow_summary_max_messages
+from listeners.listener_utils.parse_conversation import parse_conversation
+
+"""
+asyncio version of the 'summary_function' callback in `listeners/functions/summary_function.py`.
+"""
+
+
+async def handle_summary_function_callback(
+    ack: AsyncAck, inputs: dict, fail: AsyncFail, logger: Logger, client: AsyncWebClient, complete: AsyncComplete
+):
+    await ack()
+    await get_async_job_executor().submit(
+        inputs["user_context"]["id"],
+        _summarize_channel,
+        inputs,
+        fail,
+        logger,
+        client,
+        complete,
+        on_busy=lambda: fail(BUSY_TEXT),
+    )
+
+
+async def _summarize_channel(inputs: dict, fail: AsyncFail, logger: Logger, client: AsyncWebClient, complete: AsyncComplete):
+    try:
+        user_context = inputs["user_context"]
+        channel_id = inputs["channel_id"]
+        history = await fetch_channel_messages_async(client, channel_id, max_messages=workflow_summary_max_messages())
+        conversation = parse_conversation(history)
+
+        summary = await summarize_conversation_async(user_context["id"], SUMMARIZE_CHANNEL_WORKFLOW, conversation)
+
+        await complete({"user_context": user_context, "response": summary})
+    except Exception as e:
+        logger.exception(e)
+        await fail(e)
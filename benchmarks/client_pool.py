@@ -0,0 +1,93 @@
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import openai
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from ai.providers.client_registry import close_clients  # noqa: E402
+from ai.providers.genai import GenAI_API  # noqa: E402
+
+"""
+Benchmark comparing per-reply latency of a freshly constructed OpenAI-compatible client per call
+(the previous behaviour) against the pooled client handed out by `ai/providers/client_registry.py`.
+A local stub server answers chat completions so only client construction and connection setup is measured.
+Run with `python benchmarks/client_pool.py [iterations]`.
+"""
+
+COMPLETION = json.dumps(
+    {
+        "id": "chatcmpl-bench",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "genai-agent",
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "pong"}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2},
+    }
+).encode("utf-8")
+
+
+class StubCompletionHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 so the server keeps connections alive like a real provider does
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(COMPLETION)))
+        self.end_headers()
+        self.wfile.write(COMPLETION)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _summarize(label: str, samples: list):
+    samples = sorted(samples)
+    mean, p50, p95 = statistics.mean(samples), statistics.median(samples), samples[int(len(samples) * 0.95) - 1]
+    print(f"{label:<22} mean={mean * 1000:7.2f}ms p50={p50 * 1000:7.2f}ms p95={p95 * 1000:7.2f}ms")
+    return mean
+
+
+def run(iterations: int = 200):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubCompletionHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_address[1]}/v1"
+    os.environ["GENAI_API_KEY"] = "benchmark"
+    os.environ["GENAI_API_URL"] = base_url
+    messages = [{"role": "system", "content": "bench"}, {"role": "user", "content": "ping"}]
+
+    per_call = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        client = openai.OpenAI(api_key="benchmark", base_url=base_url)
+        client.chat.completions.create(model="genai-agent", n=1, messages=messages, max_tokens=16)
+        per_call.append(time.perf_counter() - start)
+        client.close()
+
+    pooled = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        provider = GenAI_API()
+        provider.set_model("genai-agent")
+        provider.generate_response([{"role": "user", "content": "ping"}], "bench")
+        pooled.append(time.perf_counter() - start)
+
+    close_clients()
+    server.shutdown()
+
+    print(f"{iterations} replies against stub server at {base_url}")
+    baseline = _summarize("client per call", per_call)
+    improved = _summarize("pooled registry client", pooled)
+    print(f"mean latency reduction: {(1 - improved / baseline) * 100:.1f}%")
+
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
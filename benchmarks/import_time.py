@@ -0,0 +1,68 @@
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+"""
+Benchmark of application startup: imports what `app.py` imports (constructing the Bolt app itself needs a
+token and a Slack round trip) in fresh interpreters with `python -X importtime`, as App Platform does on every
+cold start and rollout, and reports the total import time, the slowest top-level imports and which provider
+SDKs were loaded. Only `GENAI_API_KEY` is set, and no SDK should be imported before the first LLM call.
+Run with `python benchmarks/import_time.py [runs] [module,module,...]`.
+"""
+
+PROVIDER_SDKS = ("openai", "anthropic", "vertexai", "google.cloud.aiplatform")
+APP_MODULES = ("slack_bolt", "slack_bolt.adapter.socket_mode", "health_server", "listeners", "workers")
+
+
+def _import_times(modules: tuple) -> dict:
+    """Cumulative import time in seconds of every module imported by `modules`, in a new interpreter."""
+    env = {**os.environ, "PYTHONPATH": ROOT, "GENAI_API_KEY": "benchmark"}
+    for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "VERTEX_AI_PROJECT_ID"):
+        env.pop(name, None)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {', '.join(modules)}"],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.rstrip()] = int(cumulative) / 1_000_000
+    return times
+
+
+def _depth(name: str) -> int:
+    # -X importtime indents every nested import by two more spaces
+    return (len(name) - len(name.lstrip())) // 2
+
+
+def run(runs: int = 5, modules: tuple = APP_MODULES):
+    samples = [_import_times(modules) for _ in range(runs)]
+    # A requested module already imported by an earlier one has no line of its own
+    totals = sorted(sum(seconds for name, seconds in sample.items() if name.strip() in modules) for sample in samples)
+    last = samples[-1]
+    dependencies = sorted(((seconds, name.strip()) for name, seconds in last.items() if _depth(name) == 1), reverse=True)
+    print(f"import {', '.join(modules)}")
+    print(f"{runs} runs: p50={statistics.median(totals) * 1000:.0f}ms max={totals[-1] * 1000:.0f}ms")
+    print("slowest direct dependencies:")
+    for seconds, name in dependencies[:10]:
+        print(f"  {name:<50} {seconds * 1000:8.1f}ms")
+    loaded = [sdk for sdk in PROVIDER_SDKS if any(name.strip() == sdk for name in last)]
+    print(f"provider SDKs imported at startup: {', '.join(loaded) if loaded else 'none'}")
+
+
+if __name__ == "__main__":
+    run(
+        int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        tuple(sys.argv[2].split(",")) if len(sys.argv) > 2 else APP_MODULES,
+    )
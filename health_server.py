@@ -0,0 +1,131 @@
+import asyncio
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Optional, Tuple
+
+import metrics
+
+"""
+Native Python HTTP health check server for App Platform, shared by `app.py`, `app_async.py` and the stream processes.
+Requests are served on their own threads with a socket timeout, so a slow scrape or a hung connection never
+blocks the probes.
+`/livez` (and `/healthz`, kept for existing app specs) only says the process is up and serving; use it as the
+liveness probe. `/readyz` runs the registered readiness checks (Socket Mode connection, Redis pool, job queue
+saturation) and answers 503 with the failing checks when any of them fails; use it as the readiness probe.
+Check results are cached for `HEALTH_CHECK_CACHE_SECONDS` (default 2) so frequent probes stay cheap.
+`/metrics` serves the counters, histograms and component stats of `metrics.py` in the Prometheus text format.
+"""
+
+ReadinessCheck = Callable[[], Tuple[bool, str]]
+
+_checks: Dict[str, ReadinessCheck] = {}
+_checks_lock = threading.Lock()
+_cached: Tuple[float, Optional[dict]] = (0.0, None)
+
+
+def register_readiness_check(name: str, check: ReadinessCheck):
+    """Add a check to `/readyz`; `check()` returns `(ready, detail)`."""
+    with _checks_lock:
+        _checks[name] = check
+
+
+def socket_mode_check(client, loop: Optional[asyncio.AbstractEventLoop] = None) -> ReadinessCheck:
+    """Ready while the Socket Mode client is connected; pass the event loop for the asyncio client."""
+
+    def check():
+        if loop is None:
+            connected = client.is_connected()
+        else:
+            connected = asyncio.run_coroutine_threadsafe(client.is_connected(), loop).result(timeout=2)
+        return connected, "connected" if connected else "disconnected"
+
+    return check
+
+
+def redis_pool_check(redis_url: str) -> ReadinessCheck:
+    """Ready while Redis answers a PING and the shared pool has a connection to spare."""
+    from state_store.redis_pool import get_redis_connection_pool, get_redis_client
+
+    def check():
+        pool = get_redis_connection_pool(redis_url)
+        in_use = len(getattr(pool, "_in_use_connections", ()))
+        if in_use >= pool.max_connections:
+            return False, f"pool exhausted ({in_use}/{pool.max_connections} connections in use)"
+        get_redis_client(redis_url).ping()
+        return True, f"{in_use}/{pool.max_connections} connections in use"
+
+    return check
+
+
+def job_executor_check(executor) -> ReadinessCheck:
+    """Not ready once the job queue is `READINESS_QUEUE_THRESHOLD` full (default 0.9),
+    since new work would be turned away."""
+    threshold = float(os.environ.get("READINESS_QUEUE_THRESHOLD", 0.9))
+
+    def check():
+        stats = executor.stats()
+        detail = f"{stats['running']}/{stats['max_workers']} running, {stats['queued']}/{stats['max_queue']} queued"
+        return stats["queued"] < stats["max_queue"] * threshold, detail
+
+    return check
+
+
+def readiness() -> dict:
+    global _cached
+    checked_at, result = _cached
+    if result is not None and time.monotonic() - checked_at < float(os.environ.get("HEALTH_CHECK_CACHE_SECONDS", 2)):
+        return result
+    with _checks_lock:
+        checks = list(_checks.items())
+    results = {}
+    for name, check in checks:
+        try:
+            ready, detail = check()
+        except Exception as e:
+            ready, detail = False, f"check failed: {e}"
+        results[name] = {"ready": ready, "detail": detail}
+    result = {"ready": all(r["ready"] for r in results.values()), "checks": results}
+    _cached = (time.monotonic(), result)
+    return result
+
+
+class HealthCheckHandler(BaseHTTPRequestHandler):
+    # Socket timeout for each connection, so a client that never finishes its request releases the thread
+    timeout = 10
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json"):
+        self.send_response(status)
+        self.send_header("Content-type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/livez", "/healthz"):
+            self._send(200, b'{"status": "ok"}')
+        elif self.path == "/readyz":
+            result = readiness()
+            self._send(200 if result["ready"] else 503, json.dumps(result).encode("utf-8"))
+        elif self.path == "/metrics":
+            self._send(200, metrics.render().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self.send_response(404)
+            self.end_headers()
+
+    def log_message(self, format, *args):
+        # Probes hit the server every few seconds; only log unexpected requests
+        if not self.path.startswith(("/livez", "/healthz", "/readyz", "/metrics")):
+            super().log_message(format, *args)
+
+
+def run_health_server():
+    port = int(os.environ.get("HEALTH_PORT", 8080))
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        register_readiness_check("redis", redis_pool_check(redis_url))
+    server = ThreadingHTTPServer(("0.0.0.0", port), HealthCheckHandler)
+    server.daemon_threads = True
+    server.serve_forever()
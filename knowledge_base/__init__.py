@@ -0,0 +1,55 @@
+from .do_api import (
+    DigitalOceanGenAIClient,
+    AsyncDigitalOceanGenAIClient,
+    get_do_client,
+    get_async_do_client,
+    parse_index_job_id,
+)
+from .index_job_poller import (
+    IndexJobPoller,
+    AsyncIndexJobPoller,
+    describe_index_batch,
+    describe_index_job,
+    describe_last_index_operation,
+    start_index_job_poller,
+    start_async_index_job_poller,
+    wake_index_job_poller,
+)
+from .batch_indexing import (
+    DataSourceListError,
+    data_source_name,
+    index_data_sources,
+    index_data_sources_async,
+    list_data_sources,
+    list_data_sources_async,
+    needs_listing,
+    new_index_batch,
+    parse_selectors,
+    select_data_sources,
+)
+
+__all__ = [
+    "DigitalOceanGenAIClient",
+    "AsyncDigitalOceanGenAIClient",
+    "get_do_client",
+    "get_async_do_client",
+    "parse_index_job_id",
+    "IndexJobPoller",
+    "AsyncIndexJobPoller",
+    "describe_index_batch",
+    "describe_index_job",
+    "describe_last_index_operation",
+    "start_index_job_poller",
+    "start_async_index_job_poller",
+    "wake_index_job_poller",
+    "DataSourceListError",
+    "data_source_name",
+    "index_data_sources",
+    "index_data_sources_async",
+    "list_data_sources",
+    "list_data_sources_async",
+    "needs_listing",
+    "new_index_batch",
+    "parse_selectors",
+    "select_data_sources",
+]
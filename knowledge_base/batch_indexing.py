@@ -0,0 +1,262 @@
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from typing import Awaitable, Callable, List, Optional, Tuple
+import asyncio
+import logging
+import os
+import random
+import re
+import time
+import uuid
+
+from state_store.index_job_store import IndexBatch, IndexJobStore, get_index_job_store, new_index_job
+
+from .do_api import DATA_SOURCES_PAGE_SIZE, get_async_do_client, get_do_client, parse_index_job_id
+from .index_job_poller import wake_index_job_poller
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Indexing many data sources of a knowledge base at once, for `/update-debbie` and programmatic use.
+Data sources are given by ID, by a glob pattern matched against their ID or name (`docs-*`, `*/handbook/*`), or
+as `all`; patterns and `all` list the knowledge base's data sources through the DigitalOcean API, page by page.
+The selected sources are split into batches of `INDEX_BATCH_SIZE` (default 10), one indexing job per batch, and
+at most `INDEX_MAX_CONCURRENCY` (default 4) batches are submitted at a time. Rate limits, 5xx answers and network
+errors are retried `INDEX_SUBMIT_RETRIES` times (default 3) with jittered exponential backoff, waiting for
+`Retry-After` when the API sends it.
+`on_progress(batch, submitted, total)` is called before the first and after every submission.
+`index_data_sources()` stores the batch and its jobs in the index job store, where the index job poller tracks
+them and keeps the batch's Slack message up to date.
+"""
+
+GLOB_CHARACTERS = set("*?[")
+
+ProgressCallback = Callable[[IndexBatch, int, int], None]
+AsyncProgressCallback = Callable[[IndexBatch, int, int], Awaitable[None]]
+
+
+class DataSourceListError(Exception):
+    pass
+
+
+def parse_selectors(text: str) -> List[str]:
+    """Split `/update-debbie` arguments on commas and whitespace."""
+    return [selector for selector in re.split(r"[,\s]+", text or "") if selector]
+
+
+def needs_listing(selectors: List[str]) -> bool:
+    return any(selector.lower() == "all" or GLOB_CHARACTERS & set(selector) for selector in selectors)
+
+
+def data_source_name(source: dict) -> str:
+    """A readable name for a data source: its bucket path, crawled URL or file name."""
+    spaces = source.get("spaces_data_source") or {}
+    if spaces.get("bucket_name"):
+        return f"{spaces['bucket_name']}/{spaces.get('item_path', '')}".rstrip("/")
+    crawler = source.get("web_crawler_data_source") or {}
+    if crawler.get("base_url"):
+        return crawler["base_url"]
+    upload = source.get("file_upload_data_source") or {}
+    return upload.get("original_file_name") or source.get("name") or source.get("uuid", "")
+
+
+def select_data_sources(sources: List[dict], selectors: List[str]) -> List[str]:
+    """IDs of the data sources matching any selector, in listing order; plain IDs are kept as given."""
+    selected = []
+    for selector in selectors:
+        if selector.lower() == "all":
+            matches = [source["uuid"] for source in sources]
+        elif GLOB_CHARACTERS & set(selector):
+            matches = [
+                source["uuid"]
+                for source in sources
+                if fnmatch(source["uuid"], selector) or fnmatch(data_source_name(source), selector)
+            ]
+        else:
+            matches = [selector]
+        selected.extend(match for match in matches if match not in selected)
+    return selected
+
+
+def _page_items(status_code: int, body: Optional[dict], text: str, page: int) -> Tuple[List[dict], bool]:
+    """The data sources on one page of the listing, and whether more pages follow."""
+    if status_code != 200 or not isinstance(body, dict):
+        raise DataSourceListError(f"Failed to list data sources (page {page}). Status: {status_code}, Response: {text}")
+    items = body.get("knowledge_base_data_sources") or []
+    pages = (body.get("meta") or {}).get("pages")
+    more = page < pages if pages else bool(((body.get("links") or {}).get("pages") or {}).get("next"))
+    return items, more and bool(items)
+
+
+def list_data_sources(knowledge_base_id: str, do_client=None) -> List[dict]:
+    """Every data source of the knowledge base, following pagination."""
+    do_client = do_client or get_do_client()
+    sources, page, more = [], 1, True
+    while more:
+        response = do_client.list_data_sources(knowledge_base_id, page, DATA_SOURCES_PAGE_SIZE)
+        body = response.json() if response.status_code == 200 else None
+        items, more = _page_items(response.status_code, body, response.text, page)
+        sources.extend(items)
+        page += 1
+    return sources
+
+
+async def list_data_sources_async(knowledge_base_id: str, do_client=None) -> List[dict]:
+    do_client = do_client or get_async_do_client()
+    sources, page, more = [], 1, True
+    while more:
+        response = await do_client.list_data_sources(knowledge_base_id, page, DATA_SOURCES_PAGE_SIZE)
+        body = response.json() if response.status_code == 200 else None
+        items, more = _page_items(response.status_code, body, response.text, page)
+        sources.extend(items)
+        page += 1
+    return sources
+
+
+def new_index_batch(knowledge_base_id: str, data_source_ids: List[str], user_id: str, channel_id: str) -> IndexBatch:
+    return IndexBatch(
+        batch_id=uuid.uuid4().hex,
+        knowledge_base_id=knowledge_base_id,
+        data_source_ids=list(data_source_ids),
+        user_id=user_id,
+        channel_id=channel_id,
+        message_channel=None,
+        message_ts=None,
+        job_ids=[],
+        failed=[],
+        created_at=time.time(),
+    )
+
+
+def _chunks(data_source_ids: List[str]) -> List[List[str]]:
+    size = max(1, int(os.environ.get("INDEX_BATCH_SIZE", 10)))
+    return [data_source_ids[i : i + size] for i in range(0, len(data_source_ids), size)]
+
+
+def _retry_delay(status_code: Optional[int], headers, attempt: int) -> Optional[float]:
+    """Seconds to wait before retrying a submission that answered `status_code` (None for a network error)."""
+    if status_code is not None and status_code != 429 and status_code < 500:
+        return None
+    if attempt >= int(os.environ.get("INDEX_SUBMIT_RETRIES", 3)):
+        return None
+    retry_after = (headers or {}).get("Retry-After")
+    if retry_after and retry_after.isdigit():
+        return min(float(retry_after), 60.0)
+    return min(2**attempt, 30) * random.uniform(0.5, 1.0)
+
+
+def _submission(status_code: int, body: Optional[dict], text: str) -> Tuple[Optional[str], Optional[str]]:
+    """(job ID, error) of a finished submission."""
+    if status_code == 200:
+        job_id = parse_index_job_id(body or {})
+        return (job_id, None) if job_id else (None, f"No index job ID found in response: {body}")
+    return None, f"Status: {status_code}, Response: {text}"
+
+
+def _submit(do_client, knowledge_base_id: str, chunk: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    attempt = 0
+    while True:
+        try:
+            response = do_client.start_indexing_job(knowledge_base_id, chunk)
+            status_code, headers = response.status_code, response.headers
+        except Exception as e:
+            response, status_code, headers = None, None, None
+            error = str(e)
+        delay = _retry_delay(status_code, headers, attempt)
+        if delay is None:
+            if response is None:
+                return None, error
+            return _submission(status_code, response.json() if status_code == 200 else None, response.text)
+        attempt += 1
+        time.sleep(delay)
+
+
+async def _submit_async(do_client, knowledge_base_id: str, chunk: List[str]) -> Tuple[Optional[str], Optional[str]]:
+    attempt = 0
+    while True:
+        try:
+            response = await do_client.start_indexing_job(knowledge_base_id, chunk)
+            status_code, headers = response.status_code, response.headers
+        except Exception as e:
+            response, status_code, headers = None, None, None
+            error = str(e)
+        delay = _retry_delay(status_code, headers, attempt)
+        if delay is None:
+            if response is None:
+                return None, error
+            return _submission(status_code, response.json() if status_code == 200 else None, response.text)
+        attempt += 1
+        await asyncio.sleep(delay)
+
+
+def _record(batch: IndexBatch, chunk: List[str], job_id: Optional[str], error: Optional[str]):
+    if job_id:
+        batch["job_ids"].append(job_id)
+    else:
+        logger.error(f"Failed to start indexing job for {chunk}: {error}")
+        batch["failed"].append({"data_source_ids": chunk, "error": error})
+
+
+def _store(store: IndexJobStore, batch: IndexBatch, chunks: dict):
+    store.add_batch(batch)
+    for job_id in batch["job_ids"]:
+        store.add(
+            new_index_job(
+                job_id, batch["knowledge_base_id"], chunks[job_id], batch["user_id"], batch["channel_id"], batch["batch_id"]
+            )
+        )
+    wake_index_job_poller()
+
+
+def index_data_sources(
+    batch: IndexBatch, on_progress: Optional[ProgressCallback] = None, do_client=None, store: Optional[IndexJobStore] = None
+) -> IndexBatch:
+    """Start indexing jobs for the batch's data sources and store them for the poller; returns the batch."""
+    do_client = do_client or get_do_client()
+    chunks = _chunks(batch["data_source_ids"])
+    started = {}
+    concurrency = max(1, int(os.environ.get("INDEX_MAX_CONCURRENCY", 4)))
+    if on_progress:
+        on_progress(batch, 0, len(chunks))
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="index-submit") as pool:
+        futures = [(chunk, pool.submit(_submit, do_client, batch["knowledge_base_id"], chunk)) for chunk in chunks]
+        for done, (chunk, future) in enumerate(futures, start=1):
+            job_id, error = future.result()
+            _record(batch, chunk, job_id, error)
+            if job_id:
+                started[job_id] = chunk
+            if on_progress:
+                on_progress(batch, done, len(chunks))
+    _store(store or get_index_job_store(), batch, started)
+    return batch
+
+
+async def index_data_sources_async(
+    batch: IndexBatch,
+    on_progress: Optional[AsyncProgressCallback] = None,
+    do_client=None,
+    store: Optional[IndexJobStore] = None,
+) -> IndexBatch:
+    do_client = do_client or get_async_do_client()
+    chunks = _chunks(batch["data_source_ids"])
+    started = {}
+    semaphore = asyncio.Semaphore(max(1, int(os.environ.get("INDEX_MAX_CONCURRENCY", 4))))
+
+    async def bounded(chunk: List[str]):
+        async with semaphore:
+            return chunk, await _submit_async(do_client, batch["knowledge_base_id"], chunk)
+
+    done = 0
+    if on_progress:
+        await on_progress(batch, 0, len(chunks))
+    for next_done in asyncio.as_completed([bounded(chunk) for chunk in chunks]):
+        chunk, (job_id, error) = await next_done
+        done += 1
+        _record(batch, chunk, job_id, error)
+        if job_id:
+            started[job_id] = chunk
+        if on_progress:
+            await on_progress(batch, done, len(chunks))
+    await asyncio.to_thread(_store, store or get_index_job_store(), batch, started)
+    return batch
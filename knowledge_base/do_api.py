@@ -0,0 +1,115 @@
+from typing import List, Optional
+import logging
+import os
+import threading
+
+import httpx
+import requests
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Clients for the DigitalOcean GenAI API used by the indexing commands.
+`DigitalOceanGenAIClient` keeps one pooled `requests.Session` for the synchronous app and
+`AsyncDigitalOceanGenAIClient` one `httpx.AsyncClient` for `app_async.py`, so repeated
+calls reuse connections instead of opening a new one per command.
+Both return the raw HTTP response; callers check `status_code` and read `json()` or `text`.
+"""
+
+DO_API_BASE_URL = "https://api.digitalocean.com"
+DO_API_TIMEOUT = 30.0
+DATA_SOURCES_PAGE_SIZE = 100
+
+
+def parse_index_job_id(resp_json: dict) -> Optional[str]:
+    """Extract the indexing job UUID from a `POST /v2/gen-ai/indexing_jobs` response."""
+    if "jobs" in resp_json and isinstance(resp_json["jobs"], list) and resp_json["jobs"]:
+        return resp_json["jobs"][0]["uuid"]
+    elif "job" in resp_json and isinstance(resp_json["job"], dict):
+        return resp_json["job"].get("uuid")
+    return None
+
+
+def _headers(api_token: str) -> dict:
+    return {
+        "Authorization": f"Bearer {api_token}",
+        "Content-Type": "application/json",
+    }
+
+
+class DigitalOceanGenAIClient:
+    def __init__(self, api_token: str, base_url: str = DO_API_BASE_URL):
+        self.base_url = base_url
+        self.session = requests.Session()
+        self.session.headers.update(_headers(api_token))
+
+    def start_indexing_job(self, knowledge_base_id: str, data_source_ids: List[str]) -> requests.Response:
+        payload = {
+            "knowledge_base_uuid": knowledge_base_id,
+            "data_source_uuids": data_source_ids,
+        }
+        return self.session.post(f"{self.base_url}/v2/gen-ai/indexing_jobs", json=payload, timeout=DO_API_TIMEOUT)
+
+    def get_indexing_job(self, index_job_id: str) -> requests.Response:
+        return self.session.get(f"{self.base_url}/v2/gen-ai/indexing_jobs/{index_job_id}", timeout=DO_API_TIMEOUT)
+
+    def list_data_sources(
+        self, knowledge_base_id: str, page: int = 1, per_page: int = DATA_SOURCES_PAGE_SIZE
+    ) -> requests.Response:
+        return self.session.get(
+            f"{self.base_url}/v2/gen-ai/knowledge_bases/{knowledge_base_id}/data_sources",
+            params={"page": page, "per_page": per_page},
+            timeout=DO_API_TIMEOUT,
+        )
+
+
+class AsyncDigitalOceanGenAIClient:
+    def __init__(self, api_token: str, base_url: str = DO_API_BASE_URL):
+        self.client = httpx.AsyncClient(base_url=base_url, headers=_headers(api_token), timeout=DO_API_TIMEOUT)
+
+    async def start_indexing_job(self, knowledge_base_id: str, data_source_ids: List[str]) -> httpx.Response:
+        payload = {
+            "knowledge_base_uuid": knowledge_base_id,
+            "data_source_uuids": data_source_ids,
+        }
+        return await self.client.post("/v2/gen-ai/indexing_jobs", json=payload)
+
+    async def get_indexing_job(self, index_job_id: str) -> httpx.Response:
+        return await self.client.get(f"/v2/gen-ai/indexing_jobs/{index_job_id}")
+
+    async def list_data_sources(
+        self, knowledge_base_id: str, page: int = 1, per_page: int = DATA_SOURCES_PAGE_SIZE
+    ) -> httpx.Response:
+        return await self.client.get(
+            f"/v2/gen-ai/knowledge_bases/{knowledge_base_id}/data_sources", params={"page": page, "per_page": per_page}
+        )
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+def get_do_client(api_token: Optional[str] = None) -> Optional[DigitalOceanGenAIClient]:
+    """Return the shared client for `DO_API_TOKEN`, or None if no token is configured."""
+    api_token = api_token or os.environ.get("DO_API_TOKEN")
+    if not api_token:
+        return None
+    with _clients_lock:
+        if ("sync", api_token) not in _clients:
+            _clients[("sync", api_token)] = DigitalOceanGenAIClient(api_token)
+        return _clients[("sync", api_token)]
+
+
+def get_async_do_client(api_token: Optional[str] = None) -> Optional[AsyncDigitalOceanGenAIClient]:
+    """Async counterpart of `get_do_client`, for use from the event loop of `app_async.py`."""
+    api_token = api_token or os.environ.get("DO_API_TOKEN")
+    if not api_token:
+        return None
+    with _clients_lock:
+        if ("async", api_token) not in _clients:
+            _clients[("async", api_token)] = AsyncDigitalOceanGenAIClient(api_token)
+        return _clients[("async", api_token)]
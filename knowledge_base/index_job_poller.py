@@ -0,0 +1,369 @@
+from typing import List, Optional, Tuple
+import asyncio
+import logging
+import os
+import threading
+import time
+import uuid
+
+from metrics import register_stats
+from state_store.index_job_store import IndexBatch, IndexJob, IndexJobStore, get_index_job_store
+
+from .do_api import get_async_do_client, get_do_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Background poller for the indexing jobs in `state_store/index_job_store.py`.
+One poller tracks every active job: it wakes up when the next job is due, fetches each due job through the
+shared DigitalOcean client (one pooled HTTP session), stores its status and posts a Slack message to the user
+who started it once the job finishes. A job is polled every `INDEX_JOB_POLL_MIN_SECONDS` (default 5) while it
+makes progress and up to `INDEX_JOB_POLL_MAX_SECONDS` (default 120) apart while it does not.
+With Redis, processes hold a lease (`INDEX_JOB_POLL_MAX_SECONDS` long, renewed every round) so only one of them
+polls at a time; a finished job is announced exactly once. Jobs that belong to a batch instead update the batch's
+progress message, and the user is notified once the whole batch has finished.
+`IndexJobPoller` runs on a daemon thread for `app.py` and the stream workers, `AsyncIndexJobPoller` as a task
+on the event loop of `app_async.py`.
+"""
+
+FINISHED_STATUSES = {
+    "INDEX_JOB_STATUS_COMPLETED",
+    "INDEX_JOB_STATUS_PARTIAL",
+    "INDEX_JOB_STATUS_NO_CHANGES",
+    "INDEX_JOB_STATUS_FAILED",
+    "INDEX_JOB_STATUS_CANCELLED",
+}
+SUCCEEDED_STATUSES = {"INDEX_JOB_STATUS_COMPLETED", "INDEX_JOB_STATUS_NO_CHANGES"}
+FINISHED_PHASES = {
+    "BATCH_JOB_PHASE_SUCCEEDED",
+    "BATCH_JOB_PHASE_FAILED",
+    "BATCH_JOB_PHASE_ERROR",
+    "BATCH_JOB_PHASE_CANCELLED",
+}
+# Give up on a job the API keeps failing to return
+MAX_POLL_ERRORS = 20
+# Jobs listed one per line in a batch's progress message
+MAX_LISTED_JOBS = 20
+
+
+def _label(value: str) -> str:
+    # INDEX_JOB_STATUS_IN_PROGRESS -> in progress
+    for prefix in ("INDEX_JOB_STATUS_", "BATCH_JOB_PHASE_"):
+        value = value.replace(prefix, "")
+    return value.replace("_", " ").lower()
+
+
+def describe_index_job(job: IndexJob) -> str:
+    """One-line summary of a job for Slack."""
+    detail = job["detail"]
+    text = f"Index job `{job['job_id']}`: {_label(job['status'] or job['phase'])}"
+    if detail.get("total_datasources"):
+        text += f", {detail.get('completed_datasources', 0)}/{detail['total_datasources']} data sources"
+    if detail.get("total_items_indexed"):
+        text += f", {detail['total_items_indexed']} items indexed"
+    if job["finished_at"] is None and job["polls"]:
+        text += f" (checked {int(time.time() - job['updated_at'])}s ago)"
+    return text + "."
+
+
+def describe_index_batch(batch: IndexBatch, jobs: List[IndexJob], submitted: Optional[Tuple[int, int]] = None) -> str:
+    """Progress of a batch for its Slack message: submission progress while `submitted` is given, then job states."""
+    count = len(batch["data_source_ids"])
+    text = f"Indexing {count} data source{'' if count == 1 else 's'} in knowledge base `{batch['knowledge_base_id']}`"
+    if submitted is not None:
+        text += f": submitted {submitted[0]}/{submitted[1]} batches"
+    else:
+        finished = [job for job in jobs if job["finished_at"] is not None]
+        text += f": {len(finished)}/{len(batch['job_ids'])} jobs finished"
+        outcomes = {}
+        for job in finished:
+            outcomes[_label(job["status"])] = outcomes.get(_label(job["status"]), 0) + 1
+        if outcomes:
+            text += " (" + ", ".join(f"{number} {label}" for label, number in sorted(outcomes.items())) + ")"
+    if batch["failed"]:
+        failed = sum(len(failure["data_source_ids"]) for failure in batch["failed"])
+        text += f"; {failed} data source{'' if failed == 1 else 's'} could not be submitted: {batch['failed'][0]['error']}"
+    lines = [text + "."] + [f"• {describe_index_job(job)}" for job in jobs[:MAX_LISTED_JOBS]]
+    if len(jobs) > MAX_LISTED_JOBS:
+        lines.append(f"… and {len(jobs) - MAX_LISTED_JOBS} more jobs.")
+    return "\n".join(lines)
+
+
+def describe_last_index_operation(channel_id: str, store: Optional[IndexJobStore] = None) -> Optional[str]:
+    """Progress of the last job, or the batch it belongs to, started from the channel; None if there is none."""
+    store = store or get_index_job_store()
+    job = store.last_for_channel(channel_id)
+    if job is None:
+        return None
+    batch = store.get_batch(job["batch_id"]) if job.get("batch_id") else None
+    return describe_index_batch(batch, store.batch_jobs(batch)) if batch else describe_index_job(job)
+
+
+class _IndexJobTracking:
+    def __init__(self, store: Optional[IndexJobStore] = None):
+        self.store = store or get_index_job_store()
+        self.min_interval = float(os.environ.get("INDEX_JOB_POLL_MIN_SECONDS", 5))
+        self.max_interval = float(os.environ.get("INDEX_JOB_POLL_MAX_SECONDS", 120))
+        self.owner = uuid.uuid4().hex
+        self._counters = {"polls": 0, "poll_errors": 0, "finished": 0, "notifications_failed": 0}
+        self._active = 0
+        self._leader = False
+
+    def _apply(self, job: IndexJob, status_code: int, body: Optional[dict]) -> IndexJob:
+        """The job after one poll that answered `status_code` with `body`, rescheduled for its next poll."""
+        now = time.time()
+        job = IndexJob(**job)
+        job["polls"] += 1
+        progressed = False
+        if status_code == 200 and isinstance(body, dict):
+            remote = body.get("job") or {}
+            progressed = remote != job["detail"]
+            job["detail"] = remote
+            job["status"] = remote.get("status") or job["status"]
+            job["phase"] = remote.get("phase") or job["phase"]
+            job["updated_at"] = now
+            job["errors"] = 0
+            if job["status"] in FINISHED_STATUSES or job["phase"] in FINISHED_PHASES:
+                job["finished_at"] = now
+        elif status_code == 404:
+            job["status"] = "INDEX_JOB_STATUS_NOT_FOUND"
+            job["finished_at"] = now
+        else:
+            self._counters["poll_errors"] += 1
+            job["errors"] += 1
+            if job["errors"] >= MAX_POLL_ERRORS:
+                job["status"] = "INDEX_JOB_STATUS_UNKNOWN"
+                job["finished_at"] = now
+        # Poll often while the job moves, back off while it does not
+        interval = (
+            self.min_interval if progressed else min(max(job["poll_interval"], self.min_interval) * 1.5, self.max_interval)
+        )
+        job["poll_interval"] = interval
+        job["next_poll_at"] = now + interval
+        return job
+
+    @staticmethod
+    def _completion_text(job: IndexJob) -> str:
+        if job["status"] in SUCCEEDED_STATUSES or (
+            job["phase"] == "BATCH_JOB_PHASE_SUCCEEDED" and job["status"] != "INDEX_JOB_STATUS_PARTIAL"
+        ):
+            icon = "✅"
+        elif job["status"] == "INDEX_JOB_STATUS_PARTIAL":
+            icon = "⚠️"
+        else:
+            icon = "❌"
+        sources = ", ".join(f"`{data_source_id}`" for data_source_id in job["data_source_ids"])
+        return (
+            f"{icon} Indexing finished for {sources} in knowledge base `{job['knowledge_base_id']}`. "
+            f"{describe_index_job(job)}"
+        )
+
+    def _finished_messages(self, job: IndexJob) -> Tuple[Optional[Tuple[str, str, str]], Optional[str]]:
+        """For a job that just finished: the (channel, ts, text) update of its batch message,
+        and the notification to send."""
+        if not job.get("batch_id"):
+            return None, self._completion_text(job)
+        batch = self.store.get_batch(job["batch_id"])
+        if batch is None:
+            return None, self._completion_text(job)
+        jobs = self.store.batch_jobs(batch)
+        text = describe_index_batch(batch, jobs)
+        update = (batch["message_channel"], batch["message_ts"], text) if batch["message_ts"] else None
+        if any(other["finished_at"] is None for other in jobs):
+            return update, None
+        succeeded = not batch["failed"] and all(other["status"] in SUCCEEDED_STATUSES for other in jobs)
+        return update, f"{'✅' if succeeded else '⚠️'} Indexing finished. {text}"
+
+    def _due(self) -> Tuple[list, float]:
+        """Jobs due for a poll now, and how long to sleep before the next round."""
+        if not self.store.claim_poller(self.owner, self.max_interval):
+            self._leader, self._active = False, 0
+            return [], self.max_interval / 2
+        self._leader = True
+        jobs = self.store.active()
+        self._active = len(jobs)
+        now = time.time()
+        due = [job for job in jobs if job["next_poll_at"] <= now]
+        upcoming = [job["next_poll_at"] - now for job in jobs if job["next_poll_at"] > now]
+        # Wake up in time to renew the lease even when nothing is due
+        return due, min(upcoming + [self.max_interval / 2])
+
+    def stats(self) -> dict:
+        return {**self._counters, "active": self._active, "leader": self._leader}
+
+
+class IndexJobPoller(_IndexJobTracking):
+    def __init__(self, slack_client, store: Optional[IndexJobStore] = None):
+        super().__init__(store)
+        self.slack_client = slack_client
+        self._wake = threading.Event()
+        self._stopped = False
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="index-job-poller", daemon=True)
+            self._thread.start()
+
+    def wake(self):
+        """Poll now, e.g. right after a job was started."""
+        self._wake.set()
+
+    def stop(self):
+        self._stopped = True
+        self._wake.set()
+
+    def _run(self):
+        while not self._stopped:
+            delay = self.max_interval / 2
+            try:
+                due, delay = self._due()
+                for job in due:
+                    self._poll(job)
+            except Exception as e:
+                logger.error(f"Index job poller round failed: {e}")
+            self._wake.wait(max(delay, 0.1))
+            self._wake.clear()
+
+    def _poll(self, job: IndexJob):
+        do_client = get_do_client()
+        if do_client is None:
+            return
+        self._counters["polls"] += 1
+        try:
+            response = do_client.get_indexing_job(job["job_id"])
+            job = self._apply(job, response.status_code, response.json() if response.status_code == 200 else None)
+        except Exception as e:
+            logger.warning(f"Failed to poll index job {job['job_id']}: {e}")
+            job = self._apply(job, 0, None)
+        if self.store.update(job):
+            self._counters["finished"] += 1
+            update, notification = self._finished_messages(job)
+            if update:
+                self._update_message(*update)
+            if notification:
+                self._notify(job, notification)
+
+    def _update_message(self, channel: str, ts: str, text: str):
+        try:
+            self.slack_client.chat_update(channel=channel, ts=ts, text=text)
+        except Exception as e:
+            logger.warning(f"Could not update index batch message {ts} in {channel}: {e}")
+
+    def _notify(self, job: IndexJob, text: str):
+        logger.info(text)
+        try:
+            self.slack_client.chat_postEphemeral(channel=job["channel_id"], user=job["user_id"], text=text)
+        except Exception as e:
+            # The user may have left the channel; fall back to a direct message
+            logger.warning(f"Could not notify {job['user_id']} in {job['channel_id']}: {e}")
+            try:
+                self.slack_client.chat_postMessage(channel=job["user_id"], text=text)
+            except Exception as e:
+                self._counters["notifications_failed"] += 1
+                logger.error(f"Could not notify {job['user_id']} about index job {job['job_id']}: {e}")
+
+
+class AsyncIndexJobPoller(_IndexJobTracking):
+    def __init__(self, slack_client, store: Optional[IndexJobStore] = None):
+        super().__init__(store)
+        self.slack_client = slack_client
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start polling on the running event loop."""
+        if self._task is None:
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def wake(self):
+        if self._wake is not None:
+            self._wake.set()
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _run(self):
+        while True:
+            delay = self.max_interval / 2
+            try:
+                # Store calls are blocking Redis or file I/O
+                due, delay = await asyncio.to_thread(self._due)
+                for job in due:
+                    await self._poll(job)
+            except Exception as e:
+                logger.error(f"Index job poller round failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), max(delay, 0.1))
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _poll(self, job: IndexJob):
+        do_client = get_async_do_client()
+        if do_client is None:
+            return
+        self._counters["polls"] += 1
+        try:
+            response = await do_client.get_indexing_job(job["job_id"])
+            job = self._apply(job, response.status_code, response.json() if response.status_code == 200 else None)
+        except Exception as e:
+            logger.warning(f"Failed to poll index job {job['job_id']}: {e}")
+            job = self._apply(job, 0, None)
+        if await asyncio.to_thread(self.store.update, job):
+            self._counters["finished"] += 1
+            update, notification = await asyncio.to_thread(self._finished_messages, job)
+            if update:
+                await self._update_message(*update)
+            if notification:
+                await self._notify(job, notification)
+
+    async def _update_message(self, channel: str, ts: str, text: str):
+        try:
+            await self.slack_client.chat_update(channel=channel, ts=ts, text=text)
+        except Exception as e:
+            logger.warning(f"Could not update index batch message {ts} in {channel}: {e}")
+
+    async def _notify(self, job: IndexJob, text: str):
+        logger.info(text)
+        try:
+            await self.slack_client.chat_postEphemeral(channel=job["channel_id"], user=job["user_id"], text=text)
+        except Exception as e:
+            logger.warning(f"Could not notify {job['user_id']} in {job['channel_id']}: {e}")
+            try:
+                await self.slack_client.chat_postMessage(channel=job["user_id"], text=text)
+            except Exception as e:
+                self._counters["notifications_failed"] += 1
+                logger.error(f"Could not notify {job['user_id']} about index job {job['job_id']}: {e}")
+
+
+_poller: Optional[_IndexJobTracking] = None
+
+
+def start_index_job_poller(slack_client) -> IndexJobPoller:
+    """Start the process-wide poller on a daemon thread, posting notifications with `slack_client`."""
+    global _poller
+    if _poller is None:
+        _poller = IndexJobPoller(slack_client)
+        _poller.start()
+        register_stats("index_job_poller", _poller.stats)
+    return _poller
+
+
+def start_async_index_job_poller(slack_client) -> AsyncIndexJobPoller:
+    """Start the process-wide poller on the running event loop, posting notifications with `slack_client`."""
+    global _poller
+    if _poller is None:
+        _poller = AsyncIndexJobPoller(slack_client)
+        _poller.start()
+        register_stats("index_job_poller", _poller.stats)
+    return _poller
+
+
+def wake_index_job_poller():
+    """Have the poller pick up a job that was just started, if this process runs one."""
+    if _poller is not None:
+        _poller.wake()
@@ -2,9 +2,20 @@ from listeners import actions
 from listeners import commands
 from listeners import events
 from listeners import functions
+from listeners.listener_utils.event_dedup import deduplicate_events
+from listeners.listener_utils.directory_cache import warm_directory_cache
+from listeners.listener_utils.web_api_scheduler import schedule_web_api_calls
+from metrics import count_listener_errors
 
 
 def register_listeners(app):
+    count_listener_errors()
+    # Redelivered events are dropped before any other middleware or listener runs
+    app.use(deduplicate_events)
+    # Every listener's client (and say/complete/fail) goes through the Web API rate scheduler
+    app.use(schedule_web_api_calls)
+    # User and channel names for prompts are loaded in the background, once per workspace and TTL
+    app.use(warm_directory_cache)
     actions.register(app)
     commands.register(app)
     events.register(app)
@@ -2,18 +2,35 @@ from slack_bolt import Ack, Say, BoltContext
 from logging import Logger
 from ai.providers import get_provider_response
 from slack_sdk import WebClient
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT
+from ..listener_utils.response_blocks import ask_response_blocks
 
 """
 Callback for handling the 'ask-sailor' command. It acknowledges the command, retrieves the user's ID and prompt,
-checks if the prompt is empty, and responds with either an error message or the provider's response.
+and hands the rest to the background job executor, which checks if the prompt is empty
+and responds with either an error message or the provider's response.
 """
 
 
 def ask_callback(client: WebClient, ack: Ack, command, say: Say, logger: Logger, context: BoltContext):
+    ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    get_job_executor().submit(
+        user_id,
+        _ask,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+def _ask(client: WebClient, command, logger: Logger, user_id: str, channel_id: str):
     try:
-        ack()
-        user_id = context["user_id"]
-        channel_id = context["channel_id"]
         prompt = command["text"]
 
         if prompt == "":
@@ -24,21 +41,7 @@ def ask_callback(client: WebClient, ack: Ack, command, say: Say, logger: Logger,
             client.chat_postEphemeral(
                 channel=channel_id,
                 user=user_id,
-                blocks=[
-                    {
-                        "type": "rich_text",
-                        "elements": [
-                            {
-                                "type": "rich_text_quote",
-                                "elements": [{"type": "text", "text": prompt}],
-                            },
-                            {
-                                "type": "rich_text_section",
-                                "elements": [{"type": "text", "text": get_provider_response(user_id, prompt)}],
-                            },
-                        ],
-                    }
-                ],
+                blocks=ask_response_blocks(prompt, get_provider_response(user_id, prompt)),
             )
     except Exception as e:
         logger.error(e)
@@ -2,98 +2,117 @@ from slack_bolt import Ack, Say, BoltContext
 from logging import Logger
 from slack_sdk import WebClient
 import os
-import requests
+from knowledge_base import (
+    describe_index_batch,
+    get_do_client,
+    index_data_sources,
+    list_data_sources,
+    needs_listing,
+    new_index_batch,
+    parse_selectors,
+    select_data_sources,
+)
+from state_store import IndexBatch, get_index_job_store
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT
 
 """
-Callback for handling the '/update-debbie' command. This will trigger the DigitalOcean API to start indexing a data source.
+Callback for handling the '/update-debbie' command. This will trigger the DigitalOcean API to start indexing data sources.
+Data sources are given as IDs, glob patterns on their ID or name, or `all`, separated by commas or spaces.
+The DigitalOcean API calls run on the background job executor after the command is acknowledged; progress is reported
+in one message that is updated as jobs are submitted and, by the background index job poller, as they finish.
 """
 
+
 def do_index_callback(client: WebClient, ack: Ack, command, say: Say, logger: Logger, context: BoltContext):
+    ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    get_job_executor().submit(
+        user_id,
+        _start_index_job,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+def _report_progress(client: WebClient, logger: Logger, batch: IndexBatch, text: str, first: bool = False):
+    if batch["message_ts"]:
+        client.chat_update(channel=batch["message_channel"], ts=batch["message_ts"], text=text)
+        return
+    if not first:
+        return
+    # The bot may not be a member of the channel; report in a direct message then
+    for channel in (batch["channel_id"], batch["user_id"]):
+        try:
+            response = client.chat_postMessage(channel=channel, text=text)
+            batch["message_channel"], batch["message_ts"] = response["channel"], response["ts"]
+            return
+        except Exception as e:
+            logger.warning(f"Could not post indexing progress to {channel}: {e}")
+
+
+def _start_index_job(client: WebClient, command, logger: Logger, user_id: str, channel_id: str):
     try:
-        ack()
-        user_id = context["user_id"]
-        channel_id = context["channel_id"]
-        # Optionally, you can accept arguments from the command text
-        data_source_id = command.get("text", "").strip() or os.environ.get("DO_DATA_SOURCE_ID")
+        # Data sources from the command text, or the default one
+        selectors = parse_selectors(command.get("text", "")) or parse_selectors(os.environ.get("DO_DATA_SOURCE_ID", ""))
         knowledge_base_id = os.environ.get("DO_KB_ID")
         if not knowledge_base_id:
             client.chat_postEphemeral(
                 channel=channel_id,
                 user=user_id,
-                text="Knowledge base ID is not set. Please set DO_KB_ID in the environment."
+                text="Knowledge base ID is not set. Please set DO_KB_ID in the environment.",
             )
             return
 
-        if not data_source_id:
+        if not selectors:
             client.chat_postEphemeral(
                 channel=channel_id,
                 user=user_id,
-                text="Please provide a data source ID as an argument or set DO_DATA_SOURCE_ID in the environment."
+                text="Please provide data source IDs, patterns or `all` as arguments, "
+                "or set DO_DATA_SOURCE_ID in the environment.",
             )
             return
 
-        # DigitalOcean API endpoint and token
-        do_api_token = os.environ.get("DO_API_TOKEN")
-        if not do_api_token:
+        # Shared DigitalOcean API client for DO_API_TOKEN
+        do_client = get_do_client()
+        if not do_client:
             client.chat_postEphemeral(
                 channel=channel_id,
                 user=user_id,
-                text="DigitalOcean API token is not set. Please set DO_API_TOKEN in the environment."
+                text="DigitalOcean API token is not set. Please set DO_API_TOKEN in the environment.",
             )
             return
 
-        # New DigitalOcean API call for indexing job
-        url = "https://api.digitalocean.com/v2/gen-ai/indexing_jobs"
-        headers = {
-            "Authorization": f"Bearer {do_api_token}",
-            "Content-Type": "application/json"
-        }
-        payload = {
-            "knowledge_base_uuid": knowledge_base_id,
-            "data_source_uuids": [data_source_id]
-        }
-        response = requests.post(url, headers=headers, json=payload)
-        if response.status_code == 200:
-            try:
-                resp_json = response.json()
-                index_job_id = None
-                if "jobs" in resp_json and isinstance(resp_json["jobs"], list) and resp_json["jobs"]:
-                    index_job_id = resp_json["jobs"][0]["uuid"]
-                elif "job" in resp_json and isinstance(resp_json["job"], dict):
-                    index_job_id = resp_json["job"].get("uuid")
-                if index_job_id:
-                    # Ensure the index_jobs directory exists
-                    dir_path = os.path.join(os.path.dirname(__file__), '../../index_jobs')
-                    dir_path = os.path.abspath(dir_path)
-                    os.makedirs(dir_path, exist_ok=True)
-                    file_path = os.path.join(dir_path, f"last_index_job_{channel_id}.txt")
-                    with open(file_path, "w") as f:
-                        f.write(index_job_id)
-                    logger.info(f"Stored index job ID {index_job_id} at {file_path}")
-                else:
-                    logger.error(f"No index job ID found in response: {resp_json}")
-                client.chat_postEphemeral(
-                    channel=channel_id,
-                    user=user_id,
-                    text=f"Indexing job started for data source `{data_source_id}` in knowledge base `{knowledge_base_id}`. Index Job ID: `{index_job_id}`."
-                )
-            except Exception as file_err:
-                logger.error(f"Failed to store index job ID: {file_err}")
-                client.chat_postEphemeral(
-                    channel=channel_id,
-                    user=user_id,
-                    text=f"Indexing job started, but failed to store job ID for progress tracking. Error: {file_err}"
-                )
-        else:
+        data_source_ids = selectors
+        if needs_listing(selectors):
+            data_source_ids = select_data_sources(list_data_sources(knowledge_base_id, do_client), selectors)
+        if not data_source_ids:
             client.chat_postEphemeral(
                 channel=channel_id,
                 user=user_id,
-                text=f"Failed to start indexing job. Status: {response.status_code}, Response: {response.text}"
+                text=f"No data sources in knowledge base `{knowledge_base_id}` match `{' '.join(selectors)}`.",
             )
+            return
+
+        batch = new_index_batch(knowledge_base_id, data_source_ids, user_id, channel_id)
+        index_data_sources(
+            batch,
+            lambda batch, done, total: _report_progress(
+                client, logger, batch, describe_index_batch(batch, [], (done, total)), first=done == 0
+            ),
+            do_client,
+        )
+        logger.info(f"Started index jobs {batch['job_ids']} for channel {channel_id}")
+        text = describe_index_batch(batch, get_index_job_store().batch_jobs(batch))
+        if batch["message_ts"]:
+            _report_progress(client, logger, batch, text)
+        else:
+            client.chat_postEphemeral(channel=channel_id, user=user_id, text=text)
     except Exception as e:
         logger.error(f"Error in /update-debbie: {e}")
-        client.chat_postEphemeral(
-            channel=context["channel_id"],
-            user=context["user_id"],
-            text=f"An error occurred: {e}"
-        )
+        client.chat_postEphemeral(channel=channel_id, user=user_id, text=f"An error occurred: {e}")
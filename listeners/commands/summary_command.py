@@ -1,22 +1,40 @@
 from slack_bolt import Ack, Say, BoltContext
 from logging import Logger
-from ai.providers import get_provider_response
+from ai.summarize import summarize_conversation
 from slack_sdk import WebClient
-from ..listener_utils.listener_constants import DEFAULT_LOADING_TEXT, SUMMARIZE_THREAD_PROMPT
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT, SUMMARIZE_THREAD_PROMPT
+from ..listener_utils.fetch_conversation import fetch_thread_messages
 from ..listener_utils.parse_conversation import parse_conversation
-import re
+from ..listener_utils.response_blocks import thread_summary_blocks
+from ..listener_utils.thread_link import parse_thread_link
 
 """
 Callback for handling the 'sailor-summary' command. It acknowledges the command, parses the thread link,
-retrieves the thread's conversation, and responds with a summary generated by the AI provider.
+retrieves every page of the thread's conversation, and responds with a summary generated by the AI provider
+(map-reduce over chunks for long threads, see `ai/summarize.py`).
+Everything after the acknowledgement runs on the background job executor.
 """
 
 
 def summary_callback(client: WebClient, ack: Ack, command, say: Say, logger: Logger, context: BoltContext):
+    ack()
+    user_id = context["user_id"]
+    channel_id = context["channel_id"]
+    get_job_executor().submit(
+        user_id,
+        _summarize_thread,
+        client,
+        command,
+        logger,
+        user_id,
+        channel_id,
+        on_busy=lambda: client.chat_postEphemeral(channel=channel_id, user=user_id, text=BUSY_TEXT),
+    )
+
+
+def _summarize_thread(client: WebClient, command, logger: Logger, user_id: str, channel_id: str):
     try:
-        ack()
-        user_id = context["user_id"]
-        channel_id = context["channel_id"]
         thread_link = command.get("text", "").strip()
 
         # If no thread link provided, inform the user
@@ -29,24 +47,17 @@ def summary_callback(client: WebClient, ack: Ack, command, say: Say, logger: Log
             return
         
         # Parse the thread link to extract channel ID and thread timestamp
-        # Slack thread links format: https://workspace.slack.com/archives/C12345678/p1234567890123456
-        thread_pattern = r'archives/([A-Z0-9]+)/p(\d+)'
-        match = re.search(thread_pattern, thread_link)
-        
-        if not match:
+        parsed_link = parse_thread_link(thread_link)
+        if not parsed_link:
             client.chat_postEphemeral(
-                channel=channel_id, 
-                user=user_id, 
+                channel=channel_id,
+                user=user_id,
                 text="Invalid thread link format. Please provide a valid Slack thread link."
             )
             return
-        
-        thread_channel_id = match.group(1)
-        # Convert the timestamp format from p1234567890123456 to 1234567890.123456
-        thread_ts = match.group(2)
-        if len(thread_ts) > 10:
-            thread_ts = f"{thread_ts[:10]}.{thread_ts[10:]}"
-        
+
+        thread_channel_id, thread_ts = parsed_link
+
         # Post a loading message
         loading_message = client.chat_postMessage(
             channel=channel_id,
@@ -55,10 +66,7 @@ def summary_callback(client: WebClient, ack: Ack, command, say: Say, logger: Log
 
         # Get thread messages
         try:
-            thread_messages = client.conversations_replies(
-                channel=thread_channel_id,
-                ts=thread_ts
-            )["messages"]
+            thread_messages = fetch_thread_messages(client, thread_channel_id, thread_ts)
         except Exception as e:
             client.chat_update(
                 channel=channel_id,
@@ -71,30 +79,14 @@ def summary_callback(client: WebClient, ack: Ack, command, say: Say, logger: Log
         conversation = parse_conversation(thread_messages)
         
         # Get summary from AI provider
-        summary = get_provider_response(user_id, SUMMARIZE_THREAD_PROMPT, conversation)
+        summary = summarize_conversation(user_id, SUMMARIZE_THREAD_PROMPT, conversation)
 
         # Update loading message with summary
         client.chat_update(
             channel=channel_id,
             ts=loading_message["ts"],
             text="Thread Summary",
-            blocks=[
-                {
-                    "type": "rich_text",
-                    "elements": [
-                        {
-                            "type": "rich_text_section",
-                            "elements": [
-                                {"type": "text", "text": "Thread Summary:"},
-                            ]
-                        },
-                        {
-                            "type": "rich_text_section",
-                            "elements": [{"type": "text", "text": summary}],
-                        },
-                    ],
-                }
-            ],
+            blocks=thread_summary_blocks(summary),
         )
     except Exception as e:
         logger.error(e)
@@ -1,39 +1,68 @@
-from ai.providers import get_provider_response
+from ai.providers import get_provider_response_stream
 from logging import Logger
 from slack_sdk import WebClient
 from slack_bolt import Say
-from ..listener_utils.listener_constants import DEFAULT_LOADING_TEXT, MENTION_WITHOUT_TEXT
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT, MENTION_WITHOUT_TEXT
+from ..listener_utils.fetch_conversation import (
+    RECENT_CONTEXT_MESSAGES,
+    context_before,
+    fetch_channel_messages,
+    fetch_recent_thread_messages,
+)
 from ..listener_utils.parse_conversation import parse_conversation
+from ..listener_utils.stream_renderer import StreamingMessageRenderer
+from ..listener_utils.thread_memory import summarize_thread_later, thread_context
 
 """
-Handles the event when the app is mentioned in a Slack channel, retrieves the conversation context,
-and generates an AI response if text is provided, otherwise sends a default response
+Handles the event when the app is mentioned in a Slack channel, retrieves the conversation context
+(from the conversation cache when the thread or channel was fetched recently; in a thread, through the thread's
+memory of recent messages and a rolling summary of older ones), and streams an AI response into the thread
+if text is provided, otherwise sends a default response.
+The work runs on the background job executor so Bolt's listener threads stay free.
 """
 
 
 def app_mentioned_callback(client: WebClient, event: dict, logger: Logger, say: Say):
-    try:
-        channel_id = event.get("channel")
-        thread_ts = event.get("thread_ts")
-        user_id = event.get("user")
-        text = event.get("text")
+    get_job_executor().submit(
+        event.get("user"),
+        _reply_to_mention,
+        client,
+        event,
+        logger,
+        say,
+        on_busy=lambda: say(text=BUSY_TEXT, thread_ts=event.get("thread_ts") or event["ts"]),
+    )
+
+
+def _reply_to_mention(client: WebClient, event: dict, logger: Logger, say: Say):
+    channel_id = event.get("channel")
+    thread_ts = event.get("thread_ts")
+    user_id = event.get("user")
+    text = event.get("text")
+    waiting_message = None
 
-        if thread_ts:
-            conversation = client.conversations_replies(channel=channel_id, ts=thread_ts, limit=10)["messages"]
+    try:
+        # Served from the conversation cache when this thread or channel was fetched recently
+        in_thread = bool(thread_ts)
+        if in_thread:
+            conversation = fetch_recent_thread_messages(client, channel_id, thread_ts)
+            conversation_context = thread_context(channel_id, thread_ts, conversation, event["ts"])
         else:
-            conversation = client.conversations_history(channel=channel_id, limit=10)["messages"]
+            conversation = fetch_channel_messages(client, channel_id, RECENT_CONTEXT_MESSAGES + 1)
+            conversation_context = parse_conversation(context_before(conversation, event["ts"]))
             thread_ts = event["ts"]
 
-        conversation_context = parse_conversation(conversation[:-1])
-
         if text:
             waiting_message = say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
-            response = get_provider_response(user_id, text, conversation_context)
-            client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=response)
+            renderer = StreamingMessageRenderer(client, channel_id, waiting_message["ts"])
+            renderer.render(get_provider_response_stream(user_id, text, conversation_context))
+            if in_thread:
+                summarize_thread_later(user_id, channel_id, thread_ts)
         else:
-            response = MENTION_WITHOUT_TEXT
-            client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=response)
-
+            say(text=MENTION_WITHOUT_TEXT, thread_ts=thread_ts)
     except Exception as e:
         logger.error(e)
-        client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}")
+        # Nothing to update when the error came before the loading message was posted
+        if waiting_message:
+            client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}")
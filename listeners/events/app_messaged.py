@@ -1,34 +1,55 @@
 from ai.ai_constants import DM_SYSTEM_CONTENT
-from ai.providers import get_provider_response
+from ai.providers import get_provider_response_stream
 from logging import Logger
 from slack_bolt import Say
 from slack_sdk import WebClient
-from ..listener_utils.listener_constants import DEFAULT_LOADING_TEXT
-from ..listener_utils.parse_conversation import parse_conversation
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT, DEFAULT_LOADING_TEXT
+from ..listener_utils.fetch_conversation import fetch_recent_thread_messages
+from ..listener_utils.stream_renderer import StreamingMessageRenderer
+from ..listener_utils.thread_memory import summarize_thread_later, thread_context
 
 """
-Handles the event when a direct message is sent to the bot, retrieves the conversation context,
-and generates an AI response.
+Handles the event when a direct message is sent to the bot, retrieves the conversation context
+(in a thread, from the thread's memory of recent messages and a rolling summary of older ones),
+and streams an AI response into the conversation.
+Only direct messages are handed to the background job executor; other message events return immediately.
 """
 
 
 def app_messaged_callback(client: WebClient, event: dict, logger: Logger, say: Say):
+    if event.get("channel_type") == "im":
+        get_job_executor().submit(
+            event.get("user"),
+            _reply_to_dm,
+            client,
+            event,
+            logger,
+            say,
+            on_busy=lambda: say(text=BUSY_TEXT, thread_ts=event.get("thread_ts")),
+        )
+
+
+def _reply_to_dm(client: WebClient, event: dict, logger: Logger, say: Say):
     channel_id = event.get("channel")
     thread_ts = event.get("thread_ts")
     user_id = event.get("user")
     text = event.get("text")
+    waiting_message = None
 
     try:
-        if event.get("channel_type") == "im":
-            conversation_context = ""
+        conversation_context = ""
 
-            if thread_ts:  # Retrieves context to continue the conversation in a thread.
-                conversation = client.conversations_replies(channel=channel_id, limit=10, ts=thread_ts)["messages"]
-                conversation_context = parse_conversation(conversation[:-1])
+        if thread_ts:  # Retrieves context to continue the conversation in a thread.
+            conversation = fetch_recent_thread_messages(client, channel_id, thread_ts)
+            conversation_context = thread_context(channel_id, thread_ts, conversation, event["ts"])
 
-            waiting_message = say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
-            response = get_provider_response(user_id, text, conversation_context, DM_SYSTEM_CONTENT)
-            client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=response)
+        waiting_message = say(text=DEFAULT_LOADING_TEXT, thread_ts=thread_ts)
+        renderer = StreamingMessageRenderer(client, channel_id, waiting_message["ts"])
+        renderer.render(get_provider_response_stream(user_id, text, conversation_context, DM_SYSTEM_CONTENT))
+        if thread_ts:
+            summarize_thread_later(user_id, channel_id, thread_ts)
     except Exception as e:
         logger.error(e)
-        client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}")
+        if waiting_message:
+            client.chat_update(channel=channel_id, ts=waiting_message["ts"], text=f"Received an error from Bolty:\n{e}")
@@ -0,0 +1,10 @@
+from ..listener_utils.directory_cache import get_directory_cache
+
+"""
+Callback for the 'user_change' and 'team_join' events. It updates the user's name in the directory cache,
+so renamed and new users show up correctly in prompts without waiting for the next directory load.
+"""
+
+
+def user_changed_callback(event: dict):
+    get_directory_cache().update_user(event.get("user") or {})
@@ -1,14 +1,17 @@
-from ai.providers import get_provider_response
+from ai.summarize import summarize_conversation
 from logging import Logger
 from slack_bolt import Complete, Fail, Ack
 from slack_sdk import WebClient
-from ..listener_utils.listener_constants import SUMMARIZE_CHANNEL_WORKFLOW
+from workers import get_job_executor
+from ..listener_utils.listener_constants import BUSY_TEXT, SUMMARIZE_CHANNEL_WORKFLOW
+from ..listener_utils.fetch_conversation import fetch_channel_messages, workflow_summary_max_messages
 from ..listener_utils.parse_conversation import parse_conversation
 
 """
 Handles the event to summarize a Slack channel's conversation history.
-It retrieves the conversation history, parses it, generates a summary using an AI response,
-and completes the workflow with the summary or fails if an error occurs.
+It retrieves the channel's recent history (`WORKFLOW_SUMMARY_MAX_MESSAGES`, default 200), parses it,
+generates a summary using an AI response, and completes the workflow with the summary or fails if an error occurs.
+The summary is generated on the background job executor after the function is acknowledged.
 """
 
 
@@ -16,13 +19,26 @@ def handle_summary_function_callback(
     ack: Ack, inputs: dict, fail: Fail, logger: Logger, client: WebClient, complete: Complete
 ):
     ack()
+    get_job_executor().submit(
+        inputs["user_context"]["id"],
+        _summarize_channel,
+        inputs,
+        fail,
+        logger,
+        client,
+        complete,
+        on_busy=lambda: fail(BUSY_TEXT),
+    )
+
+
+def _summarize_channel(inputs: dict, fail: Fail, logger: Logger, client: WebClient, complete: Complete):
     try:
         user_context = inputs["user_context"]
         channel_id = inputs["channel_id"]
-        history = client.conversations_history(channel=channel_id, limit=10)["messages"]
+        history = fetch_channel_messages(client, channel_id, max_messages=workflow_summary_max_messages())
         conversation = parse_conversation(history)
 
-        summary = get_provider_response(user_context["id"], SUMMARIZE_CHANNEL_WORKFLOW, conversation)
+        summary = summarize_conversation(user_context["id"], SUMMARIZE_CHANNEL_WORKFLOW, conversation)
 
         complete({"user_context": user_context, "response": summary})
     except Exception as e:
@@ -0,0 +1,174 @@
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+from metrics import register_stats
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+In-process cache of recent Slack messages per channel timeline and per thread.
+A conversation enters the cache when it is first fetched from the Web API ("seeded"). From then on the
+`message` events the app already receives (new messages, edits and deletions) keep it current, so later
+mentions, DMs and summaries in the same conversation read their context locally instead of calling
+`conversations.history` / `conversations.replies` again.
+The cache only answers when it can prove it holds what was asked for: threads are always seeded with every
+reply, and a channel timeline seeded with the newest N messages can serve any request for at most as many
+messages as it has accumulated since. Anything else is a miss and falls back to the API.
+Events can still be missed (socket reconnects, or several replicas splitting the event stream), so every
+conversation is re-fetched `CONVERSATION_CACHE_TTL` seconds (default 300) after it was seeded.
+Set `CONVERSATION_CACHE=off` when events are spread over several processes without the stream worker setup.
+Bounded by `CONVERSATION_CACHE_MAX_CONVERSATIONS` (default 1000) and `CONVERSATION_CACHE_MAX_MESSAGES`
+per conversation (default 1000).
+"""
+
+# Message subtypes that add a visible message to a conversation
+_MESSAGE_SUBTYPES = {None, "bot_message", "file_share", "thread_broadcast", "me_message"}
+
+ConversationKey = Tuple[str, Optional[str]]
+
+
+class _Conversation:
+    def __init__(self, complete: bool, expires_at: float):
+        self.messages: Dict[str, dict] = {}
+        # True when every message of the conversation is held, not just the newest ones
+        self.complete = complete
+        self.expires_at = expires_at
+
+    def ordered(self) -> List[dict]:
+        return [self.messages[ts] for ts in sorted(self.messages, key=float)]
+
+
+class ConversationCache:
+    def __init__(
+        self,
+        *,
+        max_conversations: Optional[int] = None,
+        max_messages: Optional[int] = None,
+        ttl: Optional[float] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.max_conversations = max_conversations or int(os.environ.get("CONVERSATION_CACHE_MAX_CONVERSATIONS", 1000))
+        self.max_messages = max_messages or int(os.environ.get("CONVERSATION_CACHE_MAX_MESSAGES", 1000))
+        self.ttl = ttl or float(os.environ.get("CONVERSATION_CACHE_TTL", 300))
+        self.enabled = enabled if enabled is not None else os.environ.get("CONVERSATION_CACHE", "on").lower() != "off"
+        self._conversations: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "seeded": 0, "events": 0}
+
+    def _get(self, key: ConversationKey) -> Optional[_Conversation]:
+        conversation = self._conversations.get(key)
+        if conversation is not None and conversation.expires_at < time.monotonic():
+            del self._conversations[key]
+            return None
+        return conversation
+
+    def _trim(self, conversation: _Conversation):
+        if len(conversation.messages) > self.max_messages:
+            for ts in sorted(conversation.messages, key=float)[: len(conversation.messages) - self.max_messages]:
+                del conversation.messages[ts]
+            conversation.complete = False
+
+    def get(self, channel: str, thread_ts: Optional[str] = None, limit: Optional[int] = None) -> Optional[List[dict]]:
+        """Return the newest `limit` messages (all if None), oldest first, or None if the cache cannot vouch for them."""
+        if not self.enabled:
+            return None
+        with self._lock:
+            conversation = self._get((channel, thread_ts))
+            usable = conversation is not None and (
+                conversation.complete or (limit is not None and len(conversation.messages) >= limit)
+            )
+            if not usable:
+                self._counters["misses"] += 1
+                return None
+            self._conversations.move_to_end((channel, thread_ts))
+            self._counters["hits"] += 1
+            messages = conversation.ordered()
+        return messages[-limit:] if limit else messages
+
+    def seed(self, channel: str, thread_ts: Optional[str], messages: List[dict], complete: bool):
+        """Store messages just fetched from the API; `complete` means they are the whole conversation."""
+        if not self.enabled:
+            return
+        with self._lock:
+            conversation = _Conversation(complete, time.monotonic() + self.ttl)
+            for message in messages:
+                conversation.messages[message["ts"]] = message
+            self._trim(conversation)
+            self._conversations[(channel, thread_ts)] = conversation
+            self._conversations.move_to_end((channel, thread_ts))
+            while len(self._conversations) > self.max_conversations:
+                self._conversations.popitem(last=False)
+            self._counters["seeded"] += 1
+
+    def record_event(self, event: dict):
+        """Apply a `message` event to every cached conversation it belongs to."""
+        if not self.enabled:
+            return
+        subtype = event.get("subtype")
+        channel = event.get("channel")
+        with self._lock:
+            self._counters["events"] += 1
+            if subtype in _MESSAGE_SUBTYPES:
+                self._add(channel, event)
+            elif subtype == "message_changed" and event.get("message"):
+                self._add(channel, event["message"], replace_only=True)
+            elif subtype == "message_deleted":
+                previous = event.get("previous_message") or {}
+                for key in self._keys_for(channel, event.get("deleted_ts"), previous.get("thread_ts")):
+                    conversation = self._get(key)
+                    if conversation is not None:
+                        conversation.messages.pop(event.get("deleted_ts"), None)
+
+    @staticmethod
+    def _keys_for(channel: str, ts: str, thread_ts: Optional[str], broadcast: bool = False) -> List[ConversationKey]:
+        keys = []
+        if not thread_ts or thread_ts == ts or broadcast:
+            keys.append((channel, None))
+        if thread_ts:
+            keys.append((channel, thread_ts))
+        return keys
+
+    def _add(self, channel: str, message: dict, replace_only: bool = False):
+        ts = message.get("ts")
+        if not ts:
+            return
+        broadcast = message.get("subtype") == "thread_broadcast"
+        for key in self._keys_for(channel, ts, message.get("thread_ts"), broadcast):
+            conversation = self._get(key)
+            if conversation is None or (replace_only and ts not in conversation.messages):
+                continue
+            conversation.messages[ts] = message
+            self._trim(conversation)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"conversations": len(self._conversations), **self._counters}
+
+
+_conversation_cache = ConversationCache()
+register_stats("conversation_cache", _conversation_cache.stats)
+
+
+def get_conversation_cache() -> ConversationCache:
+    return _conversation_cache
+
+
+def record_conversation_events(body: dict, next):
+    """Global middleware run before authorization, so the app's own messages (which Bolt drops as self events
+    right after authorization) are recorded too; the cache must hold the bot's replies to match the API."""
+    event = body.get("event") or {}
+    if event.get("type") == "message":
+        _conversation_cache.record_event(event)
+    return next()
+
+
+async def record_conversation_events_async(body: dict, next):
+    event = body.get("event") or {}
+    if event.get("type") == "message":
+        _conversation_cache.record_event(event)
+    return await next()
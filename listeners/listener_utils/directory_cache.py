@@ -0,0 +1,180 @@
+from typing import Dict, List, Optional, Tuple
+from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from metrics import register_stats
+from .web_api_scheduler import background_priority
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+In-process directory of user and channel names, used to show people and channels by name in prompts.
+The whole directory of a workspace is loaded in the background with paginated `users.list` and
+`conversations.list` calls at background priority, the first time a request from that workspace comes in and
+again every `DIRECTORY_CACHE_TTL` seconds (default 3600); until then names resolve to what is already known.
+`user_change` and `team_join` events keep it current between loads, so no lookup is ever made per message.
+`warm_directory_cache` is the global middleware that starts the loads. It also records this app's bot ID and bot
+user ID from each request's authorization, so the app's own messages can be told apart from other bots'.
+Set `DIRECTORY_CACHE=off` to disable the loads.
+"""
+
+PAGE_SIZE = 200
+# Seconds before a failed load is tried again
+RETRY_AFTER_ERROR = 60
+
+
+def display_name(user: dict) -> str:
+    """The name Slack shows for a user: display name, then real name, then username."""
+    profile = user.get("profile") or {}
+    return profile.get("display_name") or profile.get("real_name") or user.get("real_name") or user.get("name") or user["id"]
+
+
+class DirectoryCache:
+    def __init__(self, *, ttl: Optional[float] = None, enabled: Optional[bool] = None):
+        self.ttl = ttl or float(os.environ.get("DIRECTORY_CACHE_TTL", 3600))
+        self.enabled = enabled if enabled is not None else os.environ.get("DIRECTORY_CACHE", "on").lower() != "off"
+        self._users: Dict[str, str] = {}
+        self._channels: Dict[str, str] = {}
+        # team -> monotonic time of its last complete load
+        self._loaded_at: Dict[str, float] = {}
+        self._loading = set()
+        # This app's bot IDs and bot user IDs
+        self._app_ids = set()
+        self._lock = threading.Lock()
+        self._counters = {"loads": 0, "load_errors": 0, "user_updates": 0}
+
+    def user_name(self, user_id: str) -> Optional[str]:
+        return self._users.get(user_id)
+
+    def channel_name(self, channel_id: str) -> Optional[str]:
+        return self._channels.get(channel_id)
+
+    def remember_app(self, bot_id: Optional[str], bot_user_id: Optional[str]):
+        """Record this app's identity, as given by `auth.test` through the request's authorization."""
+        for app_id in (bot_id, bot_user_id):
+            if app_id and app_id not in self._app_ids:
+                with self._lock:
+                    self._app_ids.add(app_id)
+
+    def is_app_message(self, message: dict) -> bool:
+        """Whether this app posted `message`, rather than a person, another bot or an integration."""
+        return any(message.get(key) in self._app_ids for key in ("bot_id", "user") if message.get(key))
+
+    def update_user(self, user: dict):
+        """Apply a `user_change` or `team_join` event's user."""
+        if user and user.get("id"):
+            self._users[user["id"]] = display_name(user)
+            with self._lock:
+                self._counters["user_updates"] += 1
+
+    def _claim_load(self, team_id: str) -> bool:
+        """True when the team's directory is missing or stale and no load is running; the caller then loads it."""
+        if not self.enabled:
+            return False
+        with self._lock:
+            loaded_at = self._loaded_at.get(team_id)
+            if team_id in self._loading or (loaded_at is not None and time.monotonic() - loaded_at < self.ttl):
+                return False
+            self._loading.add(team_id)
+            return True
+
+    def _finish_load(self, team_id: str, users: Dict[str, str], channels: Dict[str, str], error: Optional[Exception]):
+        with self._lock:
+            self._loading.discard(team_id)
+            if error is not None:
+                self._counters["load_errors"] += 1
+                logger.error(f"Failed to load the Slack directory of {team_id}: {error}")
+                self._loaded_at[team_id] = time.monotonic() - self.ttl + RETRY_AFTER_ERROR
+                return
+            self._users.update(users)
+            self._channels.update(channels)
+            self._loaded_at[team_id] = time.monotonic()
+            self._counters["loads"] += 1
+
+    @staticmethod
+    def _collect(users: Dict[str, str], channels: Dict[str, str], page: dict):
+        for member in page.get("members") or []:
+            users[member["id"]] = display_name(member)
+        for channel in page.get("channels") or []:
+            channels[channel["id"]] = channel.get("name") or channel["id"]
+
+    @staticmethod
+    def _requests() -> List[Tuple[str, dict]]:
+        return [
+            ("users_list", {"limit": PAGE_SIZE}),
+            (
+                "conversations_list",
+                {"limit": PAGE_SIZE, "types": "public_channel,private_channel", "exclude_archived": True},
+            ),
+        ]
+
+    def refresh(self, client: WebClient, team_id: str):
+        """Load the team's users and channels if they are missing or stale."""
+        if self._claim_load(team_id):
+            self._load(client, team_id)
+
+    async def refresh_async(self, client: AsyncWebClient, team_id: str):
+        if self._claim_load(team_id):
+            await self._load_async(client, team_id)
+
+    def _load(self, client: WebClient, team_id: str):
+        users, channels, error = {}, {}, None
+        try:
+            with background_priority():
+                for method, args in self._requests():
+                    # Iterating a SlackResponse follows `response_metadata.next_cursor` page by page
+                    for page in getattr(client, method)(**args):
+                        self._collect(users, channels, page)
+        except Exception as e:
+            error = e
+        self._finish_load(team_id, users, channels, error)
+
+    async def _load_async(self, client: AsyncWebClient, team_id: str):
+        users, channels, error = {}, {}, None
+        try:
+            with background_priority():
+                for method, args in self._requests():
+                    async for page in await getattr(client, method)(**args):
+                        self._collect(users, channels, page)
+        except Exception as e:
+            error = e
+        self._finish_load(team_id, users, channels, error)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"users": len(self._users), "channels": len(self._channels), **self._counters}
+
+
+_directory_cache = DirectoryCache()
+register_stats("directory_cache", _directory_cache.stats)
+_refresh_tasks = set()
+
+
+def get_directory_cache() -> DirectoryCache:
+    return _directory_cache
+
+
+def warm_directory_cache(context, next):
+    """Global middleware: start loading the workspace's directory in the background when it is missing or stale."""
+    team_id = context.get("team_id") or context.get("enterprise_id") or ""
+    _directory_cache.remember_app(context.bot_id, context.bot_user_id)
+    if context.client is not None and _directory_cache._claim_load(team_id):
+        threading.Thread(target=_directory_cache._load, args=(context.client, team_id), daemon=True).start()
+    return next()
+
+
+async def warm_directory_cache_async(context, next):
+    team_id = context.get("team_id") or context.get("enterprise_id") or ""
+    _directory_cache.remember_app(context.bot_id, context.bot_user_id)
+    if context.client is not None and _directory_cache._claim_load(team_id):
+        task = asyncio.get_running_loop().create_task(_directory_cache._load_async(context.client, team_id))
+        # Keep a reference until it finishes, so the task is not garbage collected mid-load
+        _refresh_tasks.add(task)
+        task.add_done_callback(_refresh_tasks.discard)
+    return await next()
@@ -0,0 +1,138 @@
+from collections import OrderedDict
+from typing import List, Optional
+from slack_bolt import BoltResponse
+import logging
+import os
+import threading
+import time
+
+from metrics import register_stats
+from state_store.redis_pool import get_async_redis_client, get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Drops Slack events that were already delivered, before any listener, LLM or Slack call runs.
+Slack redelivers an event when it was not acknowledged in time or a socket reconnected mid-delivery;
+redeliveries keep their `event_id`, and the same user message keeps its `client_msg_id`. Each event claims
+`event_id` and `<event type>:<client_msg_id>` (so a mention still reaches both the `app_mention` and the
+`message` listeners); if any key was claimed already, the event is acknowledged and dropped.
+Claims live for `EVENT_DEDUP_TTL` seconds (default 600), in Redis with `SET NX EX` when `REDIS_URL` is set so
+every replica shares them, otherwise in memory (bounded by `EVENT_DEDUP_MAX_KEYS`, default 50000).
+If Redis is unreachable events are processed rather than dropped. Suppressed duplicates are counted in `stats()`.
+Events a stream worker reclaims from a crashed peer carry `redelivered` in the Bolt context and are let through.
+"""
+
+KEY_PREFIX = "chatbot:event:"
+
+
+def dedup_keys(body: dict) -> List[str]:
+    if body.get("type") != "event_callback":
+        return []
+    event = body.get("event") or {}
+    keys = []
+    if body.get("event_id"):
+        keys.append(f"id:{body['event_id']}")
+    if event.get("client_msg_id"):
+        keys.append(f"msg:{event.get('type')}:{event['client_msg_id']}")
+    return keys
+
+
+class EventDeduplicator:
+    def __init__(self, *, redis_url: Optional[str] = None, ttl: Optional[int] = None, max_keys: Optional[int] = None):
+        self.redis_url = redis_url or os.environ.get("REDIS_URL")
+        self.ttl = ttl or int(os.environ.get("EVENT_DEDUP_TTL", 600))
+        self.max_keys = max_keys or int(os.environ.get("EVENT_DEDUP_MAX_KEYS", 50000))
+        self._claims: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.processed = 0
+        self.suppressed = 0
+
+    def _claim_locally(self, key: str) -> bool:
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._claims.get(key)
+            if expires_at is not None and expires_at > now:
+                return False
+            self._claims[key] = now + self.ttl
+            self._claims.move_to_end(key)
+            while len(self._claims) > self.max_keys:
+                self._claims.popitem(last=False)
+            return True
+
+    def _record(self, duplicate: bool, keys: List[str]) -> bool:
+        with self._lock:
+            if duplicate:
+                self.suppressed += 1
+            else:
+                self.processed += 1
+        if duplicate:
+            logger.info(f"Dropping duplicate Slack event {keys}")
+        return duplicate
+
+    def is_duplicate(self, body: dict) -> bool:
+        """Claim the event's keys; True if it was seen before."""
+        keys = dedup_keys(body)
+        if not keys:
+            return False
+        if self.redis_url:
+            try:
+                pipe = get_redis_client(self.redis_url).pipeline(transaction=False)
+                for key in keys:
+                    pipe.set(KEY_PREFIX + key, 1, nx=True, ex=self.ttl)
+                claimed = pipe.execute()
+            except Exception as e:
+                logger.error(f"Event deduplication unavailable, processing event: {e}")
+                return False
+        else:
+            claimed = [self._claim_locally(key) for key in keys]
+        return self._record(not all(claimed), keys)
+
+    async def is_duplicate_async(self, body: dict) -> bool:
+        keys = dedup_keys(body)
+        if not keys:
+            return False
+        if self.redis_url:
+            try:
+                pipe = get_async_redis_client(self.redis_url).pipeline(transaction=False)
+                for key in keys:
+                    pipe.set(KEY_PREFIX + key, 1, nx=True, ex=self.ttl)
+                claimed = await pipe.execute()
+            except Exception as e:
+                logger.error(f"Event deduplication unavailable, processing event: {e}")
+                return False
+        else:
+            claimed = [self._claim_locally(key) for key in keys]
+        return self._record(not all(claimed), keys)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"processed": self.processed, "suppressed_duplicates": self.suppressed}
+
+
+_event_deduplicator: Optional[EventDeduplicator] = None
+_deduplicator_lock = threading.Lock()
+
+
+def get_event_deduplicator() -> EventDeduplicator:
+    global _event_deduplicator
+    if _event_deduplicator is None:
+        with _deduplicator_lock:
+            if _event_deduplicator is None:
+                _event_deduplicator = EventDeduplicator()
+                register_stats("event_dedup", _event_deduplicator.stats)
+    return _event_deduplicator
+
+
+def deduplicate_events(body: dict, context: dict, next):
+    """Global middleware: acknowledge and drop events that were already delivered."""
+    if not context.get("redelivered") and get_event_deduplicator().is_duplicate(body):
+        return BoltResponse(status=200, body="")
+    return next()
+
+
+async def deduplicate_events_async(body: dict, context: dict, next):
+    if not context.get("redelivered") and await get_event_deduplicator().is_duplicate_async(body):
+        return BoltResponse(status=200, body="")
+    return await next()
@@ -0,0 +1,129 @@
+from typing import List, Optional
+from slack_sdk import WebClient
+from slack_sdk.web.async_client import AsyncWebClient
+import logging
+import os
+
+from .conversation_cache import get_conversation_cache
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Fetches every message of a thread or a channel by following Slack's pagination cursors
+instead of reading only the first page. Messages are returned oldest first, which is the order
+the AI providers expect context in. Fetching stops after `max_messages`
+(`SUMMARY_MAX_MESSAGES`, default 5000) so a runaway channel cannot exhaust memory.
+The workflow's catch-up summary for a new member reads only the latest `WORKFLOW_SUMMARY_MAX_MESSAGES`
+(default 200, one page), since members often join in bursts and only recent history matters to them.
+Conversations are served from `conversation_cache.py` when it holds them and seeded into it after every fetch.
+`context_before()` picks the recent messages that precede the one being answered.
+Used in `summary_callback`, `handle_summary_function_callback`, `app_mentioned_callback` and `app_messaged_callback`.
+"""
+
+PAGE_SIZE = 200
+RECENT_CONTEXT_MESSAGES = 10
+
+
+def _max_messages(max_messages: Optional[int]) -> int:
+    return max_messages or int(os.environ.get("SUMMARY_MAX_MESSAGES", 5000))
+
+
+def workflow_summary_max_messages() -> int:
+    return int(os.environ.get("WORKFLOW_SUMMARY_MAX_MESSAGES", PAGE_SIZE))
+
+
+def context_before(messages: List[dict], ts: str, limit: int = RECENT_CONTEXT_MESSAGES) -> List[dict]:
+    """The last `limit` messages older than `ts`, oldest first."""
+    return [message for message in messages if float(message["ts"]) < float(ts)][-limit:]
+
+
+def _seed_thread(channel: str, ts: str, messages: List[dict], limit: int):
+    # A truncated thread holds the oldest replies, not the newest, so only whole threads are cached
+    if len(messages) < limit:
+        get_conversation_cache().seed(channel, ts, messages, complete=True)
+
+
+def _seed_channel(channel: str, messages: List[dict], limit: int):
+    get_conversation_cache().seed(channel, None, messages, complete=len(messages) < limit)
+
+
+def fetch_thread_messages(client: WebClient, channel: str, ts: str, max_messages: Optional[int] = None) -> List[dict]:
+    limit = _max_messages(max_messages)
+    cached = get_conversation_cache().get(channel, ts)
+    if cached is not None:
+        return cached[:limit]
+    messages = []
+    # Iterating a SlackResponse follows `response_metadata.next_cursor` page by page
+    for page in client.conversations_replies(channel=channel, ts=ts, limit=PAGE_SIZE):
+        messages.extend(page["messages"])
+        if len(messages) >= limit:
+            logger.warning(f"Thread {channel}/{ts} has more than {limit} messages, truncating")
+            break
+    _seed_thread(channel, ts, messages, limit)
+    return messages[:limit]
+
+
+def fetch_recent_thread_messages(client: WebClient, channel: str, ts: str) -> List[dict]:
+    """Messages for reply context: the whole thread when it is cached, otherwise its first page."""
+    cached = get_conversation_cache().get(channel, ts)
+    if cached is not None:
+        return cached
+    return fetch_thread_messages(client, channel, ts, max_messages=PAGE_SIZE)
+
+
+def fetch_channel_messages(client: WebClient, channel: str, max_messages: Optional[int] = None) -> List[dict]:
+    limit = _max_messages(max_messages)
+    cached = get_conversation_cache().get(channel, None, limit)
+    if cached is not None:
+        return cached
+    messages = []
+    for page in client.conversations_history(channel=channel, limit=min(PAGE_SIZE, limit)):
+        messages.extend(page["messages"])
+        if len(messages) >= limit:
+            break
+    # conversations.history is newest first
+    messages = list(reversed(messages[:limit]))
+    _seed_channel(channel, messages, limit)
+    return messages
+
+
+async def fetch_thread_messages_async(
+    client: AsyncWebClient, channel: str, ts: str, max_messages: Optional[int] = None
+) -> List[dict]:
+    limit = _max_messages(max_messages)
+    cached = get_conversation_cache().get(channel, ts)
+    if cached is not None:
+        return cached[:limit]
+    messages = []
+    async for page in await client.conversations_replies(channel=channel, ts=ts, limit=PAGE_SIZE):
+        messages.extend(page["messages"])
+        if len(messages) >= limit:
+            logger.warning(f"Thread {channel}/{ts} has more than {limit} messages, truncating")
+            break
+    _seed_thread(channel, ts, messages, limit)
+    return messages[:limit]
+
+
+async def fetch_recent_thread_messages_async(client: AsyncWebClient, channel: str, ts: str) -> List[dict]:
+    cached = get_conversation_cache().get(channel, ts)
+    if cached is not None:
+        return cached
+    return await fetch_thread_messages_async(client, channel, ts, max_messages=PAGE_SIZE)
+
+
+async def fetch_channel_messages_async(
+    client: AsyncWebClient, channel: str, max_messages: Optional[int] = None
+) -> List[dict]:
+    limit = _max_messages(max_messages)
+    cached = get_conversation_cache().get(channel, None, limit)
+    if cached is not None:
+        return cached
+    messages = []
+    async for page in await client.conversations_history(channel=channel, limit=min(PAGE_SIZE, limit)):
+        messages.extend(page["messages"])
+        if len(messages) >= limit:
+            break
+    messages = list(reversed(messages[:limit]))
+    _seed_channel(channel, messages, limit)
+    return messages
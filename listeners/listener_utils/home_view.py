@@ -0,0 +1,139 @@
+from typing import Dict, List, Optional, Tuple
+import copy
+import hashlib
+import json
+import os
+import threading
+
+from ai.providers import PROVIDERS, get_available_providers
+
+"""
+Builds the App Home view with the model selection dropdown.
+Used in `app_home_opened_callback` and its asyncio counterpart.
+The model catalog is built once and rebuilt only when the provider configuration (credential and endpoint
+environment variables) changes. Rendered views are cached per (selected model, catalog version) and carry a
+hash of their content in `private_metadata`; Slack sends the current Home view with every `app_home_opened`
+event, so a listener can skip `views.publish` when the user already sees the same view.
+"""
+
+# Environment variables that change which models are offered
+_CATALOG_ENV = tuple(entry[2] for entry in PROVIDERS.values()) + ("GENAI_API_URL",)
+
+
+def build_model_options(models: dict) -> List[dict]:
+    # create a list of options for the dropdown menu each containing the model name and provider
+    return [
+        {
+            "text": {"type": "plain_text", "text": f"{model_info['name']} ({model_info['provider']})", "emoji": True},
+            "value": f"{model_name} {model_info['provider'].lower()}",
+        }
+        for model_name, model_info in models.items()
+    ]
+
+
+def find_model_option(options: List[dict], model: str) -> List[dict]:
+    return list(filter(lambda x: x["value"].startswith(model), options))
+
+
+def genai_default_available(options: List[dict]) -> bool:
+    return bool(os.environ.get("GENAI_API_URL")) and any(opt["value"].startswith("genai-agent") for opt in options)
+
+
+def add_placeholder_option(options: List[dict]):
+    # Show a message that GenAI will be used as fallback if available
+    if genai_default_available(options):
+        text = "Select a provider (GenAI used as fallback)"
+    else:
+        text = "Select a provider"
+    options.append({"text": {"type": "plain_text", "text": text, "emoji": True}, "value": "null"})
+
+
+def build_home_view(options: List[dict], initial_option: Optional[List[dict]], private_metadata: str = "") -> dict:
+    return {
+        "type": "home",
+        "private_metadata": private_metadata,
+        "blocks": [
+            {
+                "type": "header",
+                "text": {"type": "plain_text", "text": "Welcome to Sailor Home Page!", "emoji": True},
+            },
+            {"type": "divider"},
+            {
+                "type": "rich_text",
+                "elements": [
+                    {
+                        "type": "rich_text_section",
+                        "elements": [{"type": "text", "text": "Pick an option", "style": {"bold": True}}],
+                    }
+                ],
+            },
+            {
+                "type": "actions",
+                "elements": [
+                    {
+                        "type": "static_select",
+                        "initial_option": initial_option[0] if initial_option else options[-1],
+                        "options": options,
+                        "action_id": "pick_a_provider",
+                    }
+                ],
+            },
+        ],
+    }
+
+
+def _view_hash(view: dict) -> str:
+    return hashlib.sha256(json.dumps(view, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+
+
+def published_view_hash(event: dict) -> Optional[str]:
+    """Hash of the Home view the user currently sees, as published by this app."""
+    return (event.get("view") or {}).get("private_metadata") or None
+
+
+class ModelCatalog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._fingerprint: Optional[str] = None
+        self._options: List[dict] = []
+        self._views: Dict[Optional[str], Tuple[dict, str]] = {}
+
+    @staticmethod
+    def _config_fingerprint() -> str:
+        config = "\0".join(os.environ.get(name, "") for name in _CATALOG_ENV)
+        return hashlib.sha256(config.encode("utf-8")).hexdigest()
+
+    def _refresh(self):
+        fingerprint = self._config_fingerprint()
+        if fingerprint != self._fingerprint:
+            print("📚 Building model catalog for App Home")
+            self._options = build_model_options(get_available_providers())
+            self._views = {}
+            self._fingerprint = fingerprint
+
+    def genai_default_available(self) -> bool:
+        with self._lock:
+            self._refresh()
+            return genai_default_available(self._options)
+
+    def render(self, model: Optional[str]) -> Tuple[dict, str]:
+        """The Home view with `model` selected (or the placeholder), and its content hash."""
+        with self._lock:
+            self._refresh()
+            cached = self._views.get(model)
+            if cached is not None:
+                return cached
+            options = copy.deepcopy(self._options)
+            initial_option = find_model_option(options, model) if model else None
+            if not initial_option:
+                add_placeholder_option(options)
+            view_hash = _view_hash(build_home_view(options, initial_option))
+            self._views[model] = (build_home_view(options, initial_option, view_hash), view_hash)
+            return self._views[model]
+
+
+_model_catalog = ModelCatalog()
+
+
+def get_model_catalog() -> ModelCatalog:
+    return _model_catalog
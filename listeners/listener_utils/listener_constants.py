@@ -1,6 +1,6 @@
 # This file defines constant messages used by the Slack bot for when a user mentions the bot without text,
 # when summarizing a channel's conversation history, and a default loading message.
-# Used in `app_mentioned_callback`, `dm_sent_callback`, and `handle_summary_function_callback`.
+# Used in `app_mentioned_callback`, `dm_sent_callback`, `handle_summary_function_callback` and `StreamingMessageRenderer`.
 
 MENTION_WITHOUT_TEXT = """
 Hi there! You didn't provide a message with your mention.
@@ -17,3 +17,5 @@ Keep the summary concise and focused on the important information.
 Don't use user IDs in your response.
 """
 DEFAULT_LOADING_TEXT = "Adjusting the sails..."
+EMPTY_RESPONSE_TEXT = "Sorry, I couldn't come up with a response this time. Please try again."
+BUSY_TEXT = "I'm handling a lot of requests right now. Please try again in a moment."
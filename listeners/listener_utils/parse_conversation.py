@@ -1,24 +1,93 @@
 from typing import Optional, List
 from slack_sdk.web.slack_response import SlackResponse
 import logging
+import re
+
+from .directory_cache import DirectoryCache, get_directory_cache
 
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
 """
-Parses a conversation history, excluding messages from the bot,
-and formats it as a string with user IDs and their messages.
+Parses a conversation history into `{"user": name, "text": text}` turns for the AI providers, oldest first.
+Authors are shown by display name and `<@U…>` / `<#C…>` mentions are replaced with `@name` / `#name` from the
+directory cache, which never calls Slack per message; unknown IDs are left as they are.
+Bot posts are attributed to the bot's name; only this app's own messages are marked `"bot": True` (sent as the
+assistant's turns), while other bots and integrations count as participants. File shares list the shared files, and
+an edit (`message_changed`) is read as the edited message. Joins, topic changes and other system messages, and
+messages with nothing to say, are skipped instead of failing the whole conversation.
 Used in `app_mentioned_callback`, `dm_sent_callback`,
 and `handle_summary_function_callback`."""
 
+# Message subtypes that carry something a person or bot said
+_CONTENT_SUBTYPES = {None, "bot_message", "file_share", "thread_broadcast", "me_message"}
+_MENTION = re.compile(r"<([@#!])([^>|]+)(?:\|([^>]*))?>")
+
+
+def resolve_mentions(text: str, directory: Optional[DirectoryCache] = None) -> str:
+    """Replace Slack's `<@U…>`, `<#C…|name>` and `<!here>` markup with readable names."""
+    directory = directory or get_directory_cache()
+
+    def readable(match: re.Match) -> str:
+        sigil, target, label = match.groups()
+        if sigil == "@":
+            return f"@{directory.user_name(target) or label or target}"
+        if sigil == "#":
+            return f"#{label or directory.channel_name(target) or target}"
+        # <!here>, <!channel>, <!subteam^S…|@group>, <!date^…|fallback>
+        return label or f"@{target}"
+
+    return _MENTION.sub(readable, text)
+
+
+def _author(message: dict, directory: DirectoryCache) -> Optional[str]:
+    user = message.get("user")
+    if user:
+        profile = message.get("user_profile") or {}
+        return directory.user_name(user) or profile.get("display_name") or profile.get("real_name") or user
+    bot_profile = message.get("bot_profile") or {}
+    return bot_profile.get("name") or message.get("username") or message.get("bot_id")
+
+
+def _text(message: dict, directory: DirectoryCache) -> str:
+    parts = [resolve_mentions(message.get("text") or "", directory)]
+    # Bots often post only attachments
+    if not parts[0]:
+        parts = [
+            attachment.get("fallback") or attachment.get("text") or "" for attachment in message.get("attachments") or []
+        ]
+    files = [file.get("title") or file.get("name") or "file" for file in message.get("files") or []]
+    if files:
+        parts.append("[shared " + ", ".join(files) + "]")
+    return "\n".join(part for part in parts if part)
+
+
+def parse_message(message: dict, directory: Optional[DirectoryCache] = None) -> Optional[dict]:
+    """One conversation turn, or None for messages that add nothing to the context."""
+    directory = directory or get_directory_cache()
+    if message.get("subtype") == "message_changed":
+        message = message.get("message") or {}
+    if message.get("subtype") not in _CONTENT_SUBTYPES:
+        return None
+    author = _author(message, directory)
+    text = _text(message, directory)
+    if not author or not text:
+        return None
+    turn = {"user": author, "text": text}
+    # Alerts, workflows and other bots are not the model's earlier replies
+    if directory.is_app_message(message):
+        turn["bot"] = True
+    return turn
+
 
 def parse_conversation(conversation: SlackResponse) -> Optional[List[dict]]:
     parsed = []
+    directory = get_directory_cache()
     try:
         for message in conversation:
-            user = message["user"]
-            text = message["text"]
-            parsed.append({"user": user, "text": text})
+            turn = parse_message(message, directory)
+            if turn is not None:
+                parsed.append(turn)
         return parsed
     except Exception as e:
         logger.error(e)
@@ -0,0 +1,42 @@
+"""
+Block Kit layouts for AI responses posted by the commands.
+Used in `ask_callback` and `summary_callback`.
+"""
+
+
+def ask_response_blocks(prompt: str, response: str) -> list:
+    return [
+        {
+            "type": "rich_text",
+            "elements": [
+                {
+                    "type": "rich_text_quote",
+                    "elements": [{"type": "text", "text": prompt}],
+                },
+                {
+                    "type": "rich_text_section",
+                    "elements": [{"type": "text", "text": response}],
+                },
+            ],
+        }
+    ]
+
+
+def thread_summary_blocks(summary: str) -> list:
+    return [
+        {
+            "type": "rich_text",
+            "elements": [
+                {
+                    "type": "rich_text_section",
+                    "elements": [
+                        {"type": "text", "text": "Thread Summary:"},
+                    ],
+                },
+                {
+                    "type": "rich_text_section",
+                    "elements": [{"type": "text", "text": summary}],
+                },
+            ],
+        }
+    ]
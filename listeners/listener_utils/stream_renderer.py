@@ -0,0 +1,133 @@
+from contextlib import nullcontext
+from typing import AsyncIterable, Iterable, Optional
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+import asyncio
+import logging
+import os
+import time
+
+from .listener_constants import EMPTY_RESPONSE_TEXT
+from .web_api_scheduler import skip_when_rate_limited
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Renders a streamed AI response into an existing Slack message.
+Chunks are coalesced in memory and flushed with `chat_update` at most once per
+`SLACK_STREAM_UPDATE_INTERVAL` seconds (default 1.0), which keeps a single reply well
+inside Slack's per-channel and `chat.update` rate limits. Intermediate updates never wait
+for the rate-limit scheduler (`web_api_scheduler.py`): when `chat.update` has no token left
+the update is skipped and the stream keeps being read. If Slack answers with `ratelimited`,
+intermediate updates are paused until the `Retry-After` delay has passed; the final update
+always waits and retries so the complete answer is never lost.
+Used in `app_mentioned_callback` and `app_messaged_callback`; `AsyncStreamingMessageRenderer`
+is the asyncio counterpart used by the listeners in `async_listeners/`.
+"""
+
+STREAMING_CURSOR = " ▍"
+
+
+class StreamingMessageRenderer:
+    def __init__(self, client: WebClient, channel: str, ts: str, min_interval: Optional[float] = None):
+        self.client = client
+        self.channel = channel
+        self.ts = ts
+        self.min_interval = (
+            min_interval if min_interval is not None else float(os.environ.get("SLACK_STREAM_UPDATE_INTERVAL", 1.0))
+        )
+        self.text = ""
+        self._rendered_text = ""
+        self._last_update = 0.0
+        self._paused_until = 0.0
+
+    def append(self, chunk: str):
+        self.text += chunk
+        now = time.monotonic()
+        if now - self._last_update >= self.min_interval and now >= self._paused_until:
+            self._update(self.text + STREAMING_CURSOR, intermediate=True)
+
+    def render(self, chunks: Iterable[str]) -> str:
+        """Consume every chunk, then publish the final text. Returns the full response."""
+        for chunk in chunks:
+            self.append(chunk)
+        self.finish()
+        return self.text
+
+    def finish(self, text: Optional[str] = None):
+        if text is not None:
+            self.text = text
+        final_text = self.text or EMPTY_RESPONSE_TEXT
+        for _ in range(3):
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            if self._update(final_text):
+                return
+
+    def _update(self, text: str, intermediate: bool = False) -> bool:
+        if text == self._rendered_text:
+            return True
+        self._last_update = time.monotonic()
+        try:
+            with skip_when_rate_limited() if intermediate else nullcontext():
+                response = self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+            # A skipped or superseded update did not change the message
+            if not response.get("coalesced"):
+                self._rendered_text = text
+            return True
+        except SlackApiError as e:
+            if e.response.get("error") != "ratelimited":
+                raise e
+            retry_after = float(e.response.headers.get("Retry-After", 1))
+            logger.warning(f"chat.update rate limited, pausing updates for {retry_after}s")
+            self._paused_until = time.monotonic() + retry_after
+            return False
+
+
+class AsyncStreamingMessageRenderer(StreamingMessageRenderer):
+    def __init__(self, client: AsyncWebClient, channel: str, ts: str, min_interval: Optional[float] = None):
+        super().__init__(client, channel, ts, min_interval)
+
+    async def append(self, chunk: str):
+        self.text += chunk
+        now = time.monotonic()
+        if now - self._last_update >= self.min_interval and now >= self._paused_until:
+            await self._update(self.text + STREAMING_CURSOR, intermediate=True)
+
+    async def render(self, chunks: AsyncIterable[str]) -> str:
+        async for chunk in chunks:
+            await self.append(chunk)
+        await self.finish()
+        return self.text
+
+    async def finish(self, text: Optional[str] = None):
+        if text is not None:
+            self.text = text
+        final_text = self.text or EMPTY_RESPONSE_TEXT
+        for _ in range(3):
+            wait = self._paused_until - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            if await self._update(final_text):
+                return
+
+    async def _update(self, text: str, intermediate: bool = False) -> bool:
+        if text == self._rendered_text:
+            return True
+        self._last_update = time.monotonic()
+        try:
+            with skip_when_rate_limited() if intermediate else nullcontext():
+                response = await self.client.chat_update(channel=self.channel, ts=self.ts, text=text)
+            if not response.get("coalesced"):
+                self._rendered_text = text
+            return True
+        except SlackApiError as e:
+            if e.response.get("error") != "ratelimited":
+                raise e
+            retry_after = float(e.response.headers.get("Retry-After", 1))
+            logger.warning(f"chat.update rate limited, pausing updates for {retry_after}s")
+            self._paused_until = time.monotonic() + retry_after
+            return False
@@ -0,0 +1,23 @@
+from typing import Optional, Tuple
+import re
+
+"""
+Parses a Slack thread link into the channel ID and thread timestamp.
+Slack thread links format: https://workspace.slack.com/archives/C12345678/p1234567890123456
+Used in `summary_callback`.
+"""
+
+THREAD_LINK_PATTERN = r"archives/([A-Z0-9]+)/p(\d+)"
+
+
+def parse_thread_link(thread_link: str) -> Optional[Tuple[str, str]]:
+    match = re.search(THREAD_LINK_PATTERN, thread_link)
+    if not match:
+        return None
+
+    thread_channel_id = match.group(1)
+    # Convert the timestamp format from p1234567890123456 to 1234567890.123456
+    thread_ts = match.group(2)
+    if len(thread_ts) > 10:
+        thread_ts = f"{thread_ts[:10]}.{thread_ts[10:]}"
+    return thread_channel_id, thread_ts
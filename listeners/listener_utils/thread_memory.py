@@ -0,0 +1,93 @@
+from typing import List, Optional
+import asyncio
+import logging
+
+from ai.ai_constants import MEMORY_SUMMARY_PROMPT
+from ai.summarize import summarize_conversation, summarize_conversation_async
+from state_store.conversation_memory import get_conversation_memory, summary_input
+from workers import get_async_job_executor, get_job_executor
+from .directory_cache import get_directory_cache
+from .fetch_conversation import context_before
+from .parse_conversation import parse_conversation, parse_message
+
+logging.basicConfig(level=logging.ERROR)
+logger = logging.getLogger(__name__)
+
+"""
+Builds reply context for DM threads and mentioned threads from the thread's conversation memory
+(`state_store/conversation_memory.py`): the rolling summary of older turns plus the recent turns verbatim.
+The fetched thread only adds the turns the memory has not seen yet, so history beyond the last few messages is kept.
+After a reply, `summarize_thread_later()` queues a background job on the job executor that folds the turns that
+left the recent window into the summary; the job runs at most once per thread at a time, for up to
+`SUMMARY_LEASE_SECONDS` (120).
+Without memory (`CONVERSATION_MEMORY=off`) or when the store fails, the last messages of the thread are used as before.
+Used in `app_mentioned_callback` and `app_messaged_callback`.
+"""
+
+SUMMARY_LEASE_SECONDS = 120
+
+
+def _turns(messages: List[dict], ts: str) -> List[dict]:
+    """Parsed turns of the messages older than `ts`, with their ts."""
+    directory = get_directory_cache()
+    turns = []
+    for message in messages:
+        if float(message["ts"]) >= float(ts):
+            continue
+        turn = parse_message(message, directory)
+        if turn is not None:
+            turns.append({**turn, "ts": message["ts"]})
+    return turns
+
+
+def thread_context(channel_id: str, thread_ts: str, messages: List[dict], ts: str) -> Optional[List[dict]]:
+    """Context for answering the message `ts` of a thread, given the thread's fetched `messages`."""
+    memory = get_conversation_memory()
+    if memory.enabled:
+        try:
+            return memory.context(memory.add_turns(channel_id, thread_ts, _turns(messages, ts)))
+        except Exception as e:
+            logger.error(f"Conversation memory unavailable, using recent messages: {e}")
+    return parse_conversation(context_before(messages, ts))
+
+
+async def thread_context_async(channel_id: str, thread_ts: str, messages: List[dict], ts: str) -> Optional[List[dict]]:
+    return await asyncio.to_thread(thread_context, channel_id, thread_ts, messages, ts)
+
+
+def _summarize_thread(user_id: str, channel_id: str, thread_ts: str):
+    memory = get_conversation_memory()
+    claimed = memory.claim_summary(channel_id, thread_ts, SUMMARY_LEASE_SECONDS)
+    if claimed is None:
+        return
+    summary = None
+    try:
+        summary = summarize_conversation(user_id, MEMORY_SUMMARY_PROMPT, summary_input(claimed))
+        print(f"🧠 Summarized {len(claimed['pending'])} older messages of thread {channel_id}/{thread_ts}")
+    finally:
+        memory.apply_summary(channel_id, thread_ts, claimed, summary)
+
+
+async def _summarize_thread_async(user_id: str, channel_id: str, thread_ts: str):
+    memory = get_conversation_memory()
+    claimed = await asyncio.to_thread(memory.claim_summary, channel_id, thread_ts, SUMMARY_LEASE_SECONDS)
+    if claimed is None:
+        return
+    summary = None
+    try:
+        summary = await summarize_conversation_async(user_id, MEMORY_SUMMARY_PROMPT, summary_input(claimed))
+        print(f"🧠 Summarized {len(claimed['pending'])} older messages of thread {channel_id}/{thread_ts}")
+    finally:
+        await asyncio.to_thread(memory.apply_summary, channel_id, thread_ts, claimed, summary)
+
+
+def summarize_thread_later(user_id: str, channel_id: str, thread_ts: str):
+    """Queue the thread's rolling summary update, with the replying user's provider."""
+    if get_conversation_memory().enabled:
+        # Not counted against the user's job limit; when the queue is full the next reply tries again
+        get_job_executor().submit(None, _summarize_thread, user_id, channel_id, thread_ts)
+
+
+async def summarize_thread_later_async(user_id: str, channel_id: str, thread_ts: str):
+    if get_conversation_memory().enabled:
+        await get_async_job_executor().submit(None, _summarize_thread_async, user_id, channel_id, thread_ts)
@@ -0,0 +1,446 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, Optional, Tuple
+from slack_bolt import BoltContext
+from slack_sdk import WebClient
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.async_client import AsyncWebClient
+from slack_sdk.web.async_slack_response import AsyncSlackResponse
+from slack_sdk.web.slack_response import SlackResponse
+import asyncio
+import logging
+import os
+import threading
+import time
+
+from metrics import counter, histogram, register_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Schedules Slack Web API calls so listeners stay inside Slack's rate limits instead of failing with `ratelimited`.
+Every method has a token bucket sized from its Slack tier (`METHOD_TIERS`, per minute), and message posting
+methods also share a per-channel bucket (`SLACK_CHANNEL_MESSAGES_PER_SECOND`, default 1). A call waits for a token
+in both buckets before it is sent. User-visible calls (posting, updating, publishing views, completing functions)
+may use every token; background calls (history fetches, directory lookups) leave a quarter of each bucket to them,
+and `background_priority()` marks any block of work as background.
+A `ratelimited` answer pauses the method's bucket for `Retry-After` seconds and the call is retried up to
+`SLACK_RATELIMIT_RETRIES` times (default 3). While a `chat.update` waits, a newer update for the same message
+supersedes it and the older one returns `{"ok": true, "coalesced": true}` without calling Slack. Calls made inside
+`skip_when_rate_limited()` never wait: when a bucket is empty they return the same answer at once, which lets a
+streaming reply drop intermediate updates instead of blocking the reader of the AI stream.
+`schedule_web_api_calls` is a global middleware that swaps the request's client for a scheduled one; set
+`SLACK_SCHEDULER=off` to disable it. Queue and wait metrics are reported by `get_web_api_scheduler().stats()`, and
+call latency and rate limit hits are recorded in `metrics.py`.
+"""
+
+_slack_latency = histogram("slack_api_seconds", "Slack Web API call latency, rate limit waits excluded", ("method",))
+_slack_rate_limited = counter("slack_rate_limited", "ratelimited answers from the Slack Web API", ("method",))
+
+# Requests per minute, per workspace and app (https://api.slack.com/apis/rate-limits)
+TIER_1, TIER_2, TIER_3, TIER_4 = 1, 20, 50, 100
+METHOD_TIERS = {
+    "chat.update": TIER_3,
+    "chat.delete": TIER_3,
+    "chat.postEphemeral": TIER_4,
+    "views.publish": TIER_4,
+    "views.open": TIER_4,
+    "views.update": TIER_4,
+    "conversations.history": TIER_3,
+    "conversations.replies": TIER_3,
+    "conversations.info": TIER_3,
+    "conversations.list": TIER_2,
+    "users.list": TIER_2,
+    "users.info": TIER_4,
+    "auth.test": TIER_4,
+}
+DEFAULT_TIER = TIER_3
+# Limited per channel rather than per method
+CHANNEL_LIMITED_METHODS = {"chat.postMessage", "chat.postEphemeral"}
+USER_VISIBLE_METHODS = {
+    "chat.postMessage",
+    "chat.postEphemeral",
+    "chat.update",
+    "chat.delete",
+    "views.publish",
+    "views.open",
+    "views.update",
+    "functions.completeSuccess",
+    "functions.completeError",
+}
+MAX_CHANNEL_BUCKETS = 10000
+
+HIGH, LOW = "high", "low"
+_priority: ContextVar[Optional[str]] = ContextVar("web_api_priority", default=None)
+_skip_when_limited: ContextVar[bool] = ContextVar("web_api_skip_when_limited", default=False)
+
+
+@contextmanager
+def background_priority():
+    """Run the Web API calls made inside this block at background priority."""
+    token = _priority.set(LOW)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def skip_when_rate_limited():
+    """Skip the Web API calls made inside this block, instead of waiting, when their rate limit has no token left."""
+    token = _skip_when_limited.set(True)
+    try:
+        yield
+    finally:
+        _skip_when_limited.reset(token)
+
+
+class TokenBucket:
+    def __init__(self, per_second: float, capacity: float):
+        self.per_second = per_second
+        self.capacity = capacity
+        # Background calls leave this many tokens for user-visible ones
+        self.reserve = capacity // 4
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def wait_time(self, now: float, priority: str) -> float:
+        """Seconds until a token is available at `priority`, 0 if one is available now."""
+        if now < self.paused_until:
+            return self.paused_until - now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.per_second)
+        self.updated = now
+        needed = 1 + (self.reserve if priority == LOW else 0)
+        return 0.0 if self.tokens >= needed else (needed - self.tokens) / self.per_second
+
+    def take(self):
+        self.tokens -= 1
+
+
+class WebApiScheduler:
+    def __init__(self, *, channel_per_second: Optional[float] = None, retries: Optional[int] = None):
+        self.channel_per_second = channel_per_second or float(os.environ.get("SLACK_CHANNEL_MESSAGES_PER_SECOND", 1))
+        self.retries = retries if retries is not None else int(os.environ.get("SLACK_RATELIMIT_RETRIES", 3))
+        self._lock = threading.Lock()
+        self._method_buckets: Dict[str, TokenBucket] = {}
+        self._channel_buckets: OrderedDict = OrderedDict()
+        self._latest_update: Dict[Tuple[str, str], int] = {}
+        self._sequence = 0
+        self._waiting = {HIGH: 0, LOW: 0}
+        self._metrics: Dict[str, Dict[str, float]] = {}
+
+    def _method_bucket(self, method: str) -> TokenBucket:
+        bucket = self._method_buckets.get(method)
+        if bucket is None:
+            per_minute = METHOD_TIERS.get(method, DEFAULT_TIER)
+            bucket = TokenBucket(per_minute / 60, max(1, per_minute // 4))
+            self._method_buckets[method] = bucket
+        return bucket
+
+    def _channel_bucket(self, channel: str) -> TokenBucket:
+        bucket = self._channel_buckets.get(channel)
+        if bucket is None:
+            bucket = TokenBucket(self.channel_per_second, 3)
+            self._channel_buckets[channel] = bucket
+            while len(self._channel_buckets) > MAX_CHANNEL_BUCKETS:
+                self._channel_buckets.popitem(last=False)
+        self._channel_buckets.move_to_end(channel)
+        return bucket
+
+    def _buckets(self, method: str, channel: Optional[str]):
+        if method in CHANNEL_LIMITED_METHODS and channel:
+            # chat.postMessage has no per-method tier, only the per-channel limit
+            if method in METHOD_TIERS:
+                return [self._method_bucket(method), self._channel_bucket(channel)]
+            return [self._channel_bucket(channel)]
+        return [self._method_bucket(method)]
+
+    def _count(self, method: str, metric: str, amount: float = 1):
+        metrics = self._metrics.setdefault(
+            method, {"calls": 0, "waited": 0, "wait_seconds": 0.0, "ratelimited": 0, "coalesced": 0, "skipped": 0}
+        )
+        metrics[metric] += amount
+
+    def _try_acquire(self, method: str, channel: Optional[str], priority: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            buckets = self._buckets(method, channel)
+            wait = max(bucket.wait_time(now, priority) for bucket in buckets)
+            if wait == 0:
+                for bucket in buckets:
+                    bucket.take()
+            return wait
+
+    def _begin(self, method: str, args: dict) -> Tuple[str, Optional[Tuple[str, str]], int]:
+        priority = _priority.get() or (HIGH if method in USER_VISIBLE_METHODS else LOW)
+        update_key = (args.get("channel"), args.get("ts")) if method == "chat.update" else None
+        with self._lock:
+            self._count(method, "calls")
+            self._sequence += 1
+            sequence = self._sequence
+            if update_key:
+                self._latest_update[update_key] = sequence
+        return priority, update_key, sequence
+
+    def _superseded(self, method: str, update_key, sequence: int) -> bool:
+        if update_key is None:
+            return False
+        with self._lock:
+            if self._latest_update.get(update_key) == sequence:
+                return False
+            self._count(method, "coalesced")
+            return True
+
+    def _finish(self, update_key, sequence: int):
+        if update_key is None:
+            return
+        with self._lock:
+            if self._latest_update.get(update_key) == sequence:
+                del self._latest_update[update_key]
+
+    def _skipped(self, method: str, channel: Optional[str], priority: str) -> bool:
+        """Whether a call that must not wait is skipped, taking a token when it is not."""
+        if self._try_acquire(method, channel, priority) == 0:
+            return False
+        with self._lock:
+            self._count(method, "skipped")
+        return True
+
+    def _ratelimited(self, method: str, channel: Optional[str], error: SlackApiError) -> float:
+        headers = error.response.headers or {}
+        retry_after = float(headers.get("Retry-After") or headers.get("retry-after") or 1)
+        with self._lock:
+            self._count(method, "ratelimited")
+            for bucket in self._buckets(method, channel):
+                bucket.paused_until = max(bucket.paused_until, time.monotonic() + retry_after)
+        _slack_rate_limited.inc(method)
+        logger.warning(f"{method} rate limited, pausing it for {retry_after}s")
+        return retry_after
+
+    def _waiting_started(self, method: str, priority: str):
+        with self._lock:
+            self._waiting[priority] += 1
+            self._count(method, "waited")
+
+    def _waiting_finished(self, method: str, priority: str, waited: float):
+        with self._lock:
+            self._waiting[priority] -= 1
+            self._count(method, "wait_seconds", waited)
+
+    @staticmethod
+    def _is_ratelimited(error: SlackApiError) -> bool:
+        return error.response.status_code == 429 or error.response.get("error") == "ratelimited"
+
+    def _wait(self, method: str, channel: Optional[str], priority: str):
+        wait = self._try_acquire(method, channel, priority)
+        if wait == 0:
+            return
+        started = time.monotonic()
+        self._waiting_started(method, priority)
+        try:
+            while wait > 0:
+                time.sleep(wait)
+                wait = self._try_acquire(method, channel, priority)
+        finally:
+            self._waiting_finished(method, priority, time.monotonic() - started)
+
+    async def _wait_async(self, method: str, channel: Optional[str], priority: str):
+        wait = self._try_acquire(method, channel, priority)
+        if wait == 0:
+            return
+        started = time.monotonic()
+        self._waiting_started(method, priority)
+        try:
+            while wait > 0:
+                await asyncio.sleep(wait)
+                wait = self._try_acquire(method, channel, priority)
+        finally:
+            self._waiting_finished(method, priority, time.monotonic() - started)
+
+    def call(self, method: str, args: dict, send: Callable[[], SlackResponse]) -> Optional[SlackResponse]:
+        """Send `send()` once rate limits allow. Returns None if the call was coalesced into a newer one or skipped."""
+        channel = args.get("channel")
+        priority, update_key, sequence = self._begin(method, args)
+        skip = _skip_when_limited.get()
+        try:
+            for attempt in range(self.retries + 1):
+                if skip:
+                    if self._skipped(method, channel, priority):
+                        return None
+                else:
+                    self._wait(method, channel, priority)
+                if self._superseded(method, update_key, sequence):
+                    return None
+                sent_at = time.monotonic()
+                try:
+                    return send()
+                except SlackApiError as e:
+                    if not self._is_ratelimited(e) or attempt == self.retries:
+                        raise e
+                    self._ratelimited(method, channel, e)
+                finally:
+                    _slack_latency.observe(time.monotonic() - sent_at, method)
+        finally:
+            self._finish(update_key, sequence)
+
+    async def call_async(self, method: str, args: dict, send: Callable) -> Optional[AsyncSlackResponse]:
+        channel = args.get("channel")
+        priority, update_key, sequence = self._begin(method, args)
+        skip = _skip_when_limited.get()
+        try:
+            for attempt in range(self.retries + 1):
+                if skip:
+                    if self._skipped(method, channel, priority):
+                        return None
+                else:
+                    await self._wait_async(method, channel, priority)
+                if self._superseded(method, update_key, sequence):
+                    return None
+                sent_at = time.monotonic()
+                try:
+                    return await send()
+                except SlackApiError as e:
+                    if not self._is_ratelimited(e) or attempt == self.retries:
+                        raise e
+                    self._ratelimited(method, channel, e)
+                finally:
+                    _slack_latency.observe(time.monotonic() - sent_at, method)
+        finally:
+            self._finish(update_key, sequence)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "waiting_high": self._waiting[HIGH],
+                "waiting_low": self._waiting[LOW],
+                "methods": {method: dict(metrics) for method, metrics in self._metrics.items()},
+            }
+
+
+def _call_args(json: Optional[dict], data, params: Optional[dict]) -> dict:
+    for args in (json, data, params):
+        if isinstance(args, dict):
+            return args
+    return {}
+
+
+def _coalesced_data(args: dict) -> dict:
+    return {"ok": True, "coalesced": True, "channel": args.get("channel"), "ts": args.get("ts")}
+
+
+class ScheduledWebClient(WebClient):
+    """`WebClient` whose API calls go through the process-wide `WebApiScheduler`."""
+
+    @classmethod
+    def wrap(cls, client: WebClient) -> "ScheduledWebClient":
+        return cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            headers=client.headers,
+            team_id=client.default_params.get("team_id"),
+            logger=client.logger,
+            retry_handlers=client.retry_handlers,
+        )
+
+    def api_call(
+        self, api_method: str, *, http_verb="POST", files=None, data=None, params=None, json=None, headers=None, auth=None
+    ):
+        args = _call_args(json, data, params)
+        response = get_web_api_scheduler().call(
+            api_method,
+            args,
+            lambda: super(ScheduledWebClient, self).api_call(
+                api_method, http_verb=http_verb, files=files, data=data, params=params, json=json, headers=headers, auth=auth
+            ),
+        )
+        if response is None:
+            response = SlackResponse(
+                client=self,
+                http_verb=http_verb,
+                api_url=self.base_url + api_method,
+                req_args={},
+                data=_coalesced_data(args),
+                headers={},
+                status_code=200,
+            )
+        return response
+
+
+class AsyncScheduledWebClient(AsyncWebClient):
+    @classmethod
+    def wrap(cls, client: AsyncWebClient) -> "AsyncScheduledWebClient":
+        return cls(
+            token=client.token,
+            base_url=client.base_url,
+            timeout=client.timeout,
+            ssl=client.ssl,
+            proxy=client.proxy,
+            session=client.session,
+            headers=client.headers,
+            team_id=client.default_params.get("team_id"),
+            logger=client.logger,
+            retry_handlers=client.retry_handlers,
+        )
+
+    async def api_call(
+        self, api_method: str, *, http_verb="POST", files=None, data=None, params=None, json=None, headers=None, auth=None
+    ):
+        args = _call_args(json, data, params)
+        response = await get_web_api_scheduler().call_async(
+            api_method,
+            args,
+            lambda: super(AsyncScheduledWebClient, self).api_call(
+                api_method, http_verb=http_verb, files=files, data=data, params=params, json=json, headers=headers, auth=auth
+            ),
+        )
+        if response is None:
+            response = AsyncSlackResponse(
+                client=self,
+                http_verb=http_verb,
+                api_url=self.base_url + api_method,
+                req_args={},
+                data=_coalesced_data(args),
+                headers={},
+                status_code=200,
+            )
+        return response
+
+
+_web_api_scheduler = WebApiScheduler()
+register_stats("slack_scheduler", _web_api_scheduler.stats)
+
+
+def get_web_api_scheduler() -> WebApiScheduler:
+    return _web_api_scheduler
+
+
+def _scheduler_enabled() -> bool:
+    return os.environ.get("SLACK_SCHEDULER", "on").lower() != "off"
+
+
+def _drop_client_bound_utilities(context):
+    # Bolt builds these eagerly from the original client while preparing middleware arguments;
+    # the context rebuilds them lazily from the scheduled client on next access
+    for key in ("say", "complete", "fail"):
+        context.pop(key, None)
+
+
+def schedule_web_api_calls(context: BoltContext, next):
+    """Global middleware: listeners receive a client (and `say`/`complete`/`fail` built on it) that is rate scheduled."""
+    if _scheduler_enabled() and context.client is not None:
+        context["client"] = ScheduledWebClient.wrap(context.client)
+        _drop_client_bound_utilities(context)
+    return next()
+
+
+async def schedule_web_api_calls_async(context, next):
+    if _scheduler_enabled() and context.client is not None:
+        context["client"] = AsyncScheduledWebClient.wrap(context.client)
+        _drop_client_bound_utilities(context)
+    return await next()
@@ -0,0 +1,245 @@
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import logging
+import os
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+
+"""
+In-process metrics exported in the Prometheus text format on the health server's `/metrics`.
+Counters and histograms are sharded per thread: a thread only ever writes to its own shard, so recording a
+value takes no lock and never contends with other threads; a scrape sums all shards. Shards of finished
+threads are kept, so totals never go backwards.
+Components that already keep statistics register their `stats()` with `register_stats()`; every numeric
+value is exported as a gauge named `chatbot_<component>_<key>`, and nested per-name dictionaries become a
+`name` label. Set `METRICS=off` to record nothing.
+"""
+
+PREFIX = "chatbot_"
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2, 4, 8, 16, 32, 64)
+FAST_LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+_enabled = os.environ.get("METRICS", "on").lower() != "off"
+_registry_lock = threading.Lock()
+_metrics: Dict[str, "_Metric"] = {}
+_stats_sources: Dict[str, Callable[[], dict]] = {}
+
+
+def _sanitize(name: str) -> str:
+    return re.sub(r"[^a-zA-Z0-9_]", "_", name)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_number(value: float) -> str:
+    if isinstance(value, bool):
+        return str(int(value))
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str]):
+        self.name = PREFIX + name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards: List[dict] = []
+        self._shards_lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = {}
+            self._local.shard = shard
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _snapshots(self) -> List[List[tuple]]:
+        with self._shards_lock:
+            shards = list(self._shards)
+        # Copying a dict holds the GIL for the whole copy, so writers never see a half-read shard
+        return [list(shard.items()) for shard in shards]
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, *labelvalues: str, amount: float = 1):
+        if not _enabled:
+            return
+        shard = self._shard()
+        shard[labelvalues] = shard.get(labelvalues, 0) + amount
+
+    def render(self) -> List[str]:
+        totals: Dict[tuple, float] = {}
+        for items in self._snapshots():
+            for labelvalues, value in items:
+                totals[labelvalues] = totals.get(labelvalues, 0) + value
+        lines = super().render()
+        for labelvalues, value in sorted(totals.items()):
+            lines.append(f"{self.name}_total{_format_labels(self.labelnames, labelvalues)} {_format_number(value)}")
+        return lines
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], buckets: Sequence[float]):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value: float, *labelvalues: str):
+        if not _enabled:
+            return
+        shard = self._shard()
+        series = shard.get(labelvalues)
+        if series is None:
+            # Per-bucket counts, then sum
+            series = [0] * len(self.buckets) + [0.0]
+            shard[labelvalues] = series
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self) -> List[str]:
+        totals: Dict[tuple, list] = {}
+        for items in self._snapshots():
+            for labelvalues, series in items:
+                total = totals.setdefault(labelvalues, [0] * len(series))
+                for index, value in enumerate(list(series)):
+                    total[index] += value
+        lines = super().render()
+        for labelvalues, series in sorted(totals.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                le = f'le="{_format_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, labelvalues)
+            lines.append(f"{self.name}_sum{labels} {_format_number(series[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+def _register(metric: _Metric) -> _Metric:
+    with _registry_lock:
+        existing = _metrics.get(metric.name)
+        if existing is not None:
+            return existing
+        _metrics[metric.name] = metric
+        return metric
+
+
+def counter(name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+    """Return the counter `chatbot_<name>_total`, creating it on first use."""
+    return _register(Counter(name, documentation, labelnames))
+
+
+def histogram(
+    name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS
+) -> Histogram:
+    return _register(Histogram(name, documentation, labelnames, buckets))
+
+
+def register_stats(component: str, stats: Callable[[], dict]):
+    """Export the numeric values of `stats()` as gauges on every scrape."""
+    with _registry_lock:
+        _stats_sources[component] = stats
+
+
+def _flatten(prefix: str, stats: dict) -> List[Tuple[str, Optional[str], float]]:
+    samples = []
+    for key, value in stats.items():
+        name = f"{prefix}_{_sanitize(str(key))}"
+        if isinstance(value, (int, float)):
+            samples.append((name, None, value))
+        elif isinstance(value, dict):
+            for label, nested in value.items():
+                if isinstance(nested, (int, float)):
+                    samples.append((f"{name}_{_sanitize(str(label))}", None, nested))
+                elif isinstance(nested, dict):
+                    samples.extend(
+                        (f"{name}_{_sanitize(str(field))}", str(label), number)
+                        for field, number in nested.items()
+                        if isinstance(number, (int, float))
+                    )
+    return samples
+
+
+def _render_stats() -> List[str]:
+    with _registry_lock:
+        sources = list(_stats_sources.items())
+    gauges: Dict[str, List[Tuple[Optional[str], float]]] = {}
+    for component, stats in sources:
+        try:
+            for name, label, value in _flatten(PREFIX + _sanitize(component), stats()):
+                gauges.setdefault(name, []).append((label, value))
+        except Exception as e:
+            logger.error(f"Could not collect {component} stats: {e}")
+    lines = []
+    for name, samples in sorted(gauges.items()):
+        lines.append(f"# TYPE {name} gauge")
+        for label, value in samples:
+            labels = _format_labels(("name",), (label,)) if label is not None else ""
+            lines.append(f"{name}{labels} {_format_number(value)}")
+    return lines
+
+
+def render() -> str:
+    """The current value of every metric in the Prometheus text exposition format."""
+    with _registry_lock:
+        metrics = list(_metrics.values())
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    lines.extend(_render_stats())
+    return "\n".join(lines) + "\n"
+
+
+_LISTENER_PACKAGES = {"listeners", "async_listeners"}
+
+
+class _ListenerErrorCounter(logging.Handler):
+    def __init__(self, errors: Counter):
+        super().__init__(level=logging.ERROR)
+        self.errors = errors
+
+    def emit(self, record: logging.LogRecord):
+        parts = record.pathname.replace("\\", "/").split("/")
+        if _LISTENER_PACKAGES.intersection(parts):
+            self.errors.inc(record.module)
+        elif "slack_bolt" in parts and "listener" in parts:
+            # Exceptions a listener did not handle itself, logged by Bolt's listener runner
+            self.errors.inc("unhandled")
+
+
+_listener_errors = counter("listener_errors", "Errors logged by Slack listeners, by listener module", ("listener",))
+_listener_error_handler: Optional[_ListenerErrorCounter] = None
+
+
+def count_listener_errors():
+    """Count every error logged from the listener packages, whichever logger they use."""
+    global _listener_error_handler
+    with _registry_lock:
+        if _listener_error_handler is None:
+            _listener_error_handler = _ListenerErrorCounter(_listener_errors)
+            logging.getLogger().addHandler(_listener_error_handler)
@@ -6,3 +6,10 @@ from .get_user_state import get_user_state
 from .set_user_state import set_user_state
 from .get_redis_user_state import get_redis_user_state
 from .set_redis_user_state import set_redis_user_state
+from .async_redis_state_store import AsyncRedisStateStore
+from .get_redis_user_state_async import get_redis_user_state_async
+from .set_redis_user_state_async import set_redis_user_state_async
+from .user_state_cache import UserStateCache, get_user_state_cache
+from .redis_pool import get_redis_client, get_async_redis_client
+from .index_job_store import IndexBatch, IndexJob, IndexJobStore, get_index_job_store, new_index_job
+from .conversation_memory import ConversationMemory, ThreadMemory, get_conversation_memory
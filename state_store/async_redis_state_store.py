@@ -0,0 +1,80 @@
+from .user_state_store import UserStateStore
+from .user_identity import UserIdentity
+import logging
+import json
+import os
+import sys
+
+from .redis_pool import get_async_redis_client
+
+"""
+asyncio counterpart of `RedisStateStore`, used by `app_async.py`.
+Connections come from the shared `redis.asyncio` pool in `redis_pool.py`, and one store per Redis URL
+is shared for the whole process through `get_async_redis_state_store()`.
+"""
+
+
+class AsyncRedisStateStore(UserStateStore):
+    def __init__(
+        self,
+        *,
+        redis_url: str = None,
+        key_prefix: str = "chatbot:",
+        logger: logging.Logger = logging.getLogger(__name__),
+    ):
+        self.redis_url = redis_url or os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+        self.logger = logger
+        self.key_prefix = key_prefix
+        self.redis_client = get_async_redis_client(self.redis_url)
+
+    async def set_state(self, user_identity: UserIdentity):
+        state = user_identity["user_id"]
+        key = f"{self.key_prefix}{state}"
+
+        try:
+            result = await self.redis_client.set(key, json.dumps(user_identity))
+            if result:
+                self.logger.info(f"Successfully stored state for user {state} at key {key}")
+            else:
+                self.logger.error(f"❌ Redis: Set operation failed for key {key}")
+            return state
+        except Exception as e:
+            print(f"❌ Redis: Error storing data for user {state}: {e}", file=sys.stderr)
+            self.logger.error(f"Failed to store data for {user_identity} at key {key}: {e}")
+            raise e
+
+    async def unset_state(self, user_identity: UserIdentity):
+        state = user_identity["user_id"]
+        key = f"{self.key_prefix}{state}"
+
+        if not await self.redis_client.delete(key):
+            self.logger.warning(f"No state found for user {state} at key {key}")
+            raise FileNotFoundError(f"No state found for user {state}")
+        self.logger.info(f"Deleted state for user {state} at key {key}")
+        return state
+
+    async def get_state(self, user_id: str):
+        key = f"{self.key_prefix}{user_id}"
+
+        try:
+            data = await self.redis_client.get(key)
+            if data:
+                self.logger.info(f"Retrieved state for user {user_id} from key {key}")
+                return json.loads(data)
+            self.logger.info(f"No state found for user {user_id} at key {key}")
+            return None
+        except Exception as e:
+            print(f"❌ Redis: Error retrieving state for user {user_id}: {e}", file=sys.stderr)
+            self.logger.error(f"Error retrieving state for user {user_id} from key {key}: {e}")
+            # Callers must not mistake a failed read for a user without a selection
+            raise e
+
+
+_stores = {}
+
+
+def get_async_redis_state_store(redis_url: str) -> AsyncRedisStateStore:
+    # Only ever called from the single event loop of app_async.py, so no lock is needed
+    if redis_url not in _stores:
+        _stores[redis_url] = AsyncRedisStateStore(redis_url=redis_url)
+    return _stores[redis_url]
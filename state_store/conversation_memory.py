@@ -0,0 +1,228 @@
+from collections import OrderedDict
+from typing import Callable, List, Optional, TypedDict
+import json
+import logging
+import os
+import threading
+import time
+
+import redis
+
+from metrics import register_stats
+from .redis_pool import get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Per-thread conversation memory for replies in DM threads and mentioned threads.
+Each thread keeps its last `MEMORY_RECENT_TURNS` turns (default 10) verbatim, and a rolling summary of everything
+older. Turns pushed out of the recent window wait in `pending` until a background job folds them into the summary,
+so a reply never waits for summarization and the context sent to the provider stays bounded however long the
+thread gets. At most `MEMORY_MAX_PENDING` turns (default 500) wait; older ones are dropped unsummarized.
+Turns are `{"ts", "user", "text"}` dicts, and each is taken in once: only turns newer than the last one seen are added.
+With `REDIS_URL` set memories live in Redis, shared by every replica and updated in WATCH transactions; otherwise an
+in-process LRU of `MEMORY_MAX_THREADS` threads (default 10000) is used. Threads idle for `MEMORY_TTL_DAYS`
+(default 7) are forgotten. Set `CONVERSATION_MEMORY=off` to disable it.
+"""
+
+KEY_PREFIX = "chatbot:memory:"
+SUMMARY_SPEAKER = "Summary of earlier messages"
+
+
+class ThreadMemory(TypedDict):
+    summary: str
+    # ts of the newest turn folded into the summary
+    summarized_until: str
+    pending: List[dict]
+    recent: List[dict]
+    # ts of the newest turn seen
+    last_ts: str
+    # A summarization job holds the thread until this time
+    summarizing_until: float
+
+
+def new_thread_memory() -> ThreadMemory:
+    return ThreadMemory(summary="", summarized_until="0", pending=[], recent=[], last_ts="0", summarizing_until=0.0)
+
+
+MemoryUpdate = Callable[[ThreadMemory], Optional[ThreadMemory]]
+
+
+class _LocalBackend:
+    def __init__(self, max_threads: int, ttl: float):
+        self.max_threads = max_threads
+        self.ttl = ttl
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ThreadMemory]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < time.monotonic():
+                return None
+            return json.loads(entry[0])
+
+    def update(self, key: str, fn: MemoryUpdate) -> Optional[ThreadMemory]:
+        with self._lock:
+            entry = self._entries.get(key)
+            memory = json.loads(entry[0]) if entry is not None and entry[1] >= time.monotonic() else new_thread_memory()
+            updated = fn(memory)
+            if updated is None:
+                return memory
+            self._entries[key] = (json.dumps(updated), time.monotonic() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_threads:
+                self._entries.popitem(last=False)
+            return updated
+
+
+class _RedisBackend:
+    def __init__(self, redis_url: str, ttl: float):
+        self.redis_client = get_redis_client(redis_url)
+        self.ttl = int(ttl)
+
+    def get(self, key: str) -> Optional[ThreadMemory]:
+        data = self.redis_client.get(KEY_PREFIX + key)
+        return json.loads(data) if data else None
+
+    def update(self, key: str, fn: MemoryUpdate) -> Optional[ThreadMemory]:
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(KEY_PREFIX + key)
+                    data = pipe.get(KEY_PREFIX + key)
+                    memory = json.loads(data) if data else new_thread_memory()
+                    updated = fn(memory)
+                    if updated is None:
+                        pipe.unwatch()
+                        return memory
+                    pipe.multi()
+                    pipe.set(KEY_PREFIX + key, json.dumps(updated), ex=self.ttl)
+                    pipe.execute()
+                    return updated
+                except redis.WatchError:
+                    # Another reply or summary changed the thread; apply `fn` to the new version
+                    continue
+
+
+class ConversationMemory:
+    def __init__(
+        self,
+        *,
+        redis_url: Optional[str] = None,
+        recent_turns: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        enabled: Optional[bool] = None,
+    ):
+        self.enabled = enabled if enabled is not None else os.environ.get("CONVERSATION_MEMORY", "on").lower() != "off"
+        self.recent_turns = recent_turns or int(os.environ.get("MEMORY_RECENT_TURNS", 10))
+        self.max_pending = max_pending or int(os.environ.get("MEMORY_MAX_PENDING", 500))
+        ttl = float(os.environ.get("MEMORY_TTL_DAYS", 7)) * 86400
+        redis_url = redis_url or os.environ.get("REDIS_URL")
+        if redis_url:
+            self.backend = _RedisBackend(redis_url, ttl)
+        else:
+            self.backend = _LocalBackend(int(os.environ.get("MEMORY_MAX_THREADS", 10000)), ttl)
+        self._lock = threading.Lock()
+        self._counters = {"turns_added": 0, "turns_dropped": 0, "summaries": 0, "summary_errors": 0}
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    @staticmethod
+    def _key(channel_id: str, thread_ts: str) -> str:
+        return f"{channel_id}:{thread_ts}"
+
+    def get(self, channel_id: str, thread_ts: str) -> Optional[ThreadMemory]:
+        return self.backend.get(self._key(channel_id, thread_ts))
+
+    def add_turns(self, channel_id: str, thread_ts: str, turns: List[dict]) -> ThreadMemory:
+        """Take in the turns newer than the last one seen, oldest first; returns the thread's memory."""
+        added = {"turns": 0, "dropped": 0}
+
+        def add(memory: ThreadMemory) -> Optional[ThreadMemory]:
+            new_turns = sorted(
+                (turn for turn in turns if float(turn["ts"]) > float(memory["last_ts"])), key=lambda turn: float(turn["ts"])
+            )
+            if not new_turns:
+                return None
+            recent = memory["recent"] + new_turns
+            overflow = max(0, len(recent) - self.recent_turns)
+            pending = memory["pending"] + recent[:overflow]
+            dropped = max(0, len(pending) - self.max_pending)
+            added.update(turns=len(new_turns), dropped=dropped)
+            return ThreadMemory(
+                memory,
+                pending=pending[dropped:],
+                recent=recent[overflow:],
+                last_ts=new_turns[-1]["ts"],
+            )
+
+        memory = self.backend.update(self._key(channel_id, thread_ts), add)
+        self._count("turns_added", added["turns"])
+        if added["dropped"]:
+            self._count("turns_dropped", added["dropped"])
+            logger.warning(f"Thread {channel_id}/{thread_ts} has too many unsummarized turns, dropped {added['dropped']}")
+        return memory
+
+    @staticmethod
+    def context(memory: ThreadMemory) -> List[dict]:
+        """The thread's context for a reply: the rolling summary, then the recent turns verbatim."""
+        context = [{"user": SUMMARY_SPEAKER, "text": memory["summary"]}] if memory["summary"] else []
+        return context + [{key: value for key, value in turn.items() if key != "ts"} for turn in memory["recent"]]
+
+    def claim_summary(self, channel_id: str, thread_ts: str, lease: float) -> Optional[ThreadMemory]:
+        """Reserve the thread's pending turns for one summarization job; None when there is nothing to do."""
+        claimed = []
+
+        def claim(memory: ThreadMemory) -> Optional[ThreadMemory]:
+            if not memory["pending"] or memory["summarizing_until"] > time.time():
+                return None
+            claimed.append(ThreadMemory(memory, summarizing_until=time.time() + lease))
+            return claimed[0]
+
+        self.backend.update(self._key(channel_id, thread_ts), claim)
+        return claimed[0] if claimed else None
+
+    def apply_summary(self, channel_id: str, thread_ts: str, claimed: ThreadMemory, summary: Optional[str]):
+        """Replace the summary with one covering `claimed`'s pending turns, or just release the claim on failure."""
+
+        def apply(memory: ThreadMemory) -> Optional[ThreadMemory]:
+            if summary is None or memory["summarized_until"] != claimed["summarized_until"]:
+                return ThreadMemory(memory, summarizing_until=0.0)
+            until = claimed["pending"][-1]["ts"]
+            return ThreadMemory(
+                memory,
+                summary=summary,
+                summarized_until=until,
+                pending=[turn for turn in memory["pending"] if float(turn["ts"]) > float(until)],
+                summarizing_until=0.0,
+            )
+
+        self.backend.update(self._key(channel_id, thread_ts), apply)
+        self._count("summaries" if summary is not None else "summary_errors")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"enabled": self.enabled, **self._counters}
+
+
+_conversation_memory: Optional[ConversationMemory] = None
+_memory_lock = threading.Lock()
+
+
+def get_conversation_memory() -> ConversationMemory:
+    global _conversation_memory
+    if _conversation_memory is None:
+        with _memory_lock:
+            if _conversation_memory is None:
+                _conversation_memory = ConversationMemory()
+                register_stats("conversation_memory", _conversation_memory.stats)
+    return _conversation_memory
+
+
+def summary_input(memory: ThreadMemory) -> List[dict]:
+    """The conversation a summarization job summarizes: the previous summary, then the pending turns."""
+    return ConversationMemory.context(ThreadMemory(memory, recent=memory["pending"]))
@@ -1,9 +1,10 @@
 import logging
 import sys
 import os
-from .redis_state_store import RedisStateStore
+from .redis_state_store import get_redis_state_store
 from .user_identity import UserIdentity
 from .set_redis_user_state import set_redis_user_state
+from .user_state_cache import get_user_state_cache
 
 # Set higher logging level for debugging Redis issues
 logging.basicConfig(level=logging.INFO)
@@ -12,7 +13,7 @@ logger = logging.getLogger(__name__)
 
 def get_redis_user_state(user_id: str, is_app_home: bool, redis_url: str = None):
     """
-    Get user state from Redis
+    Get user state, answering from the in-process cache when possible and reading Redis on a miss
     
     Args:
         user_id: The user ID
@@ -22,17 +23,22 @@ def get_redis_user_state(user_id: str, is_app_home: bool, redis_url: str = None)
     Returns:
         Tuple of (provider_name, model_name) or (None, None) if not found
     """
-    print(f"🔍 Fetching Redis state for user: {user_id}")
-    
     # Check if Redis URL is provided or available in environment variables
     if not redis_url:
         redis_url = os.environ.get("REDIS_URL")
         if not redis_url:
             print(f"ℹ️ REDIS_URL not found in environment, Redis storage disabled")
             return None, None
-    
+
+    cache = get_user_state_cache(redis_url)
+    cached = cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = cache.generation()
+
+    print(f"🔍 Fetching Redis state for user: {user_id}")
     try:
-        redis_store = RedisStateStore(redis_url=redis_url)
+        redis_store = get_redis_state_store(redis_url)
         user_data = redis_store.get_state(user_id)
         
         if not user_data:
@@ -55,6 +61,7 @@ def get_redis_user_state(user_id: str, is_app_home: bool, redis_url: str = None)
                 print(f"ℹ️ No provider selection found for user: {user_id}, using GenAI fallback")
                 # Return None, None and let the caller handle the fallback
             print(f"ℹ️ No state found in Redis for user: {user_id}")
+            cache.set(user_id, (None, None), generation)
             return None, None
         
         user_identity: UserIdentity = user_data
@@ -62,6 +69,7 @@ def get_redis_user_state(user_id: str, is_app_home: bool, redis_url: str = None)
         model = user_identity.get("model")
         
         print(f"✅ Found Redis state for user {user_id}: provider={provider}, model={model}")
+        cache.set(user_id, (provider, model), generation)
         return provider, model
         
     except Exception as e:
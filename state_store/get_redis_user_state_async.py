@@ -0,0 +1,64 @@
+import logging
+import sys
+import os
+from .async_redis_state_store import get_async_redis_state_store
+from .user_identity import UserIdentity
+from .user_state_cache import get_user_state_cache
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def get_redis_user_state_async(user_id: str, is_app_home: bool, redis_url: str = None):
+    """
+    asyncio version of `get_redis_user_state`
+
+    Args:
+        user_id: The user ID
+        is_app_home: Whether the request is from app home
+        redis_url: Optional Redis URL. If not provided, uses REDIS_URL env variable
+
+    Returns:
+        Tuple of (provider_name, model_name) or (None, None) if not found
+    """
+    if not redis_url:
+        redis_url = os.environ.get("REDIS_URL")
+        if not redis_url:
+            return None, None
+
+    cache = get_user_state_cache(redis_url)
+    cached = cache.get(user_id)
+    if cached is not None:
+        return cached
+    generation = cache.generation()
+
+    try:
+        redis_store = get_async_redis_state_store(redis_url)
+        user_data = await redis_store.get_state(user_id)
+
+        if not user_data:
+            # Check if GENAI_API_URL is set and use genai-agent as default
+            if os.environ.get("GENAI_API_URL"):
+                try:
+                    await redis_store.set_state(UserIdentity(user_id=user_id, provider="genai", model="genai-agent"))
+                    cache.set(user_id, ("genai", "genai-agent"), generation)
+                    print(f"✅ Saved default GenAI selection to Redis for user: {user_id}")
+                    return "genai", "genai-agent"
+                except Exception as e:
+                    error_msg = f"❌ Error saving default GenAI selection: {e}"
+                    print(error_msg, file=sys.stderr)
+                    logger.error(error_msg)
+
+            print(f"ℹ️ No state found in Redis for user: {user_id}")
+            cache.set(user_id, (None, None), generation)
+            return None, None
+
+        user_identity: UserIdentity = user_data
+        cache.set(user_id, (user_identity.get("provider"), user_identity.get("model")), generation)
+        return user_identity.get("provider"), user_identity.get("model")
+
+    except Exception as e:
+        error_msg = f"❌ Error getting Redis state for user {user_id}: {e}"
+        print(error_msg, file=sys.stderr)
+        logger.error(error_msg)
+        return None, None
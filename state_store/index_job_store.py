@@ -0,0 +1,273 @@
+from pathlib import Path
+from typing import List, Optional, TypedDict
+import json
+import logging
+import os
+import threading
+import time
+
+from .redis_pool import get_redis_client
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Store for DigitalOcean knowledge base indexing jobs started from Slack.
+Each job records who started it and where, so its completion can be announced, along with the last status
+seen by the poller in `knowledge_base/index_job_poller.py` and when to poll it next. `/debbie-progress` answers
+from this store and never calls the DigitalOcean API itself.
+Jobs submitted together by `knowledge_base/batch_indexing.py` share an `IndexBatch`, which remembers the Slack
+message that reports their combined progress.
+With `REDIS_URL` set jobs live in Redis and are shared by every replica and process; otherwise they are kept as
+JSON files under `./data/index_jobs`. Finished jobs are kept for `INDEX_JOB_RETENTION_DAYS` (default 7).
+"""
+
+KEY_PREFIX = "chatbot:index_job:"
+ACTIVE_KEY = "chatbot:index_jobs:active"
+CHANNEL_KEY_PREFIX = "chatbot:index_jobs:channel:"
+BATCH_KEY_PREFIX = "chatbot:index_batch:"
+POLLER_LEASE_KEY = "chatbot:index_jobs:poller"
+
+
+class IndexJob(TypedDict):
+    job_id: str
+    knowledge_base_id: str
+    data_source_ids: List[str]
+    user_id: str
+    channel_id: str
+    # Last status and phase reported by the DigitalOcean API, and the whole job object
+    status: str
+    phase: str
+    detail: dict
+    created_at: float
+    updated_at: float
+    finished_at: Optional[float]
+    next_poll_at: float
+    poll_interval: float
+    polls: int
+    errors: int
+    batch_id: Optional[str]
+
+
+class IndexBatch(TypedDict):
+    batch_id: str
+    knowledge_base_id: str
+    data_source_ids: List[str]
+    user_id: str
+    channel_id: str
+    # The progress message, which may have been posted to the user's DM instead of the channel
+    message_channel: Optional[str]
+    message_ts: Optional[str]
+    job_ids: List[str]
+    # Data sources whose job could not be started, with the error
+    failed: List[dict]
+    created_at: float
+
+
+def new_index_job(
+    job_id: str,
+    knowledge_base_id: str,
+    data_source_ids: List[str],
+    user_id: str,
+    channel_id: str,
+    batch_id: Optional[str] = None,
+) -> IndexJob:
+    now = time.time()
+    return IndexJob(
+        job_id=job_id,
+        knowledge_base_id=knowledge_base_id,
+        data_source_ids=list(data_source_ids),
+        user_id=user_id,
+        channel_id=channel_id,
+        status="INDEX_JOB_STATUS_PENDING",
+        phase="BATCH_JOB_PHASE_PENDING",
+        detail={},
+        created_at=now,
+        updated_at=now,
+        finished_at=None,
+        next_poll_at=now,
+        poll_interval=0.0,
+        polls=0,
+        errors=0,
+        batch_id=batch_id,
+    )
+
+
+class _FileBackend:
+    def __init__(self, base_dir: str, retention: float):
+        self.base_dir = Path(base_dir)
+        self.retention = retention
+        self._lock = threading.Lock()
+
+    def _path(self, name: str) -> Path:
+        return self.base_dir / f"{name}.json"
+
+    def _read(self, path: Path) -> Optional[dict]:
+        try:
+            return json.loads(path.read_text())
+        except FileNotFoundError:
+            return None
+
+    def _write(self, path: Path, data: dict):
+        self.base_dir.mkdir(parents=True, exist_ok=True)
+        # Write then rename, so a reader never sees a half-written job
+        tmp = path.with_suffix(".tmp")
+        tmp.write_text(json.dumps(data))
+        os.replace(tmp, path)
+
+    def add(self, job: IndexJob):
+        with self._lock:
+            self._write(self._path(job["job_id"]), job)
+            self._write(self._path(f"channel_{job['channel_id']}"), {"job_id": job["job_id"]})
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self._read(self._path(job_id))
+
+    def add_batch(self, batch: IndexBatch):
+        self._write(self._path(f"batch_{batch['batch_id']}"), batch)
+
+    def get_batch(self, batch_id: str) -> Optional[IndexBatch]:
+        return self._read(self._path(f"batch_{batch_id}"))
+
+    def last_job_id(self, channel_id: str) -> Optional[str]:
+        pointer = self._read(self._path(f"channel_{channel_id}"))
+        return pointer["job_id"] if pointer else None
+
+    def update(self, job: IndexJob) -> bool:
+        with self._lock:
+            stored = self.get(job["job_id"])
+            first_finish = stored is not None and stored["finished_at"] is None and job["finished_at"] is not None
+            self._write(self._path(job["job_id"]), job)
+            return first_finish
+
+    def active(self) -> List[IndexJob]:
+        jobs = []
+        for path in self.base_dir.glob("*.json"):
+            if path.name.startswith("channel_"):
+                continue
+            job = self._read(path)
+            if job is None:
+                continue
+            if path.name.startswith("batch_"):
+                if job["created_at"] < time.time() - self.retention:
+                    path.unlink(missing_ok=True)
+                continue
+            if job["finished_at"] is None:
+                jobs.append(job)
+            elif job["finished_at"] < time.time() - self.retention:
+                path.unlink(missing_ok=True)
+        return jobs
+
+    def claim_poller(self, owner: str, ttl: float) -> bool:
+        # Files are local to this process's machine, so there is no one to share polling with
+        return True
+
+
+class _RedisBackend:
+    def __init__(self, redis_url: str, retention: float):
+        self.redis_client = get_redis_client(redis_url)
+        self.retention = int(retention)
+
+    def add(self, job: IndexJob):
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(KEY_PREFIX + job["job_id"], json.dumps(job))
+        pipe.sadd(ACTIVE_KEY, job["job_id"])
+        pipe.set(CHANNEL_KEY_PREFIX + job["channel_id"], job["job_id"], ex=self.retention)
+        pipe.execute()
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        data = self.redis_client.get(KEY_PREFIX + job_id)
+        return json.loads(data) if data else None
+
+    def add_batch(self, batch: IndexBatch):
+        self.redis_client.set(BATCH_KEY_PREFIX + batch["batch_id"], json.dumps(batch), ex=self.retention)
+
+    def get_batch(self, batch_id: str) -> Optional[IndexBatch]:
+        data = self.redis_client.get(BATCH_KEY_PREFIX + batch_id)
+        return json.loads(data) if data else None
+
+    def last_job_id(self, channel_id: str) -> Optional[str]:
+        return self.redis_client.get(CHANNEL_KEY_PREFIX + channel_id)
+
+    def update(self, job: IndexJob) -> bool:
+        if job["finished_at"] is None:
+            self.redis_client.set(KEY_PREFIX + job["job_id"], json.dumps(job))
+            return False
+        pipe = self.redis_client.pipeline(transaction=True)
+        pipe.set(KEY_PREFIX + job["job_id"], json.dumps(job), ex=self.retention)
+        pipe.srem(ACTIVE_KEY, job["job_id"])
+        # Only the process that removes the job from the active set reports it finished
+        return bool(pipe.execute()[1])
+
+    def active(self) -> List[IndexJob]:
+        job_ids = sorted(self.redis_client.smembers(ACTIVE_KEY))
+        if not job_ids:
+            return []
+        jobs = []
+        for job_id, data in zip(job_ids, self.redis_client.mget([KEY_PREFIX + job_id for job_id in job_ids])):
+            if data:
+                jobs.append(json.loads(data))
+            else:
+                self.redis_client.srem(ACTIVE_KEY, job_id)
+        return jobs
+
+    def claim_poller(self, owner: str, ttl: float) -> bool:
+        ttl_ms = int(ttl * 1000)
+        if self.redis_client.set(POLLER_LEASE_KEY, owner, nx=True, px=ttl_ms):
+            return True
+        if self.redis_client.get(POLLER_LEASE_KEY) == owner:
+            self.redis_client.pexpire(POLLER_LEASE_KEY, ttl_ms)
+            return True
+        return False
+
+
+class IndexJobStore:
+    def __init__(self, *, redis_url: Optional[str] = None, base_dir: str = "./data/index_jobs"):
+        redis_url = redis_url or os.environ.get("REDIS_URL")
+        retention = float(os.environ.get("INDEX_JOB_RETENTION_DAYS", 7)) * 86400
+        self.backend = _RedisBackend(redis_url, retention) if redis_url else _FileBackend(base_dir, retention)
+
+    def add(self, job: IndexJob):
+        """Record a newly started job as active and as the channel's most recent one."""
+        self.backend.add(job)
+
+    def get(self, job_id: str) -> Optional[IndexJob]:
+        return self.backend.get(job_id)
+
+    def last_for_channel(self, channel_id: str) -> Optional[IndexJob]:
+        job_id = self.backend.last_job_id(channel_id)
+        return self.backend.get(job_id) if job_id else None
+
+    def add_batch(self, batch: IndexBatch):
+        """Record a batch; add it before its jobs, so the poller always finds the batch of a job it polls."""
+        self.backend.add_batch(batch)
+
+    def get_batch(self, batch_id: str) -> Optional[IndexBatch]:
+        return self.backend.get_batch(batch_id)
+
+    def batch_jobs(self, batch: IndexBatch) -> List[IndexJob]:
+        return [job for job in (self.backend.get(job_id) for job_id in batch["job_ids"]) if job is not None]
+
+    def update(self, job: IndexJob) -> bool:
+        """Save the job; returns True only for the first update that marks it finished."""
+        return self.backend.update(job)
+
+    def active(self) -> List[IndexJob]:
+        return self.backend.active()
+
+    def claim_poller(self, owner: str, ttl: float) -> bool:
+        """Take or renew the lease that makes `owner` the only poller of active jobs, for `ttl` seconds."""
+        return self.backend.claim_poller(owner, ttl)
+
+
+_index_job_store: Optional[IndexJobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_index_job_store() -> IndexJobStore:
+    global _index_job_store
+    if _index_job_store is None:
+        with _store_lock:
+            if _index_job_store is None:
+                _index_job_store = IndexJobStore()
+    return _index_job_store
@@ -0,0 +1,142 @@
+from typing import Dict, Optional, Tuple
+import logging
+import os
+import threading
+import time
+
+import redis
+import redis.asyncio
+
+from metrics import FAST_LATENCY_BUCKETS, histogram
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Process-level Redis connection pools.
+Every state store, cache and helper shares one `ConnectionPool` per Redis URL instead of
+opening (and pinging) a new connection per call. Idle connections are health checked lazily
+by redis-py before reuse (`health_check_interval`) and timed-out commands are retried once.
+Configured with `REDIS_MAX_CONNECTIONS` (default 20), `REDIS_SOCKET_TIMEOUT` and
+`REDIS_CONNECT_TIMEOUT` seconds (default 5) and `REDIS_HEALTH_CHECK_INTERVAL` seconds (default 30).
+Pooled connections record the round-trip time of every command (a pipeline counts as one round trip) in the
+`chatbot_redis_command_seconds` histogram; blocking reads are not recorded.
+"""
+
+_redis_latency = histogram(
+    "redis_command_seconds", "Redis round-trip latency by command", ("command",), buckets=FAST_LATENCY_BUCKETS
+)
+_BLOCKING_COMMANDS = {"BLPOP", "BRPOP", "BLMOVE", "BZPOPMIN", "BZPOPMAX", "SUBSCRIBE", "PSUBSCRIBE", "MONITOR"}
+
+_pools: Dict[tuple, object] = {}
+_pools_lock = threading.Lock()
+
+
+def _command_label(args: tuple) -> Optional[str]:
+    words = [arg.decode(errors="replace") if isinstance(arg, bytes) else str(arg) for arg in args[:8]]
+    command = words[0].upper() if words else ""
+    if command in _BLOCKING_COMMANDS or "BLOCK" in (word.upper() for word in words[1:]):
+        return None
+    return command
+
+
+class _TimedConnection:
+    """Mixin for redis-py connection classes timing each request until its first reply is read."""
+
+    _next_label: Optional[str] = "pipeline"
+    _in_flight: Optional[Tuple[str, float]] = None
+
+    def send_command(self, *args, **kwargs):
+        self._next_label = _command_label(args)
+        super().send_command(*args, **kwargs)
+
+    def send_packed_command(self, command, check_health=True):
+        label, self._next_label = self._next_label, "pipeline"
+        started_at = time.monotonic()
+        super().send_packed_command(command, check_health)
+        self._in_flight = (label, started_at) if label else None
+
+    def read_response(self, *args, **kwargs):
+        try:
+            return super().read_response(*args, **kwargs)
+        finally:
+            if self._in_flight is not None:
+                label, started_at = self._in_flight
+                self._in_flight = None
+                _redis_latency.observe(time.monotonic() - started_at, label)
+
+
+class _AsyncTimedConnection:
+    _next_label: Optional[str] = "pipeline"
+    _in_flight: Optional[Tuple[str, float]] = None
+
+    async def send_command(self, *args, **kwargs):
+        self._next_label = _command_label(args)
+        await super().send_command(*args, **kwargs)
+
+    async def send_packed_command(self, command, check_health=True):
+        label, self._next_label = self._next_label, "pipeline"
+        started_at = time.monotonic()
+        await super().send_packed_command(command, check_health)
+        self._in_flight = (label, started_at) if label else None
+
+    async def read_response(self, *args, **kwargs):
+        try:
+            return await super().read_response(*args, **kwargs)
+        finally:
+            if self._in_flight is not None:
+                label, started_at = self._in_flight
+                self._in_flight = None
+                _redis_latency.observe(time.monotonic() - started_at, label)
+
+
+def _timed(pool, mixin):
+    """Swap the pool's connection class (plain, TLS or unix socket, as chosen from the URL) for a timed one."""
+    pool.connection_class = type(f"Timed{pool.connection_class.__name__}", (mixin, pool.connection_class), {})
+    return pool
+
+
+def _pool_options() -> dict:
+    return {
+        "decode_responses": True,
+        "max_connections": int(os.environ.get("REDIS_MAX_CONNECTIONS", 20)),
+        "socket_timeout": float(os.environ.get("REDIS_SOCKET_TIMEOUT", 5)),
+        "socket_connect_timeout": float(os.environ.get("REDIS_CONNECT_TIMEOUT", 5)),
+        "health_check_interval": int(os.environ.get("REDIS_HEALTH_CHECK_INTERVAL", 30)),
+        "retry_on_timeout": True,
+    }
+
+
+def redact_redis_url(redis_url: str) -> str:
+    return redis_url[: redis_url.index("@")] if "@" in redis_url else redis_url
+
+
+def get_redis_connection_pool(redis_url: str) -> redis.ConnectionPool:
+    key = ("sync", redis_url)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                print(f"🔌 Creating Redis connection pool for {redact_redis_url(redis_url)}")
+                pool = _timed(redis.ConnectionPool.from_url(redis_url, **_pool_options()), _TimedConnection)
+                _pools[key] = pool
+    return pool
+
+
+def get_redis_client(redis_url: str) -> redis.Redis:
+    """Return a client backed by the shared pool for `redis_url`. Clients are cheap; connections are pooled."""
+    return redis.Redis(connection_pool=get_redis_connection_pool(redis_url))
+
+
+def get_async_redis_client(redis_url: str) -> redis.asyncio.Redis:
+    """asyncio counterpart of `get_redis_client`, for use from the event loop of `app_async.py`."""
+    key = ("async", redis_url)
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _timed(redis.asyncio.ConnectionPool.from_url(redis_url, **_pool_options()), _AsyncTimedConnection)
+                _pools[key] = pool
+    return redis.asyncio.Redis(connection_pool=pool)
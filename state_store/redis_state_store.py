@@ -2,9 +2,10 @@ from .user_state_store import UserStateStore
 from .user_identity import UserIdentity
 import logging
 import json
-import redis
 import os
 import sys
+import threading
+from .redis_pool import get_redis_client, redact_redis_url
 
 
 class RedisStateStore(UserStateStore):
@@ -19,23 +20,16 @@ class RedisStateStore(UserStateStore):
         self.redis_url = redis_url or os.environ.get("REDIS_URL", "redis://localhost:6379/0")
         self.logger = logger
         self.key_prefix = key_prefix
-        
+        # Connections come from the shared pool and are health checked lazily before reuse,
+        # so constructing a store does not open a connection or send a PING
+        self.redis_client = get_redis_client(self.redis_url)
+
+    def ping(self) -> bool:
         try:
-            print(f"🔌 Connecting to Redis at {self.redis_url[:self.redis_url.index('@') if '@' in self.redis_url else len(self.redis_url)]}")
-            # Set decode_responses=True to automatically decode bytes to strings
-            self.redis_client = redis.Redis.from_url(self.redis_url, decode_responses=True)
-            # Verify connection by pinging Redis
-            if not self.redis_client.ping():
-                error_msg = f"❌ Failed to connect to Redis at {self.redis_url[:self.redis_url.index('@') if '@' in self.redis_url else len(self.redis_url)]}"
-                print(error_msg, file=sys.stderr)
-                self.logger.error(error_msg)
-            else:
-                print(f"✅ Successfully connected to Redis")
+            return bool(self.redis_client.ping())
         except Exception as e:
-            error_msg = f"❌ Error connecting to Redis: {e}"
-            print(error_msg, file=sys.stderr)
-            self.logger.error(f"Error connecting to Redis at {self.redis_url}: {e}")
-            raise ConnectionError(f"Failed to connect to Redis: {e}")
+            self.logger.error(f"Redis ping failed for {redact_redis_url(self.redis_url)}: {e}")
+            return False
 
     def set_state(self, user_identity: UserIdentity):
         state = user_identity["user_id"]
@@ -96,4 +90,21 @@ class RedisStateStore(UserStateStore):
             error_msg = f"❌ Redis: Error retrieving state for user {user_id}: {e}"
             print(error_msg, file=sys.stderr)
             self.logger.error(f"Error retrieving state for user {user_id} from key {key}: {e}")
-            return None 
\ No newline at end of file
+            # Callers must not mistake a failed read for a user without a selection
+            raise e
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_redis_state_store(redis_url: str) -> RedisStateStore:
+    """Return the process-wide store for `redis_url`."""
+    store = _stores.get(redis_url)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(redis_url)
+            if store is None:
+                store = RedisStateStore(redis_url=redis_url)
+                _stores[redis_url] = store
+    return store
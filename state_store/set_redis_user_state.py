@@ -1,8 +1,9 @@
 import logging
 import sys
 import os
-from .redis_state_store import RedisStateStore
+from .redis_state_store import get_redis_state_store
 from .user_identity import UserIdentity
+from .user_state_cache import get_user_state_cache, publish_user_state_invalidation
 
 # Set higher logging level for debugging Redis issues
 logging.basicConfig(level=logging.INFO)
@@ -11,7 +12,7 @@ logger = logging.getLogger(__name__)
 
 def set_redis_user_state(user_id: str, provider_name: str, model_name: str, redis_url: str = None):
     """
-    Set user state in Redis
+    Set user state in Redis, then update the local cache and tell other replicas to drop theirs
     
     Args:
         user_id: The user ID
@@ -30,8 +31,10 @@ def set_redis_user_state(user_id: str, provider_name: str, model_name: str, redi
     
     try:
         user = UserIdentity(user_id=user_id, provider=provider_name, model=model_name)
-        redis_store = RedisStateStore(redis_url=redis_url)
+        redis_store = get_redis_state_store(redis_url)
         redis_store.set_state(user)
+        get_user_state_cache(redis_url).update(user_id, (provider_name, model_name))
+        publish_user_state_invalidation(redis_store.redis_client, user_id)
         print(f"✅ Successfully saved Redis state for user {user_id}")
     except Exception as e:
         error_msg = f"❌ Error storing state in Redis for user {user_id}: {e}"
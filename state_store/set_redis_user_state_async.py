@@ -0,0 +1,38 @@
+import logging
+import sys
+import os
+from .async_redis_state_store import get_async_redis_state_store
+from .user_identity import UserIdentity
+from .user_state_cache import INVALIDATION_CHANNEL, get_user_state_cache, invalidation_message
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def set_redis_user_state_async(user_id: str, provider_name: str, model_name: str, redis_url: str = None):
+    """
+    asyncio version of `set_redis_user_state`
+
+    Args:
+        user_id: The user ID
+        provider_name: The provider name
+        model_name: The model name
+        redis_url: Optional Redis URL. If not provided, uses REDIS_URL env variable
+    """
+    if not redis_url:
+        redis_url = os.environ.get("REDIS_URL")
+        if not redis_url:
+            print("ℹ️ REDIS_URL not found in environment, Redis storage disabled")
+            return
+
+    try:
+        user = UserIdentity(user_id=user_id, provider=provider_name, model=model_name)
+        redis_store = get_async_redis_state_store(redis_url)
+        await redis_store.set_state(user)
+        get_user_state_cache(redis_url).update(user_id, (provider_name, model_name))
+        await redis_store.redis_client.publish(INVALIDATION_CHANNEL, invalidation_message(user_id))
+        print(f"✅ Successfully saved Redis state for user {user_id}")
+    except Exception as e:
+        error_msg = f"❌ Error storing state in Redis for user {user_id}: {e}"
+        print(error_msg, file=sys.stderr)
+        logger.error(error_msg)
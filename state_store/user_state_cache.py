@@ -0,0 +1,159 @@
+from collections import OrderedDict
+from typing import Optional, Tuple
+import logging
+import os
+import threading
+import time
+import uuid
+
+import redis
+
+from metrics import register_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Read-through in-memory cache for user model selections.
+Selections change rarely but are read on every message, so `get_redis_user_state` answers from
+this LRU/TTL cache and only goes to Redis on a miss. To keep replicas coherent,
+`set_redis_user_state` publishes the user ID on `INVALIDATION_CHANNEL` after every write and each
+process runs one subscriber thread that evicts the user locally. Messages carry the publishing process's
+`PROCESS_ID`, so the writer keeps the value it just cached. If the subscription drops, the
+whole cache is cleared on reconnect because invalidations may have been missed; the TTL bounds
+staleness in any remaining edge case.
+Configured with `USER_STATE_CACHE_SIZE` (default 10000) and `USER_STATE_CACHE_TTL` seconds (default 300).
+"""
+
+INVALIDATION_CHANNEL = "chatbot:user_state:invalidate"
+PROCESS_ID = uuid.uuid4().hex
+
+
+def invalidation_message(user_id: str) -> str:
+    return f"{PROCESS_ID}:{user_id}"
+
+
+def parse_invalidation_message(data: str) -> Tuple[Optional[str], str]:
+    """Return (publishing process ID, user ID); the process is None for messages without one."""
+    origin, separator, user_id = data.partition(":")
+    return (origin, user_id) if separator else (None, data)
+
+
+class UserStateCache:
+    def __init__(self, *, max_size: Optional[int] = None, ttl: Optional[float] = None):
+        self.max_size = max_size or int(os.environ.get("USER_STATE_CACHE_SIZE", 10000))
+        self.ttl = ttl or float(os.environ.get("USER_STATE_CACHE_TTL", 300))
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        # Bumped by every invalidation so a slow read-through cannot cache a value that was replaced meanwhile
+        self._generation = 0
+        self._subscriber: Optional[threading.Thread] = None
+
+    def get(self, user_id: str) -> Optional[Tuple[Optional[str], Optional[str]]]:
+        """Return the cached (provider, model) tuple, or None if the user is not cached."""
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if entry is None or entry[1] < time.monotonic():
+                if entry is not None:
+                    del self._entries[user_id]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(user_id)
+            self.hits += 1
+            return entry[0]
+
+    def generation(self) -> int:
+        return self._generation
+
+    def set(self, user_id: str, value: Tuple[Optional[str], Optional[str]], generation: Optional[int] = None):
+        """Cache `value`; if `generation` is given, skip it when an invalidation happened since it was read."""
+        with self._lock:
+            if generation is not None and generation != self._generation:
+                return
+            self._entries[user_id] = (value, time.monotonic() + self.ttl)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def update(self, user_id: str, value: Tuple[Optional[str], Optional[str]]):
+        """Cache a value this process just wrote; read-throughs that started before the write cannot replace it."""
+        with self._lock:
+            self._generation += 1
+        self.set(user_id, value)
+
+    def invalidate(self, user_id: str):
+        with self._lock:
+            self._generation += 1
+            if self._entries.pop(user_id, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "invalidations": self.invalidations,
+            }
+
+    def ensure_subscribed(self, redis_url: str):
+        """Start the invalidation subscriber thread for this process if it is not running yet."""
+        if self._subscriber is not None:
+            return
+        with self._lock:
+            if self._subscriber is None:
+                self._subscriber = threading.Thread(
+                    target=self._listen_for_invalidations, args=(redis_url,), name="user-state-invalidation", daemon=True
+                )
+                self._subscriber.start()
+
+    def _on_invalidation(self, data: str):
+        origin, user_id = parse_invalidation_message(data)
+        # This process already cached the value it wrote
+        if origin != PROCESS_ID:
+            self.invalidate(user_id)
+
+    def _listen_for_invalidations(self, redis_url: str):
+        backoff = 1
+        while True:
+            try:
+                # Dedicated connection without a socket timeout: a subscriber legitimately idles for long periods
+                client = redis.Redis.from_url(redis_url, decode_responses=True, health_check_interval=30)
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                # Anything cached before (re)subscribing may have missed an invalidation
+                self.clear()
+                backoff = 1
+                for message in pubsub.listen():
+                    if message.get("type") == "message":
+                        self._on_invalidation(message["data"])
+            except Exception as e:
+                logger.error(f"User state invalidation subscriber disconnected: {e}, retrying in {backoff}s")
+                self.clear()
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 30)
+
+
+_user_state_cache = UserStateCache()
+register_stats("user_state_cache", _user_state_cache.stats)
+
+
+def get_user_state_cache(redis_url: Optional[str] = None) -> UserStateCache:
+    if redis_url:
+        _user_state_cache.ensure_subscribed(redis_url)
+    return _user_state_cache
+
+
+def publish_user_state_invalidation(redis_client: redis.Redis, user_id: str):
+    try:
+        redis_client.publish(INVALIDATION_CHANNEL, invalidation_message(user_id))
+    except Exception as e:
+        logger.error(f"Failed to publish user state invalidation for {user_id}: {e}")
@@ -0,0 +1,40 @@
+import os
+import logging
+import threading
+
+from slack_sdk.socket_mode import SocketModeClient
+from slack_sdk.socket_mode.request import SocketModeRequest
+from slack_sdk.socket_mode.response import SocketModeResponse
+
+from health_server import register_readiness_check, run_health_server, socket_mode_check
+from workers.event_stream import EventStreamPublisher
+
+"""
+Ingest process for the Redis Streams deployment: holds the Socket Mode connection and appends every
+envelope to the event stream, acknowledging it to Slack only once Redis has accepted it.
+Run it once, next to any number of `stream_worker.py` processes. Requires `REDIS_URL`.
+"""
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+publisher = EventStreamPublisher(os.environ["REDIS_URL"])
+
+
+def forward_to_stream(client: SocketModeClient, req: SocketModeRequest):
+    try:
+        publisher.publish(req.type, req.payload)
+    except Exception as e:
+        # Not acknowledged, so Slack delivers the event again
+        logger.error(f"Could not append {req.type} envelope to the event stream: {e}")
+        return
+    client.send_socket_mode_response(SocketModeResponse(envelope_id=req.envelope_id))
+
+
+if __name__ == "__main__":
+    socket_client = SocketModeClient(app_token=os.environ.get("SLACK_APP_TOKEN"))
+    register_readiness_check("socket_mode", socket_mode_check(socket_client))
+    threading.Thread(target=run_health_server, daemon=True).start()
+    socket_client.socket_mode_request_listeners.append(forward_to_stream)
+    socket_client.connect()
+    threading.Event().wait()
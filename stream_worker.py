@@ -0,0 +1,32 @@
+import os
+import logging
+import threading
+
+from slack_bolt import App
+
+from health_server import job_executor_check, register_readiness_check, run_health_server
+from knowledge_base import start_index_job_poller
+from listeners import register_listeners
+from workers import get_job_executor
+from workers.event_stream import EventStreamConsumer
+
+"""
+Worker process for the Redis Streams deployment: reads Slack events that `stream_ingest.py` appended to the
+event stream and runs them through the regular listeners. Start as many as the LLM load needs; each one
+shares the stream through the consumer group. Requires `REDIS_URL`.
+"""
+
+# Listeners run inline on the consumer thread so the jobs they submit can be tracked until the entry is acknowledged.
+# Message events reach the conversation cache through the consumer's stream tail, which sees every event.
+app = App(token=os.environ.get("SLACK_BOT_TOKEN"), process_before_response=True)
+logging.basicConfig(level=logging.INFO)
+
+register_listeners(app)
+
+if __name__ == "__main__":
+    register_readiness_check("job_executor", job_executor_check(get_job_executor()))
+    threading.Thread(target=run_health_server, daemon=True).start()
+    # Workers share one poller through its Redis lease
+    if os.environ.get("DO_API_TOKEN"):
+        start_index_job_poller(app.client)
+    EventStreamConsumer(app, os.environ["REDIS_URL"]).run()
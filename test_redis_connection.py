@@ -1,7 +1,7 @@
 import logging
 import os
-import redis
 import json
+from state_store.redis_pool import get_redis_client
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
@@ -17,8 +17,8 @@ def test_redis_connection():
     logger.info(f"Testing connection to Redis at {redis_url}")
     
     try:
-        # Connect to Redis
-        client = redis.Redis.from_url(redis_url, decode_responses=True)
+        # Connect through the same pooled client (timeouts, health checks, retries) the app uses
+        client = get_redis_client(redis_url)
         
         # Test connection
         if client.ping():
@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from ai.conversation import build_messages
+from ai.providers import anthropic as anthropic_provider
+from ai.providers.anthropic import CACHE_CONTROL, AnthropicAPI
+
+MODEL = "claude-3-5-sonnet-20240620"
+COUNTERS = (
+    anthropic_provider._cache_read_tokens,
+    anthropic_provider._cache_write_tokens,
+    anthropic_provider._uncached_tokens,
+)
+
+
+@pytest.fixture
+def provider(monkeypatch) -> AnthropicAPI:
+    # One token per word keeps prompt lengths easy to reason about
+    monkeypatch.setattr(anthropic_provider, "count_tokens", lambda text, model: len(text.split()))
+    monkeypatch.delenv("ANTHROPIC_PROMPT_CACHE", raising=False)
+    provider = AnthropicAPI()
+    provider.set_model(MODEL)
+    return provider
+
+
+def words(count: int) -> str:
+    return " ".join(["word"] * count)
+
+
+def cached_blocks(args: dict) -> list:
+    blocks = args["system"] + [block for message in args["messages"] for block in message["content"]]
+    return [block["text"] for block in blocks if block.get("cache_control") == CACHE_CONTROL]
+
+
+def test_short_prompt_is_sent_without_breakpoints(provider):
+    args = provider._message_args(build_messages("hi", [{"user": "ann", "text": "hello"}]), "Be brief.")
+
+    assert cached_blocks(args) == []
+
+
+def test_breakpoints_mark_the_system_block_first_message_and_history_but_not_the_new_turn(provider):
+    context = [
+        {"user": "summary", "text": words(600)},
+        {"user": "assistant", "text": "Understood.", "bot": True},
+        {"user": "ann", "text": "And the budget?"},
+        {"user": "assistant", "text": "It is approved.", "bot": True},
+    ]
+
+    args = provider._message_args(build_messages("What next?", context), words(1100))
+
+    assert cached_blocks(args) == [words(1100), "summary: " + words(600), "It is approved."]
+    assert "cache_control" not in args["messages"][-1]["content"][-1]
+
+
+def test_breakpoint_is_placed_only_once_the_prefix_reaches_the_minimum(provider):
+    context = [{"user": "ann", "text": words(600)}, {"user": "assistant", "text": words(600), "bot": True}]
+
+    args = provider._message_args(build_messages("What next?", context), "Be brief.")
+
+    # The system block and the first message are too short on their own; the history before the new turn is not
+    assert cached_blocks(args) == [words(600)]
+    assert args["messages"][1]["content"][0].get("cache_control") == CACHE_CONTROL
+
+
+def test_prompt_cache_can_be_turned_off(provider, monkeypatch):
+    monkeypatch.setenv("ANTHROPIC_PROMPT_CACHE", "off")
+
+    args = provider._message_args(build_messages("What next?", [{"user": "ann", "text": words(2000)}]), words(2000))
+
+    assert cached_blocks(args) == []
+
+
+def counted(metric, model: str) -> float:
+    for line in metric.render():
+        if f'model="{model}"' in line:
+            return float(line.rsplit(" ", 1)[1])
+    return 0.0
+
+
+def test_usage_is_counted_as_cache_reads_writes_and_uncached_tokens(provider):
+    provider.set_model("claude-3-opus-20240229")
+    before = [counted(metric, "claude-3-opus-20240229") for metric in COUNTERS]
+
+    provider._record_usage(SimpleNamespace(cache_read_input_tokens=1500, cache_creation_input_tokens=200, input_tokens=30))
+    provider._record_usage(SimpleNamespace(cache_read_input_tokens=None, cache_creation_input_tokens=None, input_tokens=10))
+
+    after = [counted(metric, "claude-3-opus-20240229") for metric in COUNTERS]
+    assert [a - b for a, b in zip(after, before)] == [1500, 200, 40]
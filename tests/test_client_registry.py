@@ -0,0 +1,76 @@
+import asyncio
+
+import pytest
+
+from ai.providers import client_registry
+from ai.providers.client_registry import aclose_clients, close_clients, get_client
+
+
+class SyncClient:
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+class AsyncClient:
+    def __init__(self):
+        self.closed = False
+
+    async def close(self):
+        self.closed = True
+
+
+@pytest.fixture(autouse=True)
+def empty_registry(monkeypatch):
+    monkeypatch.setattr(client_registry, "_clients", client_registry.OrderedDict())
+
+
+def test_same_key_returns_the_same_client():
+    client = get_client(("openai", "key"), SyncClient)
+
+    assert get_client(("openai", "key"), SyncClient) is client
+
+
+def test_bounded_kind_keeps_only_the_most_recently_used_clients():
+    first = get_client(("model", "a"), SyncClient, max_per_kind=2)
+    get_client(("model", "b"), SyncClient, max_per_kind=2)
+    other_kind = get_client(("openai", "key"), SyncClient)
+    # Using the first client again makes the second the least recently used
+    get_client(("model", "a"), SyncClient, max_per_kind=2)
+
+    get_client(("model", "c"), SyncClient, max_per_kind=2)
+
+    assert [key for key in client_registry._clients if key[0] == "model"] == [("model", "a"), ("model", "c")]
+    assert get_client(("model", "a"), SyncClient, max_per_kind=2) is first
+    assert get_client(("openai", "key"), SyncClient) is other_kind
+
+
+def test_evicted_client_is_closed():
+    first = get_client(("model", "a"), SyncClient, max_per_kind=1)
+
+    get_client(("model", "b"), SyncClient, max_per_kind=1)
+
+    assert first.closed
+
+
+def test_aclose_clients_awaits_async_clients():
+    sync_client = get_client(("openai", "key"), SyncClient)
+    async_client = get_client(("openai-async", "key"), AsyncClient)
+
+    asyncio.run(aclose_clients())
+
+    assert sync_client.closed and async_client.closed
+    assert not client_registry._clients
+
+
+def test_close_clients_forgets_async_clients_without_leaving_their_close_pending(recwarn):
+    sync_client = get_client(("openai", "key"), SyncClient)
+    get_client(("openai-async", "key"), AsyncClient)
+
+    close_clients()
+
+    assert sync_client.closed
+    assert not client_registry._clients
+    assert not [warning for warning in recwarn if "never awaited" in str(warning.message)]
@@ -0,0 +1,68 @@
+import pytest
+
+from ai import context_budget
+from ai.context_budget import MESSAGE_FRAMING_TOKENS, context_budget as budget_for, fit_context
+
+SYSTEM = "system"
+PROMPT = "prompt"
+MODEL_INFO = {"context_window": 1000, "max_tokens": 100}
+# 1000 - 100 output tokens - "system" - "prompt" - the prompt's framing
+BUDGET = 1000 - 100 - len(SYSTEM) - len(PROMPT) - MESSAGE_FRAMING_TOKENS
+
+
+@pytest.fixture(autouse=True)
+def one_token_per_character(monkeypatch):
+    monkeypatch.setattr(context_budget, "count_tokens", lambda text, model=None: len(text))
+    monkeypatch.setenv("CONTEXT_SAFETY_MARGIN", "0")
+
+
+def turn(user: str, text: str, bot: bool = False) -> dict:
+    return {"user": user, "text": text, "bot": True} if bot else {"user": user, "text": text}
+
+
+def tokens(message: dict) -> int:
+    return context_budget._message_tokens(message, None)
+
+
+def test_budget_leaves_room_for_output_system_content_and_prompt():
+    assert budget_for(MODEL_INFO, None, PROMPT, SYSTEM) == BUDGET
+
+
+def test_user_turns_are_counted_with_the_author_prefix():
+    assert tokens(turn("ann", "hello")) == len("ann: hello") + MESSAGE_FRAMING_TOKENS
+
+
+def test_bot_turns_are_counted_without_the_author_prefix():
+    assert tokens(turn("Bot", "hello", bot=True)) == len("hello") + MESSAGE_FRAMING_TOKENS
+
+
+def test_context_that_fills_the_budget_exactly_is_kept():
+    newest = turn("ann", "x" * 100)
+    older = turn("Bot", "y" * (BUDGET - tokens(newest) - MESSAGE_FRAMING_TOKENS), bot=True)
+    assert tokens(older) + tokens(newest) == BUDGET
+
+    assert fit_context([older, newest], MODEL_INFO, None, PROMPT, SYSTEM) == [older, newest]
+
+
+def test_oldest_turns_are_dropped_one_token_past_the_budget():
+    newest = turn("ann", "x" * 100)
+    older = turn("Bot", "y" * (BUDGET - tokens(newest) - MESSAGE_FRAMING_TOKENS + 1), bot=True)
+    oldest = turn("bob", "z")
+
+    assert fit_context([oldest, older, newest], MODEL_INFO, None, PROMPT, SYSTEM) == [newest]
+
+
+def test_a_turn_too_large_for_the_window_drops_everything_before_it():
+    context = [turn("ann", "kept?"), turn("bob", "x" * BUDGET), turn("ann", "newest")]
+
+    assert fit_context(context, MODEL_INFO, None, PROMPT, SYSTEM) == [context[-1]]
+
+
+def test_model_without_a_context_window_keeps_every_turn():
+    context = [turn("ann", "x" * 10000)]
+
+    assert fit_context(context, {"max_tokens": 100}, None, PROMPT, SYSTEM) == context
+
+
+def test_prompt_larger_than_the_window_leaves_no_context():
+    assert fit_context([turn("ann", "hi")], MODEL_INFO, None, "p" * 2000, SYSTEM) == []
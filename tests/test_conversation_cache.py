@@ -0,0 +1,90 @@
+from listeners.listener_utils import conversation_cache
+from listeners.listener_utils.conversation_cache import ConversationCache
+
+CHANNEL, THREAD = "C1", "100.0"
+
+
+def message(ts: str, text: str, thread_ts: str = None, **fields) -> dict:
+    return {"type": "message", "channel": CHANNEL, "ts": ts, "text": text, "thread_ts": thread_ts, **fields}
+
+
+def texts(messages: list) -> list:
+    return [message["text"] for message in messages]
+
+
+def seeded_thread() -> ConversationCache:
+    cache = ConversationCache(ttl=300, enabled=True)
+    cache.seed(CHANNEL, THREAD, [message(THREAD, "root", THREAD), message("101.0", "first", THREAD)], complete=True)
+    return cache
+
+
+def test_conversation_that_was_never_fetched_is_a_miss():
+    cache = ConversationCache(ttl=300, enabled=True)
+    cache.record_event(message("101.0", "reply", THREAD))
+
+    assert cache.get(CHANNEL, THREAD) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_events_keep_a_seeded_thread_current():
+    cache = seeded_thread()
+
+    cache.record_event(message("102.0", "second", THREAD))
+    cache.record_event(
+        {"subtype": "message_changed", "channel": CHANNEL, "message": message("101.0", "first, edited", THREAD)}
+    )
+    cache.record_event(
+        {"subtype": "message_deleted", "channel": CHANNEL, "deleted_ts": THREAD, "previous_message": {"thread_ts": THREAD}}
+    )
+
+    assert texts(cache.get(CHANNEL, THREAD)) == ["first, edited", "second"]
+
+
+def test_edit_of_a_message_the_cache_never_held_is_ignored():
+    cache = seeded_thread()
+
+    cache.record_event({"subtype": "message_changed", "channel": CHANNEL, "message": message("99.0", "older", THREAD)})
+
+    assert texts(cache.get(CHANNEL, THREAD)) == ["root", "first"]
+
+
+def test_channel_timeline_answers_only_for_as_many_messages_as_it_holds():
+    cache = ConversationCache(ttl=300, enabled=True)
+    cache.seed(CHANNEL, None, [message("1.0", "a"), message("2.0", "b")], complete=False)
+    assert cache.get(CHANNEL, None, limit=3) is None
+
+    cache.record_event(message("3.0", "c"))
+
+    assert texts(cache.get(CHANNEL, None, limit=3)) == ["a", "b", "c"]
+    assert texts(cache.get(CHANNEL, None, limit=2)) == ["b", "c"]
+    assert cache.get(CHANNEL, None) is None
+
+
+def test_thread_replies_reach_the_timeline_only_when_broadcast():
+    cache = ConversationCache(ttl=300, enabled=True)
+    cache.seed(CHANNEL, None, [message("1.0", "a")], complete=False)
+
+    cache.record_event(message("101.0", "in thread", THREAD))
+    cache.record_event(message("102.0", "also sent to channel", THREAD, subtype="thread_broadcast"))
+
+    assert texts(cache.get(CHANNEL, None, limit=2)) == ["a", "also sent to channel"]
+
+
+def test_conversation_is_fetched_again_after_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation_cache.time, "monotonic", lambda: now[0])
+    cache = seeded_thread()
+
+    now[0] += 301
+
+    assert cache.get(CHANNEL, THREAD) is None
+
+
+def test_middleware_records_message_events_and_continues(monkeypatch):
+    cache = seeded_thread()
+    monkeypatch.setattr(conversation_cache, "_conversation_cache", cache)
+
+    result = conversation_cache.record_conversation_events({"event": message("102.0", "second", THREAD)}, lambda: "next")
+
+    assert result == "next"
+    assert texts(cache.get(CHANNEL, THREAD)) == ["root", "first", "second"]
@@ -0,0 +1,170 @@
+import fakeredis
+import pytest
+
+from listeners.listener_utils import thread_memory
+from state_store import conversation_memory
+from state_store.conversation_memory import SUMMARY_SPEAKER, ConversationMemory, summary_input
+
+CHANNEL, THREAD = "C1", "100.0"
+
+
+@pytest.fixture(params=["local", "redis"])
+def memory(request, monkeypatch) -> ConversationMemory:
+    if request.param == "local":
+        return ConversationMemory(recent_turns=3, max_pending=5, enabled=True)
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setattr(conversation_memory, "get_redis_client", lambda url: client)
+    return ConversationMemory(redis_url="redis://memory", recent_turns=3, max_pending=5, enabled=True)
+
+
+def turns(*numbers: int) -> list:
+    return [{"ts": f"{100 + n}.0", "user": f"user{n}", "text": f"message {n}"} for n in numbers]
+
+
+def texts(memory_turns: list) -> list:
+    return [turn["text"] for turn in memory_turns]
+
+
+def test_turns_beyond_the_recent_window_wait_to_be_summarized(memory):
+    state = memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+
+    assert texts(state["pending"]) == ["message 1", "message 2"]
+    assert texts(state["recent"]) == ["message 3", "message 4", "message 5"]
+    assert state["last_ts"] == "105.0"
+
+
+def test_turns_already_seen_are_not_added_again(memory):
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2))
+    # The next reply fetches the whole thread again, with one new message
+    state = memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3))
+
+    assert texts(state["recent"]) == ["message 1", "message 2", "message 3"]
+    assert state["pending"] == []
+    assert memory.stats()["turns_added"] == 3
+    assert memory.add_turns(CHANNEL, THREAD, turns(2, 3)) == state
+
+
+def test_turns_are_added_oldest_first(memory):
+    state = memory.add_turns(CHANNEL, THREAD, turns(3, 1, 2))
+
+    assert texts(state["recent"]) == ["message 1", "message 2", "message 3"]
+
+
+def test_oldest_pending_turns_are_dropped_past_the_limit(memory):
+    state = memory.add_turns(CHANNEL, THREAD, turns(*range(1, 11)))
+
+    assert texts(state["pending"]) == [f"message {n}" for n in range(3, 8)]
+    assert memory.stats()["turns_dropped"] == 2
+
+
+def test_context_is_the_summary_then_the_recent_turns_without_ts(memory):
+    state = memory.add_turns(CHANNEL, THREAD, turns(1, 2))
+    state["summary"] = "Earlier, they agreed on a plan."
+
+    assert memory.context(state) == [
+        {"user": SUMMARY_SPEAKER, "text": "Earlier, they agreed on a plan."},
+        {"user": "user1", "text": "message 1"},
+        {"user": "user2", "text": "message 2"},
+    ]
+
+
+def test_nothing_to_claim_without_pending_turns(memory):
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2))
+
+    assert memory.claim_summary(CHANNEL, THREAD, lease=60) is None
+
+
+def test_claimed_thread_cannot_be_claimed_again_until_its_lease_expires(memory, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation_memory.time, "time", lambda: now[0])
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+
+    claimed = memory.claim_summary(CHANNEL, THREAD, lease=60)
+    assert texts(claimed["pending"]) == ["message 1", "message 2"]
+    assert memory.claim_summary(CHANNEL, THREAD, lease=60) is None
+
+    now[0] += 61
+    assert memory.claim_summary(CHANNEL, THREAD, lease=60) is not None
+
+
+def test_summary_folds_the_claimed_turns_and_keeps_newer_pending_ones(memory):
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+    claimed = memory.claim_summary(CHANNEL, THREAD, lease=60)
+    # A reply arrives while the summary is being written
+    memory.add_turns(CHANNEL, THREAD, turns(6))
+
+    memory.apply_summary(CHANNEL, THREAD, claimed, "Summary of 1 and 2")
+
+    state = memory.get(CHANNEL, THREAD)
+    assert state["summary"] == "Summary of 1 and 2"
+    assert state["summarized_until"] == "102.0"
+    assert texts(state["pending"]) == ["message 3"]
+    assert texts(state["recent"]) == ["message 4", "message 5", "message 6"]
+    assert state["summarizing_until"] == 0.0
+    # The next job summarizes the previous summary and the turns left
+    assert summary_input(memory.claim_summary(CHANNEL, THREAD, lease=60)) == [
+        {"user": SUMMARY_SPEAKER, "text": "Summary of 1 and 2"},
+        {"user": "user3", "text": "message 3"},
+    ]
+
+
+def test_failed_summary_releases_the_claim_and_keeps_the_turns(memory):
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4))
+    claimed = memory.claim_summary(CHANNEL, THREAD, lease=60)
+
+    memory.apply_summary(CHANNEL, THREAD, claimed, None)
+
+    state = memory.get(CHANNEL, THREAD)
+    assert state["summary"] == ""
+    assert texts(state["pending"]) == ["message 1"]
+    assert memory.claim_summary(CHANNEL, THREAD, lease=60) is not None
+    assert memory.stats()["summary_errors"] == 1
+
+
+def test_stale_summary_does_not_replace_a_newer_one(memory, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(conversation_memory.time, "time", lambda: now[0])
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+    stale = memory.claim_summary(CHANNEL, THREAD, lease=60)
+    # The first job outlives its lease and a second one finishes first
+    now[0] += 61
+    memory.apply_summary(CHANNEL, THREAD, memory.claim_summary(CHANNEL, THREAD, lease=60), "Newer summary")
+
+    memory.apply_summary(CHANNEL, THREAD, stale, "Stale summary")
+
+    assert memory.get(CHANNEL, THREAD)["summary"] == "Newer summary"
+
+
+def test_summarize_thread_folds_pending_turns_with_the_summarizer(memory, monkeypatch):
+    monkeypatch.setattr(thread_memory, "get_conversation_memory", lambda: memory)
+    conversations = []
+
+    def summarize(user_id, prompt, conversation):
+        conversations.append(conversation)
+        return "They said 1 and 2"
+
+    monkeypatch.setattr(thread_memory, "summarize_conversation", summarize)
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+
+    thread_memory._summarize_thread("U1", CHANNEL, THREAD)
+
+    assert texts(conversations[0]) == ["message 1", "message 2"]
+    state = memory.get(CHANNEL, THREAD)
+    assert state["summary"] == "They said 1 and 2"
+    assert state["pending"] == []
+
+
+def test_summarize_thread_releases_the_thread_when_the_summarizer_fails(memory, monkeypatch):
+    monkeypatch.setattr(thread_memory, "get_conversation_memory", lambda: memory)
+
+    def summarize(user_id, prompt, conversation):
+        raise RuntimeError("provider unavailable")
+
+    monkeypatch.setattr(thread_memory, "summarize_conversation", summarize)
+    memory.add_turns(CHANNEL, THREAD, turns(1, 2, 3, 4, 5))
+
+    with pytest.raises(RuntimeError):
+        thread_memory._summarize_thread("U1", CHANNEL, THREAD)
+
+    assert memory.get(CHANNEL, THREAD)["summarizing_until"] == 0.0
+    assert memory.claim_summary(CHANNEL, THREAD, lease=60) is not None
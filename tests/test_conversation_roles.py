@@ -0,0 +1,82 @@
+from slack_bolt import BoltContext
+
+from ai.conversation import build_messages, group_turns
+from listeners.listener_utils import directory_cache
+from listeners.listener_utils.directory_cache import DirectoryCache
+from listeners.listener_utils.parse_conversation import parse_message
+
+APP_BOT_ID, APP_USER_ID = "B_APP", "U_APP"
+
+
+def app_directory() -> DirectoryCache:
+    directory = DirectoryCache(enabled=False)
+    directory.update_user({"id": "U1", "profile": {"display_name": "ann"}})
+    directory.remember_app(APP_BOT_ID, APP_USER_ID)
+    return directory
+
+
+def test_foreign_bot_in_a_thread_is_a_participant_and_the_app_is_the_assistant():
+    directory = app_directory()
+    thread = [
+        {"user": "U1", "text": "Is the deploy healthy?", "ts": "1.0"},
+        {
+            "subtype": "bot_message",
+            "bot_id": "B_ALERTS",
+            "bot_profile": {"name": "AlertBot"},
+            "text": "Error rate above 5%",
+            "ts": "2.0",
+        },
+        {"user": APP_USER_ID, "bot_id": APP_BOT_ID, "text": "The error rate is elevated.", "ts": "3.0"},
+    ]
+
+    context = [parse_message(message, directory) for message in thread]
+    messages = build_messages("What should we do?", context)
+
+    assert messages == [
+        {"role": "user", "content": "ann: Is the deploy healthy?"},
+        {"role": "user", "content": "AlertBot: Error rate above 5%"},
+        {"role": "assistant", "content": "The error rate is elevated."},
+        {"role": "user", "content": "What should we do?"},
+    ]
+
+
+def test_bot_messages_are_user_turns_until_the_app_is_known():
+    directory = DirectoryCache(enabled=False)
+    message = {"user": APP_USER_ID, "bot_id": APP_BOT_ID, "username": "assistant", "text": "Hi"}
+
+    assert "bot" not in parse_message(message, directory)
+
+
+def test_middleware_records_the_app_identity_from_the_authorization(monkeypatch):
+    directory = DirectoryCache(enabled=False)
+    monkeypatch.setattr(directory_cache, "_directory_cache", directory)
+    context = BoltContext({"bot_id": APP_BOT_ID, "bot_user_id": APP_USER_ID})
+
+    assert directory_cache.warm_directory_cache(context, lambda: "next") == "next"
+
+    assert directory.is_app_message({"bot_id": APP_BOT_ID})
+    assert directory.is_app_message({"user": APP_USER_ID})
+    assert not directory.is_app_message({"bot_id": "B_ALERTS"})
+
+
+def test_conversation_starting_with_the_assistant_gets_a_user_turn_first():
+    messages = build_messages("And now?", [{"user": "assistant", "text": "Earlier reply", "bot": True}])
+
+    assert [message["role"] for message in messages] == ["user", "assistant", "user"]
+
+
+def test_consecutive_turns_of_one_role_are_grouped():
+    messages = build_messages(
+        "What should we do?",
+        [
+            {"user": "ann", "text": "Is the deploy healthy?"},
+            {"user": "AlertBot", "text": "Error rate above 5%"},
+            {"user": "assistant", "text": "The error rate is elevated.", "bot": True},
+        ],
+    )
+
+    assert group_turns(messages) == [
+        ("user", ["ann: Is the deploy healthy?", "AlertBot: Error rate above 5%"]),
+        ("assistant", ["The error rate is elevated."]),
+        ("user", ["What should we do?"]),
+    ]
@@ -0,0 +1,92 @@
+from unittest.mock import MagicMock
+
+from listeners.listener_utils import directory_cache
+from listeners.listener_utils.directory_cache import DirectoryCache
+from listeners.listener_utils.parse_conversation import parse_message, resolve_mentions
+
+
+def slack_client() -> MagicMock:
+    client = MagicMock()
+    # Iterating a SlackResponse yields its pages
+    client.users_list.return_value = [
+        {"members": [{"id": "U1", "profile": {"display_name": "ann"}}]},
+        {"members": [{"id": "U2", "real_name": "Bob Jones", "profile": {}}]},
+    ]
+    client.conversations_list.return_value = [{"channels": [{"id": "C1", "name": "general"}]}]
+    return client
+
+
+def loaded_directory() -> DirectoryCache:
+    directory = DirectoryCache(enabled=True, ttl=3600)
+    directory.refresh(slack_client(), "T1")
+    return directory
+
+
+def test_mentions_resolve_from_every_page_of_the_directory():
+    directory = loaded_directory()
+
+    text = resolve_mentions("<@U1> and <@U2> in <#C1>, cc <!here> and <@U9>", directory)
+
+    assert text == "@ann and @Bob Jones in #general, cc @here and @U9"
+
+
+def test_directory_is_loaded_once_per_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(directory_cache.time, "monotonic", lambda: now[0])
+    directory = DirectoryCache(enabled=True, ttl=3600)
+    client = slack_client()
+
+    directory.refresh(client, "T1")
+    directory.refresh(client, "T1")
+    assert client.users_list.call_count == 1
+
+    now[0] += 3601
+    directory.refresh(client, "T1")
+    assert client.users_list.call_count == 2
+
+
+def test_failed_load_is_retried_sooner_than_the_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(directory_cache.time, "monotonic", lambda: now[0])
+    directory = DirectoryCache(enabled=True, ttl=3600)
+    client = slack_client()
+    client.users_list.side_effect = RuntimeError("ratelimited")
+
+    directory.refresh(client, "T1")
+    now[0] += directory_cache.RETRY_AFTER_ERROR + 1
+    client.users_list.side_effect = None
+    directory.refresh(client, "T1")
+
+    assert directory.user_name("U1") == "ann"
+    assert directory.stats()["load_errors"] == 1
+
+
+def test_user_change_event_renames_the_user():
+    directory = loaded_directory()
+
+    directory.update_user({"id": "U1", "profile": {"display_name": "ann.k"}})
+
+    assert parse_message({"user": "U1", "text": "hi"}, directory) == {"user": "ann.k", "text": "hi"}
+
+
+def test_system_messages_are_skipped_and_edits_read_as_the_edited_message():
+    directory = loaded_directory()
+
+    assert parse_message({"subtype": "channel_join", "user": "U1", "text": "<@U1> has joined"}, directory) is None
+    assert parse_message({"user": "U1", "text": ""}, directory) is None
+    assert parse_message({"subtype": "message_changed", "message": {"user": "U2", "text": "fixed typo"}}, directory) == {
+        "user": "Bob Jones",
+        "text": "fixed typo",
+    }
+
+
+def test_file_shares_and_attachment_only_posts_have_text():
+    directory = loaded_directory()
+
+    assert parse_message(
+        {"subtype": "file_share", "user": "U1", "text": "see", "files": [{"title": "plan.pdf"}]}, directory
+    ) == {"user": "ann", "text": "see\n[shared plan.pdf]"}
+    assert parse_message(
+        {"subtype": "bot_message", "bot_id": "B1", "username": "ci", "attachments": [{"fallback": "Build failed"}]},
+        directory,
+    ) == {"user": "ci", "text": "Build failed"}
@@ -0,0 +1,81 @@
+import json
+from unittest.mock import MagicMock
+
+import fakeredis
+import pytest
+
+from workers import event_stream
+from workers.event_stream import EventStreamConsumer, EventStreamPublisher
+
+STREAM, GROUP = "test:events", "test-workers"
+EVENT = {"type": "events_api", "event": {"type": "app_mention", "text": "hi"}}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    monkeypatch.setattr(event_stream, "get_redis_client", lambda url: client)
+    return client
+
+
+def make_consumer(monkeypatch, max_deliveries: int = 5) -> EventStreamConsumer:
+    monkeypatch.setenv("SLACK_EVENT_CLAIM_IDLE_MS", "0")
+    monkeypatch.setenv("SLACK_EVENT_MAX_DELIVERIES", str(max_deliveries))
+    consumer = EventStreamConsumer(MagicMock(), "redis://events", stream=STREAM, group=GROUP, consumer="survivor")
+    consumer.ensure_group()
+    return consumer
+
+
+def crashed_delivery(client) -> str:
+    """Publish an event and read it as a worker that never acknowledges it."""
+    entry_id = EventStreamPublisher("redis://events", stream=STREAM).publish("events_api", EVENT)
+    client.xreadgroup(GROUP, "crashed", {STREAM: ">"}, count=1)
+    return entry_id
+
+
+def test_entry_left_by_a_crashed_worker_is_redelivered_and_acknowledged(client, monkeypatch):
+    consumer = make_consumer(monkeypatch)
+    crashed_delivery(client)
+
+    assert consumer._reclaim(10) == 1
+
+    request = consumer.app.dispatch.call_args.args[0]
+    assert request.body == EVENT
+    assert request.context["redelivered"] is True
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+    assert consumer.stats()["reclaimed"] == 1
+
+
+def test_reclaim_reads_the_two_element_reply_of_redis_6_2(client, monkeypatch):
+    consumer = make_consumer(monkeypatch)
+    crashed_delivery(client)
+    xautoclaim = client.xautoclaim
+    monkeypatch.setattr(client, "xautoclaim", lambda *args, **kwargs: xautoclaim(*args, **kwargs)[:2])
+
+    assert consumer._reclaim(10) == 1
+    consumer.app.dispatch.assert_called_once()
+
+
+def test_entry_past_the_delivery_limit_is_dead_lettered(client, monkeypatch):
+    consumer = make_consumer(monkeypatch, max_deliveries=1)
+    entry_id = crashed_delivery(client)
+
+    consumer._reclaim(10)
+
+    consumer.app.dispatch.assert_not_called()
+    [(_, fields)] = client.xrange(f"{STREAM}:dead")
+    assert fields["entry_id"] == entry_id
+    assert json.loads(fields["payload"]) == EVENT
+    assert client.xpending(STREAM, GROUP)["pending"] == 0
+    assert consumer.stats()["dead_lettered"] == 1
+
+
+def test_failed_dispatch_stays_pending_for_another_attempt(client, monkeypatch):
+    consumer = make_consumer(monkeypatch)
+    consumer.app.dispatch.side_effect = RuntimeError("listener failed")
+    crashed_delivery(client)
+
+    consumer._reclaim(10)
+
+    assert client.xpending(STREAM, GROUP)["pending"] == 1
+    assert consumer.stats()["failed"] == 1
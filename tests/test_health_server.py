@@ -0,0 +1,90 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import health_server
+from health_server import HealthCheckHandler, job_executor_check, register_readiness_check
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(health_server, "_checks", {})
+    monkeypatch.setattr(health_server, "_cached", (0.0, None))
+    monkeypatch.setenv("HEALTH_CHECK_CACHE_SECONDS", "0")
+    server = ThreadingHTTPServer(("127.0.0.1", 0), HealthCheckHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def get(url: str):
+    try:
+        with urllib.request.urlopen(url, timeout=5) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, json.loads(e.read())
+
+
+def test_ready_when_every_check_passes(server):
+    register_readiness_check("socket_mode", lambda: (True, "connected"))
+
+    status, body = get(f"{server}/readyz")
+
+    assert status == 200
+    assert body == {"ready": True, "checks": {"socket_mode": {"ready": True, "detail": "connected"}}}
+
+
+def test_not_ready_names_the_failing_and_raising_checks(server):
+    register_readiness_check("socket_mode", lambda: (True, "connected"))
+    register_readiness_check("socket_mode_lost", lambda: (False, "disconnected"))
+
+    def redis_down():
+        raise ConnectionError("Connection refused")
+
+    register_readiness_check("redis", redis_down)
+
+    status, body = get(f"{server}/readyz")
+
+    assert status == 503
+    assert body["ready"] is False
+    assert body["checks"]["socket_mode"]["ready"] is True
+    assert body["checks"]["socket_mode_lost"] == {"ready": False, "detail": "disconnected"}
+    assert body["checks"]["redis"] == {"ready": False, "detail": "check failed: Connection refused"}
+
+
+def test_liveness_does_not_run_the_readiness_checks(server):
+    register_readiness_check("redis", lambda: (False, "down"))
+
+    assert get(f"{server}/livez") == (200, {"status": "ok"})
+    assert get(f"{server}/healthz") == (200, {"status": "ok"})
+
+
+def test_check_results_are_cached_between_probes(server, monkeypatch):
+    monkeypatch.setenv("HEALTH_CHECK_CACHE_SECONDS", "60")
+    calls = []
+    register_readiness_check("counted", lambda: (calls.append(1) or True, "ok"))
+
+    get(f"{server}/readyz")
+    get(f"{server}/readyz")
+
+    assert len(calls) == 1
+
+
+class StubExecutor:
+    def __init__(self, queued: int):
+        self.queued = queued
+
+    def stats(self) -> dict:
+        return {"running": 4, "max_workers": 4, "queued": self.queued, "max_queue": 10}
+
+
+def test_job_queue_past_the_threshold_is_not_ready(monkeypatch):
+    monkeypatch.setenv("READINESS_QUEUE_THRESHOLD", "0.9")
+
+    assert job_executor_check(StubExecutor(queued=8))() == (True, "4/4 running, 8/10 queued")
+    assert job_executor_check(StubExecutor(queued=9))()[0] is False
@@ -0,0 +1,74 @@
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from listeners.events import app_home_opened
+from listeners.listener_utils import home_view
+from listeners.listener_utils.home_view import ModelCatalog
+
+MODELS = {
+    "gpt-4o": {"name": "GPT-4o", "provider": "OpenAI"},
+    "claude-3-haiku-20240307": {"name": "Claude 3 Haiku", "provider": "Anthropic"},
+}
+
+
+@pytest.fixture
+def catalog_builds(monkeypatch) -> list:
+    builds = []
+
+    def get_available_providers():
+        builds.append(1)
+        return MODELS
+
+    monkeypatch.setattr(home_view, "get_available_providers", get_available_providers)
+    for name in ("OPENAI_API_KEY", "GENAI_API_URL", "REDIS_URL"):
+        monkeypatch.delenv(name, raising=False)
+    return builds
+
+
+def selected_value(view: dict) -> str:
+    return view["blocks"][-1]["elements"][0]["initial_option"]["value"]
+
+
+def test_catalog_is_built_once_until_the_provider_configuration_changes(catalog_builds, monkeypatch):
+    catalog = ModelCatalog()
+    catalog.render("gpt-4o")
+    catalog.render(None)
+    assert len(catalog_builds) == 1
+
+    monkeypatch.setenv("OPENAI_API_KEY", "rotated")
+    catalog.render("gpt-4o")
+
+    assert len(catalog_builds) == 2
+
+
+def test_rendered_view_selects_the_model_and_carries_its_hash(catalog_builds):
+    catalog = ModelCatalog()
+
+    view, view_hash = catalog.render("gpt-4o")
+
+    assert selected_value(view) == "gpt-4o openai"
+    assert view["private_metadata"] == view_hash
+    assert catalog.render("gpt-4o") == (view, view_hash)
+    assert catalog.render("claude-3-haiku-20240307")[1] != view_hash
+
+
+def test_unknown_model_selects_the_placeholder(catalog_builds):
+    view, _ = ModelCatalog().render("retired-model")
+
+    assert selected_value(view) == "null"
+
+
+def test_view_is_published_only_when_the_user_sees_a_different_one(catalog_builds, monkeypatch):
+    catalog = ModelCatalog()
+    monkeypatch.setattr(app_home_opened, "get_model_catalog", lambda: catalog)
+    client = MagicMock()
+    event = {"user": "U1", "tab": "home"}
+
+    app_home_opened._publish_home_view(event, logging.getLogger("test"), client)
+    published = client.views_publish.call_args.kwargs["view"]
+    # Slack sends the view the user currently sees with the next app_home_opened event
+    app_home_opened._publish_home_view({**event, "view": published}, logging.getLogger("test"), client)
+
+    client.views_publish.assert_called_once()
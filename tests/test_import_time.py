@@ -0,0 +1,47 @@
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+
+PROVIDER_SDKS = ("openai", "anthropic", "vertexai", "google.cloud.aiplatform")
+# What `app.py` and `app_async.py` import before the Bolt app is constructed
+APP_MODULES = (
+    "slack_bolt",
+    "slack_bolt.adapter.socket_mode",
+    "health_server",
+    "knowledge_base",
+    "listeners",
+    "async_listeners",
+    "workers",
+    "ai.providers",
+)
+
+
+def imported_modules(env: dict) -> set:
+    """The names in `sys.modules` after importing `APP_MODULES` in a new interpreter."""
+    result = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            f"import json, sys; import {', '.join(APP_MODULES)}; print(json.dumps(sorted(sys.modules)))",
+        ],
+        cwd=ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return set(json.loads(result.stdout.splitlines()[-1]))
+
+
+def test_provider_sdks_are_not_imported_at_startup():
+    env = {**os.environ, "PYTHONPATH": ROOT, "GENAI_API_KEY": "test"}
+    for name in ("OPENAI_API_KEY", "ANTHROPIC_API_KEY", "VERTEX_AI_PROJECT_ID", "REDIS_URL"):
+        env.pop(name, None)
+
+    modules = imported_modules(env)
+
+    assert "ai.providers" in modules
+    assert [sdk for sdk in PROVIDER_SDKS if sdk in modules] == []
@@ -0,0 +1,334 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ai.providers import router as router_module
+from ai.providers.router import CircuitBreaker, ProviderRouter, ProviderUnavailableError
+
+
+class FakeProvider:
+    def __init__(self, name: str):
+        self.MODELS = {"model": {"provider": name}}
+        self.current_model = "model"
+
+
+class FakeAPIError(Exception):
+    def __init__(self, status_code: int, headers: dict = None):
+        super().__init__(f"status {status_code}")
+        self.status_code = status_code
+        self.response = type("Response", (), {"headers": headers or {}})()
+
+
+@pytest.fixture
+def sleeps(monkeypatch):
+    waited = []
+    monkeypatch.setattr(router_module.time, "sleep", waited.append)
+    return waited
+
+
+def make_router(**settings) -> ProviderRouter:
+    router = ProviderRouter()
+    router.retries = 2
+    router.backoff_base = 0.5
+    router.backoff_max = 10
+    router.hedging = False
+    for name, value in settings.items():
+        setattr(router, name, value)
+    return router
+
+
+def scripted(outcomes: list, opened: list = None):
+    """`open_stream` whose calls fail or stream as scripted, one outcome per call."""
+
+    def open_stream(provider):
+        outcome = outcomes.pop(0)
+
+        def stream():
+            if opened is not None:
+                opened.append(provider)
+            if isinstance(outcome, Exception):
+                raise outcome
+            yield from outcome
+
+        return stream()
+
+    return open_stream
+
+
+def test_retries_after_the_retry_after_header(sleeps):
+    router = make_router()
+    provider = FakeProvider("a")
+    open_stream = scripted([FakeAPIError(429, {"retry-after": "2"}), ["hello", " world"]])
+
+    answered, chunks = router.open([provider], open_stream)
+
+    assert answered is provider
+    assert "".join(chunks) == "hello world"
+    assert sleeps == [2.0]
+    assert router.stats()["retries"] == 1
+
+
+def test_retry_after_longer_than_the_maximum_fails_over_without_waiting(sleeps):
+    router = make_router(backoff_max=5)
+    primary, fallback = FakeProvider("a"), FakeProvider("b")
+    open_stream = scripted([FakeAPIError(429, {"retry-after": "60"}), ["from fallback"]])
+
+    answered, chunks = router.open([primary, fallback], open_stream)
+
+    assert answered is fallback
+    assert list(chunks) == ["from fallback"]
+    assert sleeps == []
+    assert router.stats()["failovers"] == 1
+
+
+def test_backoff_is_jittered_and_bounded(sleeps):
+    router = make_router(retries=3, backoff_base=1, backoff_max=3)
+    open_stream = scripted([FakeAPIError(503), FakeAPIError(503), FakeAPIError(503), ["ok"]])
+
+    router.open([FakeProvider("a")], open_stream)
+
+    assert len(sleeps) == 3
+    assert all(0 <= wait <= min(3, 2**attempt) for attempt, wait in enumerate(sleeps))
+
+
+def test_rejected_request_is_raised_without_retry_or_failover(sleeps):
+    router = make_router()
+    primary, fallback = FakeProvider("a"), FakeProvider("b")
+    open_stream = scripted([FakeAPIError(400), ["unused"]])
+
+    with pytest.raises(FakeAPIError):
+        router.open([primary, fallback], open_stream)
+    assert sleeps == []
+    assert router.breaker(primary).failures == 0
+
+
+def test_breaker_opens_then_half_opens_and_closes_on_a_successful_probe(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("a", failure_threshold=2, reset_timeout=30)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    now[0] += 30
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    # Only one probe at a time
+    assert not breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_failed_probe_opens_the_breaker_again(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now[0])
+    breaker = CircuitBreaker("a", failure_threshold=1, reset_timeout=30)
+    breaker.record_failure()
+    now[0] += 30
+    assert breaker.allow()
+
+    breaker.record_failure()
+
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+
+def test_rejected_request_does_not_close_a_half_open_breaker(monkeypatch, sleeps):
+    now = [1000.0]
+    monkeypatch.setattr(router_module.time, "monotonic", lambda: now[0])
+    router = make_router(failure_threshold=1, reset_timeout=30)
+    provider = FakeProvider("a")
+    breaker = router.breaker(provider)
+    breaker.record_failure()
+    now[0] += 30
+
+    with pytest.raises(FakeAPIError):
+        router.open([provider], scripted([FakeAPIError(400)]))
+
+    assert breaker.state == "half_open"
+    # The probe slot is free again for the next request
+    assert breaker.allow()
+
+
+def test_open_breaker_skips_the_provider(sleeps):
+    router = make_router(failure_threshold=1)
+    primary, fallback = FakeProvider("a"), FakeProvider("b")
+    router.breaker(primary).record_failure()
+    opened = []
+
+    answered, chunks = router.open([primary, fallback], scripted([["ok"]], opened))
+    list(chunks)
+
+    assert answered is fallback
+    assert opened == [fallback]
+
+
+def test_all_candidates_unavailable_raises_the_last_error(sleeps):
+    router = make_router(retries=0)
+    with pytest.raises(FakeAPIError):
+        router.open([FakeProvider("a"), FakeProvider("b")], scripted([FakeAPIError(500), FakeAPIError(503)]))
+
+
+def test_fallback_chain_skips_unknown_unconfigured_and_duplicate_entries(monkeypatch):
+    from ai import providers
+
+    monkeypatch.setenv("OPENAI_API_KEY", "test")
+    monkeypatch.delenv("ANTHROPIC_API_KEY", raising=False)
+    monkeypatch.setenv(
+        "LLM_FALLBACK_CHAIN",
+        "nowhere:model,openai:gpt-4o,anthropic:claude-3-haiku-20240307,openai:not-a-model,openai:gpt-4o-mini,openai:gpt-4o",
+    )
+    user_provider = providers._get_provider("openai")
+    user_provider.set_model("gpt-4o")
+
+    candidates = providers._candidates(user_provider)
+
+    assert [(type(c).__name__, c.current_model) for c in candidates] == [
+        ("OpenAI_API", "gpt-4o"),
+        ("OpenAI_API", "gpt-4o-mini"),
+    ]
+
+
+def _slow_then_fast():
+    """Candidate a opens after 0.3s and b at once; a records when its stream is closed."""
+    closed, streams = [], []
+
+    def open_stream(provider):
+        def stream():
+            try:
+                if provider.MODELS["model"]["provider"] == "a":
+                    time.sleep(0.3)
+                yield provider.MODELS["model"]["provider"]
+                yield "done"
+            finally:
+                closed.append(provider.MODELS["model"]["provider"])
+
+        # Kept referenced, so only the router closes it
+        streams.append(stream())
+        return streams[-1]
+
+    return open_stream, closed
+
+
+def test_hedged_call_uses_the_faster_candidate_and_closes_the_slower_one():
+    router = make_router(hedging=True, hedge_default_delay=0.05)
+    open_stream, closed = _slow_then_fast()
+
+    answered, chunks = router.open([FakeProvider("a"), FakeProvider("b")], open_stream)
+
+    assert answered.MODELS["model"]["provider"] == "b"
+    assert list(chunks) == ["b", "done"]
+    deadline = time.monotonic() + 2
+    while "a" not in closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "a" in closed
+    assert router.stats()["hedged"] == 1
+    assert router.stats()["hedge_wins"] == 1
+
+
+def test_hedged_call_closes_an_opened_stream_when_another_attempt_is_rejected():
+    router = make_router(hedging=True, hedge_default_delay=0.05)
+    closed, streams = [], []
+    release = threading.Event()
+
+    def open_stream(provider):
+        name = provider.MODELS["model"]["provider"]
+
+        def stream():
+            try:
+                release.wait(2)
+                if name == "b":
+                    raise FakeAPIError(400)
+                # Opens after b was rejected
+                time.sleep(0.1)
+                yield name
+            finally:
+                closed.append(name)
+
+        # Kept referenced, so only the router closes it
+        streams.append(stream())
+        return streams[-1]
+
+    threading.Timer(0.2, release.set).start()
+    with pytest.raises(FakeAPIError):
+        router.open([FakeProvider("a"), FakeProvider("b")], open_stream)
+    deadline = time.monotonic() + 2
+    while "a" not in closed and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert "a" in closed
+
+
+def test_async_hedged_call_closes_attempts_that_finished_in_the_same_round():
+    router = make_router(hedging=True, hedge_default_delay=0.05)
+    closed, streams = [], []
+
+    async def scenario():
+        ready = asyncio.Event()
+
+        def open_stream(provider):
+            name = provider.MODELS["model"]["provider"]
+
+            async def stream():
+                try:
+                    await ready.wait()
+                    yield name
+                finally:
+                    closed.append(name)
+
+            # Kept referenced, so only the router closes it
+            streams.append(stream())
+            return streams[-1]
+
+        asyncio.get_running_loop().call_later(0.2, ready.set)
+        answered, chunks = await router.open_async([FakeProvider("a"), FakeProvider("b")], open_stream)
+        chunks = [chunk async for chunk in chunks]
+        await asyncio.sleep(0.05)
+        # Checked before asyncio.run() finalizes the streams left open
+        return answered.MODELS["model"]["provider"], chunks, list(closed)
+
+    winner, chunks, closed_in_time = asyncio.run(scenario())
+
+    assert chunks == [winner]
+    loser = "b" if winner == "a" else "a"
+    assert loser in closed_in_time
+
+
+def test_async_retries_after_the_retry_after_header(monkeypatch):
+    waited = []
+
+    async def fake_sleep(seconds):
+        waited.append(seconds)
+
+    monkeypatch.setattr(router_module.asyncio, "sleep", fake_sleep)
+    router = make_router()
+    outcomes = [FakeAPIError(429, {"retry-after-ms": "1500"}), ["ok"]]
+
+    def open_stream(provider):
+        outcome = outcomes.pop(0)
+
+        async def stream():
+            if isinstance(outcome, Exception):
+                raise outcome
+            for chunk in outcome:
+                yield chunk
+
+        return stream()
+
+    async def scenario():
+        _, chunks = await router.open_async([FakeProvider("a")], open_stream)
+        return [chunk async for chunk in chunks]
+
+    assert asyncio.run(scenario()) == ["ok"]
+    assert waited == [1.5]
+
+
+def test_no_candidates_raises_provider_unavailable():
+    with pytest.raises(ProviderUnavailableError):
+        make_router().open([], scripted([]))
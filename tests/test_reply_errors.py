@@ -0,0 +1,44 @@
+import logging
+from unittest.mock import MagicMock
+
+import pytest
+
+from listeners.events import app_mentioned, app_messaged
+
+
+def fail_fetch(*args, **kwargs):
+    raise RuntimeError("conversations.replies failed")
+
+
+@pytest.mark.parametrize(
+    "module, reply",
+    [(app_mentioned, app_mentioned._reply_to_mention), (app_messaged, app_messaged._reply_to_dm)],
+)
+def test_error_before_the_loading_message_is_logged_without_updating_a_message(module, reply, monkeypatch, caplog):
+    monkeypatch.setattr(module, "fetch_recent_thread_messages", fail_fetch)
+    client, say = MagicMock(), MagicMock()
+    event = {"channel": "C1", "thread_ts": "1.0", "ts": "2.0", "user": "U1", "text": "hello"}
+
+    with caplog.at_level(logging.ERROR):
+        reply(client, event, logging.getLogger("test"), say)
+
+    assert "conversations.replies failed" in caplog.text
+    say.assert_not_called()
+    client.chat_update.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    "module, reply",
+    [(app_mentioned, app_mentioned._reply_to_mention), (app_messaged, app_messaged._reply_to_dm)],
+)
+def test_error_after_the_loading_message_is_shown_in_it(module, reply, monkeypatch):
+    monkeypatch.setattr(module, "fetch_recent_thread_messages", lambda *args: [])
+    monkeypatch.setattr(module, "thread_context", lambda *args: [])
+    monkeypatch.setattr(module, "get_provider_response_stream", fail_fetch)
+    client, say = MagicMock(), MagicMock(return_value={"ts": "3.0"})
+    event = {"channel": "C1", "thread_ts": "1.0", "ts": "2.0", "user": "U1", "text": "hello"}
+
+    reply(client, event, logging.getLogger("test"), say)
+
+    client.chat_update.assert_called_once()
+    assert client.chat_update.call_args.kwargs["ts"] == "3.0"
@@ -0,0 +1,112 @@
+import math
+
+import fakeredis
+import pytest
+
+from ai import response_cache
+from ai.response_cache import ResponseCache, hashed_bag_of_words, normalize_prompt
+
+REQUEST = ("openai", "gpt-4o", "You are helpful.")
+CONTEXT = [{"user": "ann", "text": "We are planning the offsite."}]
+
+
+@pytest.fixture(autouse=True)
+def no_redis_url(monkeypatch):
+    monkeypatch.delenv("REDIS_URL", raising=False)
+
+
+@pytest.fixture(params=["local", "redis"])
+def make_cache(request, monkeypatch):
+    def make(**settings) -> ResponseCache:
+        if request.param == "local":
+            return ResponseCache(**settings)
+        client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+        monkeypatch.setattr(response_cache, "get_redis_client", lambda url: client)
+        return ResponseCache(redis_url="redis://cache", **settings)
+
+    return make
+
+
+def test_prompts_are_normalized_for_whitespace_case_and_trailing_punctuation():
+    assert normalize_prompt("  What is   the\nPlan?  ") == "what is the plan"
+    assert normalize_prompt("What is the plan!") == normalize_prompt("what is the plan")
+    assert normalize_prompt("What is the plan for today") != normalize_prompt("What is the plan")
+
+
+def test_normalized_prompt_hits_the_exact_entry(make_cache):
+    cache = make_cache(mode="exact")
+    cache.store(*REQUEST, "What is the plan?", CONTEXT, "The offsite is on Friday.")
+
+    assert cache.lookup(*REQUEST, "what is   the plan", CONTEXT) == "The offsite is on Friday."
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_entries_are_scoped_to_model_system_content_and_context(make_cache):
+    cache = make_cache(mode="exact")
+    cache.store(*REQUEST, "What is the plan?", CONTEXT, "The offsite is on Friday.")
+
+    assert cache.lookup("openai", "gpt-4o-mini", "You are helpful.", "What is the plan?", CONTEXT) is None
+    assert cache.lookup("openai", "gpt-4o", "Be brief.", "What is the plan?", CONTEXT) is None
+    assert cache.lookup(*REQUEST, "What is the plan?", CONTEXT + [{"user": "bob", "text": "And lunch?"}]) is None
+    assert cache.stats()["misses"] == 3
+
+
+def test_least_recently_used_entry_is_evicted(make_cache, monkeypatch):
+    # Every access gets a later time, so equal timestamps never decide the order
+    ticks = iter(range(1_000_000, 2_000_000))
+    monkeypatch.setattr(response_cache.time, "time", lambda: float(next(ticks)))
+    cache = make_cache(mode="exact", max_entries=2)
+    cache.store(*REQUEST, "first", None, "1")
+    cache.store(*REQUEST, "second", None, "2")
+    # Reading the first entry makes the second the least recently used
+    assert cache.lookup(*REQUEST, "first", None) == "1"
+
+    cache.store(*REQUEST, "third", None, "3")
+
+    assert cache.lookup(*REQUEST, "second", None) is None
+    assert cache.lookup(*REQUEST, "first", None) == "1"
+    assert cache.lookup(*REQUEST, "third", None) == "3"
+    assert cache.stats()["evictions"] == 1
+
+
+def unit(angle_cosine: float) -> list:
+    """A 2-d unit vector whose cosine similarity with [1, 0] is `angle_cosine`."""
+    return [angle_cosine, math.sqrt(1 - angle_cosine**2)]
+
+
+def test_semantic_lookup_returns_a_neighbour_at_or_above_the_threshold(make_cache):
+    cache = make_cache(mode="semantic", similarity=0.9)
+    vectors = {"stored": [1.0, 0.0], "close": unit(0.95), "far": unit(0.85)}
+    cache.set_embedding_function(lambda text: vectors[text])
+    cache.store(*REQUEST, "stored", CONTEXT, "answer")
+
+    assert cache.lookup(*REQUEST, "close", CONTEXT) == "answer"
+    assert cache.lookup(*REQUEST, "far", CONTEXT) is None
+    # Neighbours are only searched among entries with the same model, system content and context
+    assert cache.lookup(*REQUEST, "close", None) is None
+    assert cache.stats()["semantic_hits"] == 1
+
+
+def test_exact_mode_never_answers_a_similar_prompt(make_cache):
+    cache = make_cache(mode="exact")
+    cache.set_embedding_function(lambda text: [1.0, 0.0])
+    cache.store(*REQUEST, "stored", CONTEXT, "answer")
+
+    assert cache.lookup(*REQUEST, "something else", CONTEXT) is None
+
+
+def test_default_embedding_places_rephrasings_closer_than_other_questions():
+    def similarity(a: str, b: str) -> float:
+        return response_cache._cosine(hashed_bag_of_words(a), hashed_bag_of_words(b))
+
+    question = "what is the plan for the offsite"
+    assert similarity(question, "what is the plan for the offsite on friday") > similarity(
+        question, "who wrote the quarterly report"
+    )
+
+
+def test_disabled_cache_neither_stores_nor_answers():
+    cache = ResponseCache(mode="off")
+    cache.store(*REQUEST, "What is the plan?", CONTEXT, "answer")
+
+    assert cache.lookup(*REQUEST, "What is the plan?", CONTEXT) is None
@@ -0,0 +1,300 @@
+import asyncio
+import threading
+import time
+
+import fakeredis
+import pytest
+
+from ai import single_flight as single_flight_module
+from ai.single_flight import LOCK_PREFIX, AbandonedRequestError, SingleFlight
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(single_flight_module, "REMOTE_POLL_SECONDS", 0.01)
+
+
+def replica(server: fakeredis.FakeServer, lock_ttl: float = 5) -> SingleFlight:
+    """A SingleFlight in `redis` mode, sharing `server` with the other replicas of a test."""
+    flight = SingleFlight(mode="local", lock_ttl=lock_ttl, result_ttl=5)
+    flight.mode = "redis"
+    flight.redis_client = fakeredis.FakeRedis(server=server, decode_responses=True)
+    return flight
+
+
+class Leader:
+    """A `produce` that streams its chunks one at a time, as the test releases them."""
+
+    def __init__(self, chunks, error: Exception = None):
+        self.chunks = chunks
+        self.error = error
+        self.calls = 0
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def __call__(self):
+        self.calls += 1
+        yield self.chunks[0]
+        self.started.set()
+        assert self.release.wait(5)
+        yield from self.chunks[1:]
+        if self.error is not None:
+            raise self.error
+
+
+def consume(iterator, results: dict, name: str) -> threading.Thread:
+    def run():
+        try:
+            results[name] = list(iterator)
+        except Exception as e:
+            results[name] = e
+
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread
+
+
+def wait_for(predicate, timeout: float = 5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline
+        time.sleep(0.01)
+
+
+def test_follower_shares_the_leaders_result():
+    flight = SingleFlight(mode="local")
+    leader, other = Leader(["a", "b"]), Leader(["x"])
+    results = {}
+
+    leading = consume(flight.run("key", leader), results, "leader")
+    assert leader.started.wait(5)
+    following = consume(flight.run("key", other), results, "follower")
+    wait_for(lambda: flight.stats()["coalesced"] == 1)
+    leader.release.set()
+    leading.join(5)
+    following.join(5)
+
+    assert results == {"leader": ["a", "b"], "follower": ["a", "b"]}
+    assert (leader.calls, other.calls) == (1, 0)
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_follower_receives_the_leaders_error():
+    flight = SingleFlight(mode="local")
+    leader = Leader(["a"], error=ValueError("provider failed"))
+    results = {}
+
+    leading = consume(flight.run("key", leader), results, "leader")
+    assert leader.started.wait(5)
+    following = consume(flight.run("key", Leader(["x"])), results, "follower")
+    wait_for(lambda: flight.stats()["coalesced"] == 1)
+    leader.release.set()
+    leading.join(5)
+    following.join(5)
+
+    assert isinstance(results["leader"], ValueError)
+    assert results["follower"] is results["leader"]
+
+
+def test_follower_streams_chunks_as_the_leader_produces_them():
+    flight = SingleFlight(mode="local")
+    leader = Leader(["a", "b"])
+    results = {}
+
+    leading = consume(flight.run("key", leader), results, "leader")
+    assert leader.started.wait(5)
+    follower = flight.run("key", Leader(["x"]))
+
+    # The leader is still waiting for its next chunk
+    assert next(follower) == "a"
+    leader.release.set()
+    assert list(follower) == ["b"]
+    leading.join(5)
+
+
+def test_abandoned_leader_fails_its_followers():
+    flight = SingleFlight(mode="local")
+    leader = Leader(["a", "b"])
+    leading = flight.run("key", leader)
+    assert next(leading) == "a"
+    results = {}
+    following = consume(flight.run("key", Leader(["x"])), results, "follower")
+    wait_for(lambda: flight.stats()["coalesced"] == 1)
+
+    leading.close()
+    following.join(5)
+
+    assert isinstance(results["follower"], AbandonedRequestError)
+
+
+def test_different_requests_are_not_coalesced():
+    flight = SingleFlight(mode="local")
+    first, second = Leader(["a"]), Leader(["b"])
+    first.release.set()
+    second.release.set()
+
+    assert list(flight.run("one", first)) == ["a"]
+    assert list(flight.run("two", second)) == ["b"]
+    assert (first.calls, second.calls) == (1, 1)
+
+
+def test_async_followers_share_the_leaders_chunks():
+    flight = SingleFlight(mode="local")
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        async def collect():
+            return [chunk async for chunk in flight.run_async("key", produce)]
+
+        tasks = [asyncio.ensure_future(collect()) for _ in range(3)]
+        while flight.stats()["coalesced"] < 2:
+            await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(scenario()) == [["a", "b"]] * 3
+    assert len(calls) == 1
+
+
+def test_async_followers_receive_the_leaders_error():
+    flight = SingleFlight(mode="local")
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def produce():
+            yield "a"
+            await release.wait()
+            raise ValueError("provider failed")
+
+        async def collect():
+            return [chunk async for chunk in flight.run_async("key", produce)]
+
+        tasks = [asyncio.ensure_future(collect()) for _ in range(2)]
+        while flight.stats()["coalesced"] < 1:
+            await asyncio.sleep(0.01)
+        release.set()
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    leader_error, follower_error = asyncio.run(scenario())
+    assert isinstance(leader_error, ValueError)
+    assert follower_error is leader_error
+
+
+def test_replica_waits_for_the_result_of_another_replicas_leader():
+    server = fakeredis.FakeServer()
+    first, second = replica(server), replica(server)
+    leader, other = Leader(["a", "b"]), Leader(["x"])
+    results = {}
+
+    leading = consume(first.run("key", leader), results, "leader")
+    assert leader.started.wait(5)
+    following = consume(second.run("key", other), results, "follower")
+    time.sleep(0.05)
+    leader.release.set()
+    leading.join(5)
+    following.join(5)
+
+    assert results == {"leader": ["a", "b"], "follower": ["ab"]}
+    assert other.calls == 0
+    assert second.stats()["remote_coalesced"] == 1
+    # The lock was released after the result was stored
+    assert first.redis_client.get(LOCK_PREFIX + "key") is None
+
+
+def test_replica_takes_over_when_the_lock_expires_without_a_result():
+    server = fakeredis.FakeServer()
+    flight = replica(server)
+    # A leader in another replica that died while holding the lock
+    flight.redis_client.set(LOCK_PREFIX + "key", "dead-leader", px=200)
+    produce = Leader(["answer"])
+    produce.release.set()
+
+    started_at = time.monotonic()
+    assert list(flight.run("key", produce)) == ["answer"]
+
+    assert produce.calls == 1
+    assert time.monotonic() - started_at >= 0.15
+    assert flight.stats()["remote_coalesced"] == 0
+
+
+def test_replica_takes_over_when_the_leader_fails():
+    server = fakeredis.FakeServer()
+    first, second = replica(server), replica(server)
+    leader = Leader(["a"], error=ValueError("provider failed"))
+    other = Leader(["from second"])
+    other.release.set()
+    results = {}
+
+    leading = consume(first.run("key", leader), results, "leader")
+    assert leader.started.wait(5)
+    following = consume(second.run("key", other), results, "follower")
+    time.sleep(0.05)
+    leader.release.set()
+    leading.join(5)
+    following.join(5)
+
+    assert isinstance(results["leader"], ValueError)
+    assert results["follower"] == ["from second"]
+    assert other.calls == 1
+
+
+def test_later_request_does_not_read_an_earlier_result():
+    server = fakeredis.FakeServer()
+    flight = replica(server)
+    first, second = Leader(["first"]), Leader(["second"])
+    first.release.set()
+    second.release.set()
+
+    assert list(flight.run("key", first)) == ["first"]
+    assert list(flight.run("key", second)) == ["second"]
+    assert second.calls == 1
+
+
+def test_async_replica_waits_for_the_result_of_another_replicas_leader():
+    server = fakeredis.FakeServer()
+    first, second = replica(server), replica(server)
+    calls = []
+
+    async def scenario():
+        release = asyncio.Event()
+
+        async def produce():
+            calls.append(1)
+            yield "a"
+            await release.wait()
+            yield "b"
+
+        async def collect(flight):
+            return [chunk async for chunk in flight.run_async("key", produce)]
+
+        leading = asyncio.ensure_future(collect(first))
+        while first.redis_client.get(LOCK_PREFIX + "key") is None:
+            await asyncio.sleep(0.01)
+        following = asyncio.ensure_future(collect(second))
+        await asyncio.sleep(0.05)
+        release.set()
+        return await asyncio.gather(leading, following)
+
+    assert asyncio.run(scenario()) == [["a", "b"], ["ab"]]
+    assert len(calls) == 1
+
+
+def test_unavailable_redis_calls_the_provider():
+    flight = SingleFlight(mode="local")
+    flight.mode = "redis"
+    flight.redis_client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    flight.redis_client.connection_pool.connection_kwargs["server"].connected = False
+    produce = Leader(["answer"])
+    produce.release.set()
+
+    assert list(flight.run("key", produce)) == ["answer"]
+    assert flight.stats()["errors"] >= 1
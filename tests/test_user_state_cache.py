@@ -0,0 +1,107 @@
+import asyncio
+import importlib
+from unittest.mock import AsyncMock, MagicMock
+
+import fakeredis
+import redis
+
+from state_store import async_redis_state_store, redis_state_store
+from state_store.user_state_cache import (
+    INVALIDATION_CHANNEL,
+    UserStateCache,
+    invalidation_message,
+    parse_invalidation_message,
+    publish_user_state_invalidation,
+)
+
+SELECTION = ("openai", "gpt-4o")
+# The package re-exports functions under the same names as these modules
+get_redis_user_state = importlib.import_module("state_store.get_redis_user_state")
+get_redis_user_state_async = importlib.import_module("state_store.get_redis_user_state_async")
+
+
+def test_own_invalidation_keeps_the_value_just_written():
+    cache = UserStateCache()
+    cache.update("U1", SELECTION)
+
+    cache._on_invalidation(invalidation_message("U1"))
+
+    assert cache.get("U1") == SELECTION
+
+
+def test_invalidation_from_another_process_evicts_the_user():
+    cache = UserStateCache()
+    cache.set("U1", SELECTION)
+
+    cache._on_invalidation("another-process:U1")
+
+    assert cache.get("U1") is None
+    assert cache.stats()["invalidations"] == 1
+
+
+def test_invalidation_without_a_process_id_evicts_the_user():
+    cache = UserStateCache()
+    cache.set("U1", SELECTION)
+
+    cache._on_invalidation("U1")
+
+    assert cache.get("U1") is None
+
+
+def test_read_started_before_a_write_does_not_replace_it():
+    cache = UserStateCache()
+    generation = cache.generation()
+    cache.update("U1", SELECTION)
+
+    # A read-through that fetched the previous selection from Redis finishes after the write
+    cache.set("U1", ("anthropic", "claude-3-haiku-20240307"), generation)
+
+    assert cache.get("U1") == SELECTION
+
+
+def test_published_message_names_the_process_and_the_user():
+    client = fakeredis.FakeRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    pubsub = client.pubsub(ignore_subscribe_messages=True)
+    pubsub.subscribe(INVALIDATION_CHANNEL)
+
+    publish_user_state_invalidation(client, "U1")
+
+    # The first read may only consume the subscription confirmation
+    message = pubsub.get_message(timeout=1) or pubsub.get_message(timeout=1)
+    origin, user_id = parse_invalidation_message(message["data"])
+    assert user_id == "U1"
+    assert origin is not None
+    assert parse_invalidation_message("U1") == (None, "U1")
+
+
+def test_failed_read_is_not_cached_as_no_selection(monkeypatch):
+    monkeypatch.delenv("GENAI_API_URL", raising=False)
+    cache = UserStateCache()
+    client = MagicMock()
+    client.get.side_effect = redis.ConnectionError("Redis unavailable")
+    monkeypatch.setattr(redis_state_store, "get_redis_client", lambda url: client)
+    store = redis_state_store.RedisStateStore(redis_url="redis://state")
+    monkeypatch.setattr(get_redis_user_state, "get_redis_state_store", lambda url: store)
+    monkeypatch.setattr(get_redis_user_state, "get_user_state_cache", lambda url: cache)
+
+    assert get_redis_user_state.get_redis_user_state("U1", False, "redis://state") == (None, None)
+    assert cache.get("U1") is None
+
+    # Once Redis answers, the stored selection is read instead of a cached miss
+    client.get.side_effect = None
+    client.get.return_value = '{"user_id": "U1", "provider": "openai", "model": "gpt-4o"}'
+    assert get_redis_user_state.get_redis_user_state("U1", False, "redis://state") == SELECTION
+
+
+def test_failed_async_read_is_not_cached_as_no_selection(monkeypatch):
+    monkeypatch.delenv("GENAI_API_URL", raising=False)
+    cache = UserStateCache()
+    client = MagicMock()
+    client.get = AsyncMock(side_effect=redis.ConnectionError("Redis unavailable"))
+    monkeypatch.setattr(async_redis_state_store, "get_async_redis_client", lambda url: client)
+    store = async_redis_state_store.AsyncRedisStateStore(redis_url="redis://state")
+    monkeypatch.setattr(get_redis_user_state_async, "get_async_redis_state_store", lambda url: store)
+    monkeypatch.setattr(get_redis_user_state_async, "get_user_state_cache", lambda url: cache)
+
+    assert asyncio.run(get_redis_user_state_async.get_redis_user_state_async("U1", False, "redis://state")) == (None, None)
+    assert cache.get("U1") is None
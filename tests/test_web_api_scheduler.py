@@ -0,0 +1,225 @@
+import asyncio
+
+import pytest
+from slack_sdk.errors import SlackApiError
+from slack_sdk.web.slack_response import SlackResponse
+
+from listeners.listener_utils import web_api_scheduler
+from listeners.listener_utils.stream_renderer import AsyncStreamingMessageRenderer, StreamingMessageRenderer
+from listeners.listener_utils.web_api_scheduler import (
+    HIGH,
+    LOW,
+    TokenBucket,
+    WebApiScheduler,
+    background_priority,
+    skip_when_rate_limited,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    async def async_sleep(self, seconds: float):
+        self.sleep(seconds)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(web_api_scheduler.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(web_api_scheduler.time, "sleep", clock.sleep)
+    monkeypatch.setattr(web_api_scheduler.asyncio, "sleep", clock.async_sleep)
+    return clock
+
+
+def slack_response(status_code: int, data: dict, headers: dict = None) -> SlackResponse:
+    return SlackResponse(
+        client=None, http_verb="POST", api_url="", req_args={}, data=data, headers=headers or {}, status_code=status_code
+    )
+
+
+def ratelimited(retry_after: str) -> SlackApiError:
+    return SlackApiError(
+        "ratelimited", slack_response(429, {"ok": False, "error": "ratelimited"}, {"Retry-After": retry_after})
+    )
+
+
+def test_bucket_refills_at_its_rate_up_to_its_capacity(clock):
+    bucket = TokenBucket(per_second=2, capacity=4)
+    for _ in range(4):
+        assert bucket.wait_time(clock.now, HIGH) == 0
+        bucket.take()
+
+    assert bucket.wait_time(clock.now, HIGH) == 0.5
+    assert bucket.wait_time(clock.now + 0.5, HIGH) == 0
+    bucket.wait_time(clock.now + 60, HIGH)
+    assert bucket.tokens == 4
+
+
+def test_background_calls_leave_headroom_for_user_visible_ones(clock):
+    bucket = TokenBucket(per_second=1, capacity=8)
+    assert bucket.reserve == 2
+    for _ in range(6):
+        bucket.take()
+
+    assert bucket.wait_time(clock.now, HIGH) == 0
+    assert bucket.wait_time(clock.now, LOW) == 1.0
+
+
+def test_background_priority_applies_to_user_visible_methods(clock):
+    scheduler = WebApiScheduler()
+    bucket = scheduler._method_bucket("chat.update")
+    bucket.tokens = bucket.reserve
+    sent = []
+
+    with background_priority():
+        scheduler.call("chat.update", {"channel": "C1", "ts": "1"}, lambda: sent.append("background"))
+    scheduler.call("chat.update", {"channel": "C1", "ts": "2"}, lambda: sent.append("visible"))
+
+    assert sent == ["background", "visible"]
+    # Only the background call waited for a token
+    assert len(clock.sleeps) == 1
+
+
+def test_ratelimited_call_pauses_the_method_and_retries_after_retry_after(clock):
+    scheduler = WebApiScheduler(retries=2)
+    answers = [ratelimited("3"), slack_response(200, {"ok": True})]
+
+    def send():
+        answer = answers.pop(0)
+        if isinstance(answer, Exception):
+            raise answer
+        return answer
+
+    response = scheduler.call("conversations.history", {"channel": "C1"}, send)
+
+    assert response["ok"]
+    assert sum(clock.sleeps) == pytest.approx(3)
+    assert scheduler.stats()["methods"]["conversations.history"]["ratelimited"] == 1
+
+
+def test_ratelimited_call_is_raised_after_the_last_retry(clock):
+    scheduler = WebApiScheduler(retries=1)
+
+    def send():
+        raise ratelimited("1")
+
+    with pytest.raises(SlackApiError):
+        scheduler.call("users.info", {}, send)
+    assert scheduler.stats()["methods"]["users.info"]["ratelimited"] == 1
+
+
+def test_messages_are_paced_per_channel(clock):
+    scheduler = WebApiScheduler(channel_per_second=1)
+    for _ in range(4):
+        scheduler.call("chat.postMessage", {"channel": "C1"}, lambda: None)
+    scheduler.call("chat.postMessage", {"channel": "C2"}, lambda: None)
+
+    # The channel bucket holds 3 messages; the fourth waits a second and C2 is not affected
+    assert clock.sleeps == [1.0]
+
+
+def test_call_skipped_instead_of_waiting_when_the_bucket_is_empty(clock):
+    scheduler = WebApiScheduler()
+    scheduler._method_bucket("chat.update").tokens = 0
+    sent = []
+
+    with skip_when_rate_limited():
+        response = scheduler.call("chat.update", {"channel": "C1", "ts": "1"}, lambda: sent.append("skipped"))
+    assert response is None
+    assert sent == [] and clock.sleeps == []
+    assert scheduler.stats()["methods"]["chat.update"]["skipped"] == 1
+
+    scheduler.call("chat.update", {"channel": "C1", "ts": "1"}, lambda: sent.append("final"))
+    assert sent == ["final"]
+    assert len(clock.sleeps) == 1
+
+
+def test_async_call_skipped_instead_of_waiting_when_the_bucket_is_empty(clock):
+    scheduler = WebApiScheduler()
+    scheduler._method_bucket("chat.update").tokens = 0
+
+    async def send():
+        raise AssertionError("a skipped call must not be sent")
+
+    async def scenario():
+        with skip_when_rate_limited():
+            return await scheduler.call_async("chat.update", {"channel": "C1", "ts": "1"}, send)
+
+    assert asyncio.run(scenario()) is None
+    assert clock.sleeps == []
+
+
+class SchedulerClient:
+    """A client whose `chat_update` goes through `scheduler`, answering like `ScheduledWebClient`."""
+
+    def __init__(self, scheduler: WebApiScheduler):
+        self.scheduler = scheduler
+        self.updates = []
+
+    def chat_update(self, **kwargs):
+        response = self.scheduler.call("chat.update", kwargs, lambda: self.updates.append(kwargs["text"]) or {"ok": True})
+        return response if response is not None else {"ok": True, "coalesced": True}
+
+
+class AsyncSchedulerClient(SchedulerClient):
+    async def chat_update(self, **kwargs):
+        async def send():
+            self.updates.append(kwargs["text"])
+            return {"ok": True}
+
+        response = await self.scheduler.call_async("chat.update", kwargs, send)
+        return response if response is not None else {"ok": True, "coalesced": True}
+
+
+def test_renderer_skips_intermediate_updates_and_keeps_the_final_one(clock):
+    scheduler = WebApiScheduler()
+    scheduler._method_bucket("chat.update").tokens = 0
+    client = SchedulerClient(scheduler)
+    renderer = StreamingMessageRenderer(client, "C1", "1", min_interval=0)
+
+    text = renderer.render(["Hello", ", ", "world"])
+
+    assert text == "Hello, world"
+    assert client.updates == ["Hello, world"]
+    # Only the final update waited for a token
+    assert len(clock.sleeps) == 1
+    assert scheduler.stats()["methods"]["chat.update"]["skipped"] == 3
+
+
+def test_renderer_sends_intermediate_updates_while_tokens_last(clock):
+    scheduler = WebApiScheduler()
+    scheduler._method_bucket("chat.update").tokens = 1
+    client = SchedulerClient(scheduler)
+    renderer = StreamingMessageRenderer(client, "C1", "1", min_interval=0)
+
+    renderer.render(["Hello", ", ", "world"])
+
+    assert client.updates[0] == "Hello" + " ▍"
+    assert client.updates[-1] == "Hello, world"
+
+
+def test_async_renderer_skips_intermediate_updates_and_keeps_the_final_one(clock):
+    scheduler = WebApiScheduler()
+    scheduler._method_bucket("chat.update").tokens = 0
+    client = AsyncSchedulerClient(scheduler)
+
+    async def chunks():
+        for chunk in ["Hello", ", ", "world"]:
+            yield chunk
+
+    async def scenario():
+        renderer = AsyncStreamingMessageRenderer(client, "C1", "1", min_interval=0)
+        return await renderer.render(chunks())
+
+    assert asyncio.run(scenario()) == "Hello, world"
+    assert client.updates == ["Hello, world"]
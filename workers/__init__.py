@@ -0,0 +1 @@
+from .job_executor import JobExecutor, AsyncJobExecutor, get_job_executor, get_async_job_executor, track_jobs
@@ -0,0 +1,220 @@
+from concurrent.futures import Future
+from typing import Dict, List, Optional
+import json
+import logging
+import os
+import socket
+import threading
+import time
+
+import redis
+
+from metrics import register_stats
+from state_store.redis_pool import get_redis_client
+from .job_executor import get_job_executor, track_jobs
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Redis Streams transport for running the app as one ingest process and N worker processes.
+`stream_ingest.py` holds the Socket Mode connection: every envelope is appended to `SLACK_EVENT_STREAM`
+(default `chatbot:slack:events`, trimmed to about `SLACK_EVENT_STREAM_MAXLEN` entries) and only then acknowledged,
+so Slack redelivers anything that never reached Redis.
+`stream_worker.py` processes read the stream through the consumer group `SLACK_EVENT_GROUP` and dispatch each
+payload to the regular Bolt app. A worker only reads as many entries as its job executor can start, so a slow
+LLM leaves work in Redis for other replicas instead of queueing it locally. An entry is acknowledged once every
+job its listeners submitted has finished; while they run the worker keeps re-claiming the entry so it does not
+look idle. Entries left pending by a crashed worker are taken over with `XAUTOCLAIM` after
+`SLACK_EVENT_CLAIM_IDLE_MS` (default 60000) and dispatched with `redelivered` set in the Bolt context, which lets
+them past event deduplication; after `SLACK_EVENT_MAX_DELIVERIES` attempts (default 5) an entry is moved to the
+dead-letter stream. Each worker also tails every `message` event into its conversation cache, because the consumer
+group gives it only a share of them.
+"""
+
+DEFAULT_STREAM = "chatbot:slack:events"
+DEFAULT_GROUP = "chatbot-workers"
+# Shorter than the pool's socket timeout so blocking reads return before it
+BLOCK_MS = 2000
+
+
+def _stream_name() -> str:
+    return os.environ.get("SLACK_EVENT_STREAM", DEFAULT_STREAM)
+
+
+class EventStreamPublisher:
+    def __init__(self, redis_url: str, *, stream: Optional[str] = None, maxlen: Optional[int] = None):
+        self.redis_client = get_redis_client(redis_url)
+        self.stream = stream or _stream_name()
+        self.maxlen = maxlen or int(os.environ.get("SLACK_EVENT_STREAM_MAXLEN", 100000))
+
+    def publish(self, request_type: str, payload: dict) -> str:
+        fields = {"type": request_type, "payload": json.dumps(payload), "received_at": str(time.time())}
+        return self.redis_client.xadd(self.stream, fields, maxlen=self.maxlen, approximate=True)
+
+
+class EventStreamConsumer:
+    def __init__(
+        self,
+        app,
+        redis_url: str,
+        *,
+        stream: Optional[str] = None,
+        group: Optional[str] = None,
+        consumer: Optional[str] = None,
+    ):
+        self.app = app
+        self.redis_client = get_redis_client(redis_url)
+        self.stream = stream or _stream_name()
+        self.group = group or os.environ.get("SLACK_EVENT_GROUP", DEFAULT_GROUP)
+        self.consumer = consumer or f"{socket.gethostname()}-{os.getpid()}"
+        self.claim_idle_ms = int(os.environ.get("SLACK_EVENT_CLAIM_IDLE_MS", 60000))
+        self.max_deliveries = int(os.environ.get("SLACK_EVENT_MAX_DELIVERIES", 5))
+        self._in_flight: Dict[str, List[Future]] = {}
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._counters = {"dispatched": 0, "acked": 0, "reclaimed": 0, "dead_lettered": 0, "failed": 0}
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            self._counters[counter] += amount
+
+    def ensure_group(self):
+        try:
+            self.redis_client.xgroup_create(self.stream, self.group, id="$", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise e
+
+    def run(self):
+        """Consume until `stop()` is called. Blocks the calling thread."""
+        self.ensure_group()
+        threading.Thread(target=self._heartbeat, name="event-stream-heartbeat", daemon=True).start()
+        threading.Thread(target=self._tail_message_events, name="event-stream-tail", daemon=True).start()
+        register_stats("event_stream", self.stats)
+        logger.info(f"Consuming {self.stream} as {self.consumer} in group {self.group}")
+        last_reclaim = 0.0
+        while not self._stopped.is_set():
+            try:
+                capacity = get_job_executor().available()
+                if capacity == 0:
+                    time.sleep(0.1)
+                    continue
+                if time.monotonic() - last_reclaim > self.claim_idle_ms / 2000:
+                    last_reclaim = time.monotonic()
+                    capacity -= self._reclaim(capacity)
+                if capacity > 0:
+                    response = self.redis_client.xreadgroup(
+                        self.group, self.consumer, {self.stream: ">"}, count=capacity, block=BLOCK_MS
+                    )
+                    for _, entries in response or []:
+                        for entry_id, fields in entries:
+                            self._dispatch(entry_id, fields, redelivered=False)
+            except redis.RedisError as e:
+                logger.error(f"Event stream read failed: {e}")
+                time.sleep(1)
+
+    def stop(self):
+        self._stopped.set()
+
+    def _reclaim(self, capacity: int) -> int:
+        reply = self.redis_client.xautoclaim(
+            self.stream, self.group, self.consumer, self.claim_idle_ms, start_id="0-0", count=capacity
+        )
+        # Redis 7 adds a third element, the IDs of deleted entries; Redis 6.2 replies with two
+        entries = reply[1]
+        for entry_id, fields in entries:
+            pending = self.redis_client.xpending_range(self.stream, self.group, entry_id, entry_id, 1)
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            if deliveries > self.max_deliveries or not fields:
+                self._dead_letter(entry_id, fields, deliveries)
+                continue
+            self._count("reclaimed")
+            logger.warning(f"Reclaimed event {entry_id} (delivery {deliveries})")
+            self._dispatch(entry_id, fields, redelivered=True)
+        return len(entries)
+
+    def _dead_letter(self, entry_id: str, fields: Optional[dict], deliveries: int):
+        logger.error(f"Event {entry_id} failed {deliveries} deliveries, moving it to the dead-letter stream")
+        pipe = self.redis_client.pipeline()
+        if fields:
+            pipe.xadd(f"{self.stream}:dead", {**fields, "entry_id": entry_id}, maxlen=10000, approximate=True)
+        pipe.xack(self.stream, self.group, entry_id)
+        pipe.execute()
+        self._count("dead_lettered")
+
+    def _dispatch(self, entry_id: str, fields: dict, redelivered: bool):
+        from slack_bolt import BoltRequest
+
+        try:
+            body = json.loads(fields["payload"])
+            with track_jobs() as jobs:
+                self.app.dispatch(BoltRequest(body=body, mode="socket_mode", context={"redelivered": redelivered}))
+            self._count("dispatched")
+        except Exception as e:
+            # Left pending on purpose: it is reclaimed and retried, then dead-lettered
+            logger.exception(f"Failed to dispatch event {entry_id}: {e}")
+            self._count("failed")
+            return
+        if not jobs:
+            self._ack(entry_id)
+            return
+        with self._lock:
+            self._in_flight[entry_id] = jobs
+        remaining = [len(jobs)]
+        remaining_lock = threading.Lock()
+
+        def job_done(_):
+            with remaining_lock:
+                remaining[0] -= 1
+                finished = remaining[0] == 0
+            if finished:
+                with self._lock:
+                    self._in_flight.pop(entry_id, None)
+                self._ack(entry_id)
+
+        for job in jobs:
+            job.add_done_callback(job_done)
+
+    def _ack(self, entry_id: str):
+        try:
+            self.redis_client.xack(self.stream, self.group, entry_id)
+            self._count("acked")
+        except redis.RedisError as e:
+            logger.error(f"Failed to acknowledge event {entry_id}: {e}")
+
+    def _heartbeat(self):
+        """Reset the idle time of entries whose jobs are still running so other workers do not reclaim them."""
+        while not self._stopped.wait(self.claim_idle_ms / 3000):
+            with self._lock:
+                entry_ids = list(self._in_flight)
+            if not entry_ids:
+                continue
+            try:
+                self.redis_client.xclaim(self.stream, self.group, self.consumer, 0, entry_ids, justid=True)
+            except redis.RedisError as e:
+                logger.error(f"Event stream heartbeat failed: {e}")
+
+    def _tail_message_events(self):
+        from listeners.listener_utils.conversation_cache import get_conversation_cache
+
+        cache = get_conversation_cache()
+        if not cache.enabled:
+            return
+        last_id = "$"
+        while not self._stopped.is_set():
+            try:
+                response = self.redis_client.xread({self.stream: last_id}, count=100, block=BLOCK_MS)
+                for _, entries in response or []:
+                    for entry_id, fields in entries:
+                        last_id = entry_id
+                        event = json.loads(fields.get("payload", "{}")).get("event") or {}
+                        if event.get("type") == "message":
+                            cache.record_event(event)
+            except Exception as e:
+                logger.error(f"Event stream tail failed: {e}")
+                time.sleep(1)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"in_flight": len(self._in_flight), **self._counters}
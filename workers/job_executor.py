@@ -0,0 +1,256 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Dict, List, Optional
+import asyncio
+import inspect
+import logging
+import os
+import threading
+import time
+
+from metrics import register_stats
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+"""
+Bounded background executors for slow listener work.
+Listeners call `ack()` and immediately hand the rest of their work to an executor,
+so Bolt's listener threads are never held by LLM or HTTP calls.
+Admission is limited globally (`WORKER_POOL_SIZE` concurrent jobs, `WORKER_MAX_QUEUE` waiting jobs)
+and per user (`WORKER_MAX_PER_USER` queued or running jobs). A rejected job runs its `on_busy`
+callback instead, which listeners use to send a graceful "busy" reply.
+`JobExecutor` runs plain callables on a thread pool and is used by the synchronous app,
+`AsyncJobExecutor` runs coroutines on the running event loop under the same limits.
+Both expose queue-wait and run-time metrics through `stats()`.
+`track_jobs()` collects the futures of jobs submitted inside it, which the stream worker uses to acknowledge
+an event only once the work it started has finished.
+"""
+
+SAMPLE_WINDOW = 500
+
+_tracked_jobs: ContextVar[Optional[List[Future]]] = ContextVar("tracked_jobs", default=None)
+
+
+@contextmanager
+def track_jobs():
+    """Collect the futures of every `JobExecutor` job submitted from this thread inside the block."""
+    jobs: List[Future] = []
+    token = _tracked_jobs.set(jobs)
+    try:
+        yield jobs
+    finally:
+        _tracked_jobs.reset(token)
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, default))
+    except ValueError:
+        logger.error(f"Invalid value for {name}, using {default}")
+        return default
+
+
+def _percentile(samples, percentile: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percentile))]
+
+
+class _JobLimits:
+    def __init__(self, *, max_workers: int, max_queue: int, max_per_user: int, name: str):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.max_per_user = max_per_user
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._running = 0
+        self._per_user: Dict[str, int] = {}
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "rejected_queue_full": 0, "rejected_user_limit": 0}
+        self._queue_wait = deque(maxlen=SAMPLE_WINDOW)
+        self._run_time = deque(maxlen=SAMPLE_WINDOW)
+
+    def _admit(self, user_id: Optional[str]) -> bool:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._counters["rejected_queue_full"] += 1
+                logger.warning(f"{self.name}: queue full ({self._queued} waiting), rejecting job for user {user_id}")
+                return False
+            if user_id and self._per_user.get(user_id, 0) >= self.max_per_user:
+                self._counters["rejected_user_limit"] += 1
+                logger.warning(f"{self.name}: user {user_id} already has {self.max_per_user} jobs in flight, rejecting")
+                return False
+            self._queued += 1
+            self._counters["submitted"] += 1
+            if user_id:
+                self._per_user[user_id] = self._per_user.get(user_id, 0) + 1
+            return True
+
+    def _started(self, submitted_at: float) -> float:
+        started_at = time.monotonic()
+        with self._lock:
+            self._queued -= 1
+            self._running += 1
+            self._queue_wait.append(started_at - submitted_at)
+        return started_at
+
+    def _finished(self, user_id: Optional[str], started_at: float, failed: bool):
+        with self._lock:
+            self._running -= 1
+            self._run_time.append(time.monotonic() - started_at)
+            self._counters["failed" if failed else "completed"] += 1
+            if user_id:
+                remaining = self._per_user.get(user_id, 1) - 1
+                if remaining > 0:
+                    self._per_user[user_id] = remaining
+                else:
+                    self._per_user.pop(user_id, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            queue_wait = list(self._queue_wait)
+            run_time = list(self._run_time)
+            return {
+                "queued": self._queued,
+                "running": self._running,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                **self._counters,
+                "queue_wait_p50": _percentile(queue_wait, 0.5),
+                "queue_wait_p95": _percentile(queue_wait, 0.95),
+                "run_time_p50": _percentile(run_time, 0.5),
+                "run_time_p95": _percentile(run_time, 0.95),
+            }
+
+
+class JobExecutor(_JobLimits):
+    def __init__(
+        self,
+        *,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_per_user: Optional[int] = None,
+        name: str = "job-executor",
+    ):
+        super().__init__(
+            max_workers=max_workers or _env_int("WORKER_POOL_SIZE", 8),
+            max_queue=max_queue or _env_int("WORKER_MAX_QUEUE", 100),
+            max_per_user=max_per_user or _env_int("WORKER_MAX_PER_USER", 3),
+            name=name,
+        )
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+
+    def submit(self, user_id: Optional[str], fn: Callable, *args, on_busy: Optional[Callable] = None, **kwargs) -> bool:
+        """Queue `fn(*args, **kwargs)`. Returns False (after calling `on_busy`) if the job was rejected."""
+        if not self._admit(user_id):
+            if on_busy is not None:
+                try:
+                    on_busy()
+                except Exception as e:
+                    logger.error(f"{self.name}: error sending busy reply: {e}")
+            return False
+        future = self._pool.submit(self._run, user_id, time.monotonic(), fn, args, kwargs)
+        tracked = _tracked_jobs.get()
+        if tracked is not None:
+            tracked.append(future)
+        return True
+
+    def _run(self, user_id, submitted_at, fn, args, kwargs):
+        started_at = self._started(submitted_at)
+        failed = False
+        try:
+            fn(*args, **kwargs)
+        except Exception as e:
+            failed = True
+            logger.exception(f"{self.name}: job {getattr(fn, '__name__', fn)} failed: {e}")
+        finally:
+            self._finished(user_id, started_at, failed)
+
+    def available(self) -> int:
+        """How many more jobs could start right away."""
+        with self._lock:
+            return max(0, self.max_workers - self._running - self._queued)
+
+    def shutdown(self, wait: bool = True):
+        self._pool.shutdown(wait=wait)
+
+
+class AsyncJobExecutor(_JobLimits):
+    def __init__(
+        self,
+        *,
+        max_workers: Optional[int] = None,
+        max_queue: Optional[int] = None,
+        max_per_user: Optional[int] = None,
+        name: str = "async-job-executor",
+    ):
+        super().__init__(
+            max_workers=max_workers or _env_int("WORKER_POOL_SIZE", 64),
+            max_queue=max_queue or _env_int("WORKER_MAX_QUEUE", 500),
+            max_per_user=max_per_user or _env_int("WORKER_MAX_PER_USER", 3),
+            name=name,
+        )
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._tasks = set()
+
+    async def submit(
+        self, user_id: Optional[str], fn: Callable, *args, on_busy: Optional[Callable] = None, **kwargs
+    ) -> bool:
+        """Schedule the coroutine `fn(*args, **kwargs)`. Returns False (after awaiting `on_busy`) if rejected."""
+        if not self._admit(user_id):
+            if on_busy is not None:
+                try:
+                    result = on_busy()
+                    if inspect.isawaitable(result):
+                        await result
+                except Exception as e:
+                    logger.error(f"{self.name}: error sending busy reply: {e}")
+            return False
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_workers)
+        task = asyncio.create_task(self._run(user_id, time.monotonic(), fn, args, kwargs))
+        # Keep a reference so running tasks are not garbage collected
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return True
+
+    async def _run(self, user_id, submitted_at, fn, args, kwargs):
+        async with self._semaphore:
+            started_at = self._started(submitted_at)
+            failed = False
+            try:
+                await fn(*args, **kwargs)
+            except Exception as e:
+                failed = True
+                logger.exception(f"{self.name}: job {getattr(fn, '__name__', fn)} failed: {e}")
+            finally:
+                self._finished(user_id, started_at, failed)
+
+
+_job_executor: Optional[JobExecutor] = None
+_async_job_executor: Optional[AsyncJobExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_job_executor() -> JobExecutor:
+    global _job_executor
+    if _job_executor is None:
+        with _executor_lock:
+            if _job_executor is None:
+                _job_executor = JobExecutor()
+                register_stats("job_executor", _job_executor.stats)
+    return _job_executor
+
+
+def get_async_job_executor() -> AsyncJobExecutor:
+    global _async_job_executor
+    if _async_job_executor is None:
+        with _executor_lock:
+            if _async_job_executor is None:
+                _async_job_executor = AsyncJobExecutor()
+                register_stats("async_job_executor", _async_job_executor.stats)
+    return _async_job_executor